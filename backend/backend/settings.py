@@ -217,6 +217,29 @@ SIMPLE_JWT = {
     'JTI_CLAIM': 'jti',
 }
 
+# ==================== CACHE SETTINGS ====================
+# 'catalog' dùng cho response cache của products/categories (products/cache.py).
+# Đổi sang file cache: CATALOG_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# và CATALOG_CACHE_LOCATION=/var/tmp/catalog_cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': os.environ.get('CATALOG_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CATALOG_CACHE_LOCATION', 'catalog'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+CATALOG_CACHE_TIMEOUT = 300
+
+# ==================== ORDER ID SETTINGS ====================
+# Mã đơn hàng sinh trong process (orders/ids.py); mỗi máy chạy app cần một node khác nhau (0-15)
+ORDER_ID_NODE = int(os.environ.get('ORDER_ID_NODE', 0))
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',
@@ -0,0 +1,183 @@
+"""
+Giữ tồn kho khi đặt hàng, không khoá trước (không SELECT ... FOR UPDATE).
+
+Mỗi sản phẩm (và mỗi biến thể) trong giỏ được trừ bằng một câu UPDATE có điều kiện:
+
+    UPDATE products_product SET stock = stock - q WHERE id = ? AND stock >= q
+
+Nếu câu UPDATE không khớp dòng nào thì không đủ hàng -> rollback cả đơn. Không có
+bước đọc-rồi-ghi nên không thể bán vượt tồn kho, và khoá dòng chỉ giữ trong thời
+gian của transaction đặt hàng. Các UPDATE chạy theo thứ tự product id để hai giỏ
+hàng cùng chứa A và B không deadlock.
+
+Mỗi phần đã trừ được ghi lại thành StockReservation để hoàn kho khi đơn bị huỷ
+hoặc khi chờ thanh toán online quá hạn (release_expired).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from products.models import Product, ProductAttribute, ProductVariant
+from products.signals import bump_product_versions
+from .models import Order, StockReservation
+
+# Thời gian giữ hàng cho đơn thanh toán online chưa trả tiền
+RESERVATION_TTL = timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60))
+# COD: hàng được giữ hẳn ngay khi đặt
+COMMIT_ON_CREATE = ('cod',)
+# Trạng thái đơn mà reservation chuyển sang committed
+COMMITTED_STATUSES = ('paid', 'shipping', 'completed')
+
+
+class InsufficientStock(Exception):
+    """Một hoặc nhiều dòng trong giỏ không đủ hàng; shortages mô tả từng dòng"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(', '.join(f"{s['product_id']} ({s['reason']})" for s in shortages))
+
+
+def _group_lines(lines):
+    """Gộp số lượng theo product và theo (product, color_key, size_key)"""
+    per_product = defaultdict(int)
+    per_variant = defaultdict(int)
+    labels = {}
+    for line in lines:
+        product_id, quantity = line['product_id'], line['quantity']
+        key = (product_id,
+               ProductAttribute.normalize(line.get('color')),
+               ProductAttribute.normalize(line.get('size')))
+        per_product[product_id] += quantity
+        per_variant[key] += quantity
+        labels.setdefault(key, (line.get('color', ''), line.get('size', '')))
+    return per_product, per_variant, labels
+
+
+def _bump_after_commit(product_ids):
+    # stock nằm trong payload catalog -> invalidate cache khi transaction đã commit
+    def bump():
+        category_ids = Product.objects.filter(pk__in=product_ids).values_list('category_id', flat=True)
+        bump_product_versions(product_ids, set(category_ids), categories_changed=False)
+    # robust: lỗi khi bump cache không được làm hỏng đơn đã commit
+    transaction.on_commit(bump, robust=True)
+
+
+def reserve(order, lines, variants=None):
+    """
+    Trừ kho cho toàn bộ giỏ hàng của order. lines: [{product_id, quantity, color, size}].
+    variants: {(product_id, color_key, size_key): variant_id} nếu đã đọc sẵn (báo giá).
+    Số câu lệnh: 1 SELECT biến thể (khi chưa có variants) + 1 UPDATE mỗi product
+    + 1 UPDATE mỗi biến thể + 1 INSERT reservations. Raise InsufficientStock (và
+    rollback) nếu thiếu hàng.
+    """
+    per_product, per_variant, labels = _group_lines(lines)
+    if variants is None:
+        variants = {
+            (product_id, color_key, size_key): pk
+            for pk, product_id, color_key, size_key in ProductVariant.objects.filter(
+                product_id__in=per_product
+            ).values_list('id', 'product_id', 'color_key', 'size_key')
+        }
+    has_variants = {key[0] for key in variants}
+
+    if order.payment_method in COMMIT_ON_CREATE:
+        status, expires_at = StockReservation.COMMITTED, None
+    else:
+        status, expires_at = StockReservation.HELD, timezone.now() + RESERVATION_TTL
+
+    shortages, reservations = [], []
+    with transaction.atomic():
+        for product_id in sorted(per_product):
+            for key in sorted(k for k in per_variant if k[0] == product_id):
+                quantity = per_variant[key]
+                color, size = labels[key]
+                variant_id = None
+                if product_id in has_variants:
+                    variant_id = variants.get(key)
+                    if variant_id is None:
+                        shortages.append({'product_id': product_id, 'color': color, 'size': size,
+                                          'requested': quantity, 'reason': 'variant_not_found'})
+                        continue
+                    updated = ProductVariant.objects.filter(pk=variant_id, stock__gte=quantity).update(
+                        stock=F('stock') - quantity
+                    )
+                    if not updated:
+                        shortages.append({'product_id': product_id, 'color': color, 'size': size,
+                                          'requested': quantity, 'reason': 'out_of_stock'})
+                        continue
+                reservations.append(StockReservation(
+                    order=order, product_id=product_id, variant_id=variant_id, quantity=quantity,
+                    status=status, expires_at=expires_at,
+                ))
+
+            # Product.stock là tổng của các biến thể nên cũng trừ tổng số lượng
+            quantity = per_product[product_id]
+            updated = Product.objects.filter(pk=product_id, is_active=True, stock__gte=quantity).update(
+                stock=F('stock') - quantity
+            )
+            if not updated:
+                shortages.append({'product_id': product_id, 'color': '', 'size': '',
+                                  'requested': quantity, 'reason': 'out_of_stock'})
+
+        if shortages:
+            # Thoát khỏi atomic bằng exception -> mọi UPDATE phía trên bị rollback
+            raise InsufficientStock(shortages)
+        StockReservation.objects.bulk_create(reservations)
+    _bump_after_commit(list(per_product))
+    return reservations
+
+
+def _restock(reservation):
+    Product.objects.filter(pk=reservation.product_id).update(stock=F('stock') + reservation.quantity)
+    if reservation.variant_id:
+        ProductVariant.objects.filter(pk=reservation.variant_id).update(stock=F('stock') + reservation.quantity)
+
+
+def release(order):
+    """
+    Hoàn kho cho các reservation còn hiệu lực của order. Mỗi reservation được đổi
+    trạng thái bằng một UPDATE có điều kiện nên gọi lại hay gọi song song cũng
+    không hoàn kho hai lần. Trả về số reservation đã hoàn.
+    """
+    now = timezone.now()
+    released, product_ids = 0, set()
+    with transaction.atomic():
+        for reservation in order.reservations.filter(status__in=StockReservation.ACTIVE):
+            claimed = StockReservation.objects.filter(
+                pk=reservation.pk, status__in=StockReservation.ACTIVE
+            ).update(status=StockReservation.RELEASED, released_at=now)
+            if claimed:
+                _restock(reservation)
+                released += 1
+                product_ids.add(reservation.product_id)
+    if product_ids:
+        _bump_after_commit(list(product_ids))
+    return released
+
+
+def commit(order):
+    """Đơn đã thanh toán / đang giao: giữ hẳn hàng, bỏ hạn giữ"""
+    return order.reservations.filter(status=StockReservation.HELD).update(
+        status=StockReservation.COMMITTED, expires_at=None
+    )
+
+
+def release_expired(now=None):
+    """
+    Huỷ các đơn còn pending có reservation held đã quá hạn; việc huỷ kích hoạt release
+    qua orders/signals.py. Chỉ huỷ được nếu đơn vẫn pending lúc UPDATE (đơn vừa được
+    thanh toán song song thì bỏ qua). Đơn online được IPN của cổng thanh toán chuyển
+    sang paid (payment/views.py vnpay_ipn) nên không rơi vào đây. Trả về số đơn đã huỷ.
+    """
+    now = now or timezone.now()
+    order_ids = StockReservation.objects.filter(
+        status=StockReservation.HELD, expires_at__lte=now
+    ).values_list('order_id', flat=True).distinct()
+    canceled = 0
+    for order in Order.objects.filter(pk__in=list(order_ids), status='pending'):
+        canceled += order.transition('canceled', expected='pending')
+    return canceled
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Tính lại toàn bộ thống kê đơn theo seller / ngày (SellerDailyStats) từ OrderItem. "
+        "Chạy một lần sau khi migrate, hoặc khi cần sửa số liệu bị lệch."
+    )
+
+    def handle(self, *args, **opts):
+        rows = rebuild()
+        self.stdout.write(f"✅ Hoàn tất. Số dòng seller/ngày: {rows}")
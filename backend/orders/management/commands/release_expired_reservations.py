@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.inventory import release_expired
+
+
+class Command(BaseCommand):
+    help = "Huỷ các đơn thanh toán online quá hạn giữ hàng và hoàn kho (chạy định kỳ, vd. mỗi phút)."
+
+    def handle(self, *args, **opts):
+        canceled = release_expired()
+        self.stdout.write(f"✅ Hoàn tất. Đơn bị huỷ do hết hạn giữ hàng: {canceled}")
@@ -0,0 +1,129 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from orders.inventory import reserve, InsufficientStock
+from orders.models import Order, StockReservation
+from products.models import Product
+
+# SQLite khoá cả database khi ghi: retry thay vì coi là lỗi (Postgres/MySQL không cần)
+LOCK_RETRIES = 200
+LOCK_BACKOFF = 0.002
+
+
+def _checkout(product_id, quantity, tag):
+    for attempt in range(LOCK_RETRIES):
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    order_id=tag, full_name='Stress', phone='0', email='stress@example.com',
+                    address='-', ward='-', district='-', city='-', payment_method='cod',
+                    total_amount=0,
+                )
+                reserve(order, [{'product_id': product_id, 'quantity': quantity}])
+            return True, attempt
+        except InsufficientStock:
+            return False, attempt
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            time.sleep(LOCK_BACKOFF * (attempt + 1))
+    raise OperationalError(f'{tag}: database vẫn bị khoá sau {LOCK_RETRIES} lần thử')
+
+
+def run_stress(product_id, workers=8, attempts=50, quantity=1, windows=5, prefix='STRESS'):
+    """
+    workers luồng, mỗi luồng đặt attempts đơn cho cùng một sản phẩm. Trả về số đơn
+    thành công/bị từ chối, số lần retry do khoá, thông lượng theo từng khoảng thời gian.
+    """
+    results, errors, lock = [], [], threading.Lock()
+    barrier = threading.Barrier(workers)
+
+    def worker(index):
+        close_old_connections()
+        try:
+            barrier.wait()
+            for i in range(attempts):
+                ok, retries = _checkout(product_id, quantity, f'{prefix}{index:03d}{i:05d}')
+                with lock:
+                    results.append((time.monotonic(), ok, retries))
+        except Exception as exc:  # pragma: no cover - báo lại cho luồng chính
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    if errors:
+        raise errors[0]
+
+    width = elapsed / windows if elapsed else 1
+    per_window = [0] * windows
+    for finished, _, _ in results:
+        per_window[min(int((finished - started) / width), windows - 1)] += 1
+    sold = sum(1 for _, ok, _ in results if ok)
+    return {
+        'attempts': len(results),
+        'sold': sold,
+        'rejected': len(results) - sold,
+        'lock_retries': sum(retries for _, _, retries in results),
+        'elapsed': elapsed,
+        'throughput': len(results) / elapsed if elapsed else 0.0,
+        'per_window': [round(count / width, 1) for count in per_window],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Stress test giữ kho: nhiều luồng cùng đặt một sản phẩm, kiểm tra không bán vượt "
+        "tồn kho và in thông lượng theo thời gian. Chỉ chạy trên database thử nghiệm."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_id", type=int)
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--attempts", type=int, default=100, help="Số đơn mỗi luồng")
+        parser.add_argument("--quantity", type=int, default=1)
+        parser.add_argument("--keep", action="store_true", help="Giữ lại các đơn thử (mặc định xoá và hoàn kho)")
+
+    def handle(self, *args, **opts):
+        try:
+            product = Product.objects.get(pk=opts["product_id"])
+        except Product.DoesNotExist:
+            raise CommandError("Không tìm thấy sản phẩm")
+        initial = product.stock
+        prefix = f"STR{int(time.time()) % 10000:04d}"
+
+        stats = run_stress(product.pk, opts["workers"], opts["attempts"], opts["quantity"], prefix=prefix)
+        product.refresh_from_db(fields=["stock"])
+        reserved = sum(StockReservation.objects.filter(
+            order__order_id__startswith=prefix, product=product
+        ).values_list("quantity", flat=True))
+
+        self.stdout.write(
+            f"Đơn: {stats['attempts']} | bán: {stats['sold']} | từ chối: {stats['rejected']} | "
+            f"retry do khoá: {stats['lock_retries']}"
+        )
+        self.stdout.write(
+            f"Thông lượng: {stats['throughput']:.1f} đơn/s | theo khoảng: {stats['per_window']}"
+        )
+        oversold = initial - product.stock != reserved or product.stock < 0
+        self.stdout.write(
+            f"Tồn kho: {initial} -> {product.stock}, đã giữ: {reserved} "
+            + ("❌ LỆCH" if oversold else "✅ không bán vượt")
+        )
+
+        if not opts["keep"]:
+            for order in Order.objects.filter(order_id__startswith=prefix):
+                order.status = "canceled"
+                order.save()
+            Order.objects.filter(order_id__startswith=prefix).delete()
+        if oversold:
+            raise CommandError("Tồn kho lệch so với reservation")
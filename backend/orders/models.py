@@ -1,10 +1,8 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save
 from products.models import Product
-import time
-
-def gen_order_id():
-    return "ORD" + str(int(time.time()))[-8:]
+from .ids import new_order_id
 
 class Order(models.Model):
     STATUS = (
@@ -32,10 +30,60 @@ class Order(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Ảnh chụp giá trị lúc load: biết field nào đã đổi (vd. status cũ cho signals)
+        # mà không phải SELECT lại trước khi save
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _snapshot(self, fields=None):
+        """Cập nhật ảnh chụp sau khi ghi / đọc lại (fields=None: mọi field đã load)"""
+        if fields is None:
+            names, loaded = [f.attname for f in self._meta.concrete_fields], {}
+        else:
+            names = [self._meta.get_field(name).attname for name in fields]
+            loaded = getattr(self, '_loaded_values', {})
+        deferred = self.get_deferred_fields()
+        loaded.update({name: getattr(self, name) for name in names if name not in deferred})
+        self._loaded_values = loaded
+
+    def get_dirty_fields(self):
+        """{attname: giá trị lúc load} của các field đã bị sửa trong bộ nhớ"""
+        loaded = getattr(self, '_loaded_values', {})
+        return {name: value for name, value in loaded.items() if getattr(self, name) != value}
+
     def save(self, *args, **kwargs):
         if not self.order_id:
-            self.order_id = gen_order_id()
+            self.order_id = new_order_id()
         super().save(*args, **kwargs)
+        self._snapshot(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot(fields)
+
+    def transition(self, status, expected=None):
+        """
+        Đổi trạng thái bằng một câu UPDATE ... WHERE status=<expected> (mặc định: status
+        lúc load), không đọc trước. Trả về False (không ghi gì) nếu đơn đã bị đổi trạng
+        thái ở nơi khác. Thành công thì chạy các receiver post_save như save() trong
+        cùng transaction (hoàn kho, xếp hạng, thống kê seller, thông báo).
+        """
+        if expected is None:
+            expected = getattr(self, '_loaded_values', {}).get('status', self.status)
+        using = self._state.db or 'default'
+        with transaction.atomic(using=using):
+            updated = Order.objects.using(using).filter(pk=self.pk, status=expected).update(status=status)
+            if not updated:
+                return False
+            self.status = status
+            self._previous_status = expected
+            post_save.send(sender=Order, instance=self, created=False,
+                           update_fields=frozenset({'status'}), raw=False, using=using)
+        self._snapshot(['status'])
+        return True
 
     def __str__(self):
         return self.order_id
@@ -47,6 +95,81 @@ class OrderItem(models.Model):
     color = models.CharField(max_length=30, blank=True)
     size = models.CharField(max_length=30, blank=True)
     price = models.DecimalField(max_digits=12, decimal_places=2)
+    # Seller của product lúc đặt hàng, để các query phía seller không phải JOIN product
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+                               related_name='sold_items', db_index=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['seller', 'order'], name='orderitem_seller_order_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.seller_id is None and self.product_id is not None:
+            self.seller_id = self.product.seller_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.product_id} x{self.quantity}"
+
+
+class StockReservation(models.Model):
+    """
+    Phần tồn kho đã trừ cho một dòng đơn hàng (xem orders/inventory.py).
+    held: chờ thanh toán online, hết hạn sau expires_at; committed: giữ hẳn
+    (COD hoặc đã thanh toán); released: đã hoàn lại kho (huỷ / hết hạn).
+    """
+    HELD = 'held'
+    COMMITTED = 'committed'
+    RELEASED = 'released'
+    STATUS = (
+        (HELD, 'Held'),
+        (COMMITTED, 'Committed'),
+        (RELEASED, 'Released'),
+    )
+    ACTIVE = (HELD, COMMITTED)
+
+    order = models.ForeignKey(Order, related_name='reservations', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+    variant = models.ForeignKey('products.ProductVariant', null=True, blank=True, on_delete=models.SET_NULL)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS, default=HELD)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Job dọn reservation hết hạn chỉ quét các dòng đang held
+            models.Index(fields=['expires_at'], condition=models.Q(status='held'),
+                         name='reservation_held_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.product_id} x{self.quantity} ({self.status})"
+
+
+class SellerDailyStats(models.Model):
+    """
+    Thống kê đơn hàng của một seller trong một ngày (theo ngày tạo đơn), cập nhật
+    tăng dần ở orders/stats.py. Một đơn có nhiều seller được đếm cho từng seller;
+    doanh thu / số lượng chỉ tính phần của seller trong đơn đã hoàn thành.
+    """
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_order_stats')
+    day = models.DateField()
+    orders_total = models.IntegerField(default=0)
+    orders_pending = models.IntegerField(default=0)
+    orders_paid = models.IntegerField(default=0)
+    orders_shipping = models.IntegerField(default=0)
+    orders_completed = models.IntegerField(default=0)
+    orders_canceled = models.IntegerField(default=0)
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'day'], name='uniq_seller_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.seller_id}@{self.day}"
@@ -0,0 +1,151 @@
+"""
+Báo giá giỏ hàng phía server: đơn giá từng dòng và tổng tiền đơn.
+
+- Một query in_bulk cho product (giá, tồn kho, seller, trạng thái) và một query cho
+  biến thể (price_delta, tồn kho) của các product đó. Checkout dùng lại chính
+  snapshot này để validate, ghi OrderItem, trả response và cho reserve() (không
+  query biến thể lần nữa), nên việc kiểm tra giá không tốn thêm query nào.
+- Đơn giá = Product.price + price_delta của biến thể (nếu có).
+- Xem trước (POST /api/orders/quote/) được cache theo hash giỏ hàng + version
+  cache của từng product, nên đổi giá / biến thể là tự động ra báo giá mới.
+"""
+import hashlib
+import json
+from decimal import Decimal
+
+from products.cache import get_cache, get_versions, product_version
+from products.models import Product, ProductAttribute, ProductVariant
+
+# Cột product cần cho checkout (snapshot dùng lại khi tạo đơn và trả response)
+PRODUCT_FIELDS = ('id', 'name', 'image', 'price', 'stock', 'is_active', 'seller_id')
+# Frontend làm tròn tổng tiền tới đồng
+PRICE_TOLERANCE = Decimal('1')
+QUOTE_CACHE_TIMEOUT = 60
+QUOTE_CACHE_PREFIX = 'orders:quote:'
+SHIPPING_FEE = Decimal('0')  # hiện miễn phí vận chuyển
+
+
+class PriceChanged(Exception):
+    """Tổng tiền server tính cao hơn tổng client đã gửi (giá thay đổi sau khi xem giỏ)"""
+
+    def __init__(self, quote):
+        self.quote = quote
+        super().__init__(f'total {quote.total}')
+
+
+def _line_key(line):
+    return (line['product_id'],
+            ProductAttribute.normalize(line.get('color')),
+            ProductAttribute.normalize(line.get('size')))
+
+
+class Quote:
+    """
+    Kết quả báo giá. products / variants là snapshot đã đọc, dùng lại ở checkout;
+    variants: {(product_id, color_key, size_key): ProductVariant}.
+    """
+
+    def __init__(self, lines, products, variants):
+        self.products = products
+        self.variants = variants
+        variant_products = {key[0] for key in variants}
+        self.missing = sorted({line['product_id'] for line in lines} - set(products))
+        self.inactive = sorted(pk for pk, p in products.items() if not p.is_active)
+
+        self.lines, subtotal = [], Decimal('0')
+        for line in lines:
+            product = products.get(line['product_id'])
+            quantity = line['quantity']
+            if product is None:
+                self.lines.append({'product_id': line['product_id'], 'quantity': quantity,
+                                   'available': False, 'reason': 'not_found'})
+                continue
+            variant = self.variants.get(_line_key(line))
+            unit_price = product.price + (variant.price_delta if variant else 0)
+            if variant is not None:
+                stock = variant.stock
+            else:
+                stock = 0 if product.pk in variant_products else product.stock
+            reason = ''
+            if not product.is_active:
+                reason = 'inactive'
+            elif product.pk in variant_products and variant is None:
+                reason = 'variant_not_found'
+            elif stock < quantity:
+                reason = 'out_of_stock'
+            line_total = unit_price * quantity
+            subtotal += line_total
+            self.lines.append({
+                'product_id': product.pk,
+                'variant_id': variant.pk if variant else None,
+                'name': product.name,
+                'color': line.get('color', ''),
+                'size': line.get('size', ''),
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'line_total': line_total,
+                'stock': stock,
+                'available': not reason,
+                'reason': reason,
+            })
+        self.subtotal = subtotal
+        self.shipping_fee = SHIPPING_FEE
+        self.total = subtotal + SHIPPING_FEE
+
+    def unit_price(self, line):
+        variant = self.variants.get(_line_key(line))
+        return self.products[line['product_id']].price + (variant.price_delta if variant else 0)
+
+    def variant_ids(self):
+        """{(product_id, color_key, size_key): variant_id} cho inventory.reserve"""
+        return {key: variant.pk for key, variant in self.variants.items()}
+
+    def costs_more_than(self, client_total):
+        """Tổng phía server cao hơn số client đã hiển thị cho người mua"""
+        return client_total is not None and self.total - client_total >= PRICE_TOLERANCE
+
+    def as_dict(self):
+        return {
+            'lines': [
+                dict(line, unit_price=str(line['unit_price']), line_total=str(line['line_total']))
+                if 'unit_price' in line else line
+                for line in self.lines
+            ],
+            'subtotal': str(self.subtotal),
+            'shipping_fee': str(self.shipping_fee),
+            'total': str(self.total),
+            'available': all(line['available'] for line in self.lines),
+        }
+
+
+def build_quote(lines):
+    """Báo giá từ DB: 1 query product + 1 query biến thể"""
+    product_ids = {line['product_id'] for line in lines}
+    products = Product.objects.only(*PRODUCT_FIELDS).in_bulk(product_ids)
+    variants = {
+        (v.product_id, v.color_key, v.size_key): v
+        for v in ProductVariant.objects.filter(product_id__in=products).only(
+            'id', 'product_id', 'color_key', 'size_key', 'stock', 'price_delta'
+        )
+    }
+    return Quote(lines, products, variants)
+
+
+def cart_hash(lines):
+    normalized = sorted((*_line_key(line), line['quantity']) for line in lines)
+    return hashlib.sha1(json.dumps(normalized).encode('utf-8')).hexdigest()
+
+
+def cached_quote(lines):
+    """Báo giá dạng dict, cache theo hash giỏ hàng + version của các product trong giỏ"""
+    product_ids = sorted({line['product_id'] for line in lines})
+    versions = get_versions([product_version(pk) for pk in product_ids])
+    key = QUOTE_CACHE_PREFIX + cart_hash(lines) + ':' + hashlib.md5(
+        ','.join(map(str, versions)).encode('utf-8')
+    ).hexdigest()
+    cache = get_cache()
+    data = cache.get(key)
+    if data is None:
+        data = build_quote(lines).as_dict()
+        cache.set(key, data, QUOTE_CACHE_TIMEOUT)
+    return data
@@ -1,18 +1,21 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Order, OrderItem
-from products.models import Product
+from .inventory import reserve
+from . import stats
+from .pricing import build_quote, PriceChanged
 
 class OrderItemCreateSerializer(serializers.Serializer):
+    # product_id được kiểm tra theo lô ở OrderSerializer.validate_items (một query)
     product_id = serializers.IntegerField()
-    quantity = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
     color = serializers.CharField(required=False, allow_blank=True)
     size = serializers.CharField(required=False, allow_blank=True)
-    price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    # Chỉ để tham khảo: đơn giá lưu vào đơn do orders/pricing.py tính
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
 
-    def validate_product_id(self, v):
-        if not Product.objects.filter(id=v).exists():
-            raise serializers.ValidationError("Sản phẩm không tồn tại")
-        return v
+class OrderQuoteSerializer(serializers.Serializer):
+    items = OrderItemCreateSerializer(many=True, allow_empty=False)
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemCreateSerializer(many=True)
@@ -24,19 +27,51 @@ class OrderSerializer(serializers.ModelSerializer):
             'address','ward','district','city',
             'payment_method','notes','items','total_amount'
         )
+        extra_kwargs = {'total_amount': {'required': False}}
+
+    def validate_items(self, items):
+        """Báo giá cả giỏ (1 query product + 1 query biến thể); tồn kho do reserve() kiểm tra"""
+        if not items:
+            raise serializers.ValidationError("Đơn hàng cần ít nhất một sản phẩm")
+        quote = build_quote(items)
+        if quote.missing:
+            raise serializers.ValidationError(f"Sản phẩm không tồn tại: {', '.join(map(str, quote.missing))}")
+        if quote.inactive:
+            raise serializers.ValidationError(f"Sản phẩm đã ngừng bán: {', '.join(map(str, quote.inactive))}")
+        self.quote = quote
+        return items
+
+    def validate(self, attrs):
+        # Tổng tiền luôn lấy từ báo giá; chỉ chặn khi người mua sẽ phải trả nhiều hơn số đã thấy
+        if self.quote.costs_more_than(attrs.get('total_amount')):
+            raise PriceChanged(self.quote)
+        attrs['total_amount'] = self.quote.total
+        return attrs
 
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
-        order = Order.objects.create(**validated_data)
-        for it in items_data:
-            OrderItem.objects.create(
-                order=order,
-                product_id=it['product_id'],
-                quantity=it['quantity'],
-                color=it.get('color',''),
-                size=it.get('size',''),
-                price=it['price']
-            )
+        quote = self.quote
+        # Đơn, các dòng và phần trừ kho cùng commit hoặc cùng rollback
+        # (reserve raise InsufficientStock nếu thiếu hàng)
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data)
+            items = OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=quote.products[it['product_id']],
+                    seller_id=quote.products[it['product_id']].seller_id,
+                    quantity=it['quantity'],
+                    color=it.get('color',''),
+                    size=it.get('size',''),
+                    price=quote.unit_price(it)
+                )
+                for it in items_data
+            ])
+            reserve(order, items_data, variants=quote.variant_ids())
+            stats.order_created(order, items)
+        # OrderResponseSerializer dùng lại các dòng vừa tạo (kèm product từ báo giá),
+        # không query lại order.items
+        order.created_items = items
         return order
 
 class OrderItemResponseSerializer(serializers.ModelSerializer):
@@ -74,7 +109,7 @@ class OrderItemResponseSerializer(serializers.ModelSerializer):
 
 
 class OrderResponseSerializer(serializers.ModelSerializer):
-    items = OrderItemResponseSerializer(many=True, read_only=True)
+    items = serializers.SerializerMethodField()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     items_count = serializers.SerializerMethodField()
     buyer_name = serializers.SerializerMethodField()
@@ -102,8 +137,18 @@ class OrderResponseSerializer(serializers.ModelSerializer):
             'created_at',
         ]
 
+    @staticmethod
+    def line_items(obj):
+        # Đơn vừa checkout: created_items do OrderSerializer.create gắn; còn lại đọc
+        # order.items (dùng prefetch nếu có)
+        created = getattr(obj, 'created_items', None)
+        return created if created is not None else obj.items.all()
+
+    def get_items(self, obj):
+        return OrderItemResponseSerializer(self.line_items(obj), many=True, context=self.context).data
+
     def get_items_count(self, obj):
-        return obj.items.count()
+        return len(self.line_items(obj))
 
     def get_buyer_name(self, obj):
         if obj.user:
@@ -112,8 +157,14 @@ class OrderResponseSerializer(serializers.ModelSerializer):
 
 
 class OrderListSerializer(serializers.ModelSerializer):
-    """Lightweight serializer for listing orders"""
+    """
+    Bản gọn cho lịch sử đơn của người mua: items_count lấy từ annotate và tối đa
+    PREVIEW_ITEMS dòng đầu (preview_items, Prefetch đã cắt); chi tiết đủ ở endpoint detail.
+    """
+    PREVIEW_ITEMS = 3
+
     items_count = serializers.SerializerMethodField()
+    items_preview = OrderItemResponseSerializer(source='preview_items', many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     buyer_name = serializers.SerializerMethodField()
 
@@ -129,11 +180,13 @@ class OrderListSerializer(serializers.ModelSerializer):
             'payment_method',
             'total_amount',
             'items_count',
+            'items_preview',
             'created_at',
         ]
 
     def get_items_count(self, obj):
-        return obj.items.count()
+        count = getattr(obj, 'items_count', None)
+        return obj.items.count() if count is None else count
 
     def get_buyer_name(self, obj):
         if obj.user:
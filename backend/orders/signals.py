@@ -1,23 +1,72 @@
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
-from .models import Order
+from .models import Order, OrderItem
+from . import inventory, stats
+from products import rankings
 
 
 @receiver(pre_save, sender=Order)
 def store_previous_status(sender, instance, **kwargs):
-    """Cache the previous status on the instance so we can compare after save."""
+    """Status trước khi save, lấy từ ảnh chụp lúc load (Order.from_db) thay vì SELECT lại."""
     if not instance.pk:
         instance._previous_status = None  # type: ignore[attr-defined]
         return
-    try:
-        previous = sender.objects.get(pk=instance.pk)
-        instance._previous_status = previous.status  # type: ignore[attr-defined]
-    except sender.DoesNotExist:
-        instance._previous_status = None  # type: ignore[attr-defined]
+    loaded = getattr(instance, "_loaded_values", {})
+    if "status" in loaded:
+        instance._previous_status = loaded["status"]  # type: ignore[attr-defined]
+        return
+    # Instance tự dựng kèm pk hoặc status bị defer: không có ảnh chụp, đọc từ DB
+    instance._previous_status = (  # type: ignore[attr-defined]
+        sender.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Order)
+def sync_stock_reservations(sender, instance, created, **kwargs):
+    """Huỷ đơn -> hoàn kho; thanh toán/giao hàng -> giữ hẳn hàng đã đặt"""
+    if created or getattr(instance, "_previous_status", None) == instance.status:
+        return
+    if instance.status == "canceled":
+        inventory.release(instance)
+    elif instance.status in inventory.COMMITTED_STATUSES:
+        inventory.commit(instance)
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rankings(sender, instance, created, **kwargs):
+    """Đơn đã rollup mà bị huỷ / bỏ huỷ -> trừ / cộng lại lượt bán"""
+    previous_status = getattr(instance, "_previous_status", None)
+    if created or previous_status == instance.status:
+        return
+    if instance.status == "canceled":
+        rankings.adjust_for_order(instance, -1)
+    elif previous_status == "canceled":
+        rankings.adjust_for_order(instance, +1)
+
+
+@receiver(post_save, sender=Order)
+def update_seller_stats(sender, instance, created, **kwargs):
+    """Chuyển số đếm / doanh thu của các seller trong đơn sang trạng thái mới"""
+    previous_status = getattr(instance, "_previous_status", None)
+    if created or previous_status is None or previous_status == instance.status:
+        return
+    stats.status_changed(instance, previous_status)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_seller_stats(sender, instance, **kwargs):
+    stats.order_deleted(instance)
+
+
+@receiver(post_save, sender=OrderItem)
+def add_item_to_seller_stats(sender, instance, created, **kwargs):
+    """Dòng tạo lẻ; checkout bulk_create các dòng và gọi stats.order_created trực tiếp"""
+    if created:
+        stats.item_added(instance)
 
 
 @receiver(post_save, sender=Order)
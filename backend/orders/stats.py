@@ -0,0 +1,151 @@
+"""
+Thống kê đơn hàng theo seller, tính sẵn theo ngày (SellerDailyStats) để dashboard
+đọc bằng một câu aggregate thay vì đếm lại toàn bộ lịch sử đơn.
+
+- Đơn tạo qua checkout: order_created() với các dòng vừa bulk_create.
+- OrderItem tạo lẻ (admin, script): item_added() qua signal; đơn chỉ được đếm cho
+  seller ở dòng đầu tiên của seller đó.
+- Đổi trạng thái / xoá đơn: status_changed() / order_deleted() qua signal, một
+  GROUP BY các dòng của đơn theo seller.
+- Số đơn được cộng vào ngày tạo đơn, nên đổi trạng thái chỉ chuyển số đếm giữa các
+  cột của ngày đó. Doanh thu và số lượng chỉ tính đơn completed (như trước).
+- Mọi thay đổi là UPDATE col = col + delta, không đọc-sửa-ghi, nên các đơn cập nhật
+  song song không ghi đè nhau. Dữ liệu cũ: `manage.py rebuild_seller_stats`.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, SellerDailyStats
+
+STATUSES = [value for value, _ in Order.STATUS]
+LINE_TOTAL = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _order_day(order):
+    return timezone.localdate(order.created_at)
+
+
+def _order_deltas(status, sign, units, revenue):
+    """Phần đóng góp của một đơn (theo một seller) vào các cột"""
+    deltas = {'orders_total': sign, f'orders_{status}': sign}
+    if status == 'completed':
+        deltas['units_sold'] = sign * units
+        deltas['revenue'] = sign * revenue
+    return deltas
+
+
+def _apply(day, deltas):
+    """deltas: {seller_id: {field: delta}}; 1 INSERT bỏ qua dòng đã có + 1 UPDATE mỗi seller"""
+    deltas = {
+        seller_id: {field: delta for field, delta in changes.items() if delta}
+        for seller_id, changes in deltas.items()
+    }
+    deltas = {seller_id: changes for seller_id, changes in deltas.items() if changes and seller_id is not None}
+    if not deltas:
+        return
+    with transaction.atomic():
+        SellerDailyStats.objects.bulk_create(
+            [SellerDailyStats(seller_id=seller_id, day=day) for seller_id in deltas],
+            ignore_conflicts=True,
+        )
+        for seller_id, changes in deltas.items():
+            SellerDailyStats.objects.filter(seller_id=seller_id, day=day).update(
+                **{field: F(field) + delta for field, delta in changes.items()}
+            )
+
+
+def _seller_lines(order):
+    """{seller_id: (units, revenue)} của một đơn, một GROUP BY"""
+    rows = OrderItem.objects.filter(order=order).values('seller_id').annotate(
+        units=Sum('quantity'), revenue=Sum(LINE_TOTAL)
+    )
+    return {row['seller_id']: (row['units'], row['revenue']) for row in rows}
+
+
+def order_created(order, items):
+    """Đơn mới cùng các dòng vừa bulk_create (checkout), gom theo seller_id không cần query"""
+    per_seller = defaultdict(lambda: [0, Decimal('0')])
+    for item in items:
+        totals = per_seller[item.seller_id]
+        totals[0] += item.quantity
+        totals[1] += item.price * item.quantity
+    _apply(_order_day(order), {
+        seller_id: _order_deltas(order.status, 1, units, revenue)
+        for seller_id, (units, revenue) in per_seller.items()
+    })
+
+
+def item_added(item):
+    order = item.order
+    seller_id = item.seller_id
+    deltas = {}
+    if not OrderItem.objects.filter(seller_id=seller_id, order_id=order.pk).exclude(pk=item.pk).exists():
+        deltas.update(_order_deltas(order.status, 1, 0, 0))
+    if order.status == 'completed':
+        deltas.update(units_sold=item.quantity, revenue=item.price * item.quantity)
+    _apply(_order_day(order), {seller_id: deltas})
+
+
+def status_changed(order, previous_status):
+    deltas = {}
+    for seller_id, (units, revenue) in _seller_lines(order).items():
+        changes = defaultdict(int, _order_deltas(previous_status, -1, units, revenue))
+        for field, delta in _order_deltas(order.status, 1, units, revenue).items():
+            changes[field] += delta
+        deltas[seller_id] = changes
+    _apply(_order_day(order), deltas)
+
+
+def order_deleted(order):
+    _apply(_order_day(order), {
+        seller_id: _order_deltas(order.status, -1, units, revenue)
+        for seller_id, (units, revenue) in _seller_lines(order).items()
+    })
+
+
+def rebuild():
+    """Tính lại toàn bộ bảng từ OrderItem (backfill / sửa lệch); trả về số dòng"""
+    rows = (
+        # Dòng cũ có seller NULL (seller bị xoá -> SET_NULL) không thuộc thống kê của ai
+        OrderItem.objects.filter(seller__isnull=False).annotate(day=TruncDate('order__created_at'))
+        .values('seller_id', 'day', 'order__status')
+        .annotate(orders=Count('order', distinct=True), units=Sum('quantity'), revenue=Sum(LINE_TOTAL))
+    )
+    stats = {}
+    for row in rows:
+        key = (row['seller_id'], row['day'])
+        entry = stats.setdefault(key, SellerDailyStats(seller_id=key[0], day=key[1]))
+        status = row['order__status']
+        entry.orders_total += row['orders']
+        setattr(entry, f'orders_{status}', getattr(entry, f'orders_{status}') + row['orders'])
+        if status == 'completed':
+            entry.units_sold += row['units']
+            entry.revenue += row['revenue']
+    with transaction.atomic():
+        SellerDailyStats.objects.all().delete()
+        SellerDailyStats.objects.bulk_create(stats.values(), batch_size=500)
+    return len(stats)
+
+
+def seller_summary(seller, start=None, end=None):
+    """Tổng hợp trong khoảng ngày [start, end] (bỏ trống = không giới hạn), một query"""
+    rows = SellerDailyStats.objects.filter(seller=seller)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    agg = rows.aggregate(
+        total=Sum('orders_total'),
+        **{value: Sum(f'orders_{value}') for value in STATUSES},
+        today=Sum('orders_total', filter=Q(day=timezone.localdate())),
+        units_sold=Sum('units_sold'),
+        total_revenue=Sum('revenue'),
+    )
+    summary = {key: value or 0 for key, value in agg.items()}
+    summary['total_revenue'] = float(summary['total_revenue'])
+    return summary
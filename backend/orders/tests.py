@@ -1,8 +1,26 @@
-from django.test import TestCase
+from datetime import timedelta
+import json
+import multiprocessing
+import threading
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
-from products.models import Product
+from products.models import Product, ProductVariant
+from orders import views
+from orders.models import Order, OrderItem, SellerDailyStats, StockReservation
+from orders.inventory import release_expired
+from orders.pricing import build_quote
+from orders.stats import rebuild as rebuild_seller_stats
+from orders.ids import OrderIdGenerator, new_order_id, parse_order_id, MAX_SEQUENCE
+from orders.management.commands.stress_reservations import run_stress
 
 class OrderAPITest(TestCase):
     def setUp(self):
@@ -18,7 +36,7 @@ class OrderAPITest(TestCase):
             name='Test',
             price=100000,
             seller=self.seller,
-            # category=..., slug='test', stock=10, ...
+            stock=10,
         )
 
     def test_create_order(self):
@@ -40,3 +58,541 @@ class OrderAPITest(TestCase):
         resp = self.client.post(reverse('order-create'), data, format='json')
         self.assertEqual(resp.status_code, 201)
         self.assertTrue(resp.data['success'])
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.product = Product.objects.create(name='Shirt', price=100, seller=self.seller, stock=5)
+        self.other = Product.objects.create(name='Hat', price=50, seller=self.seller, stock=1,
+                                            color_options=['Red'], size_options=['M'])
+        self.variant = ProductVariant.objects.create(product=self.other, color='Red', size='M', stock=1)
+
+    def order(self, items, payment_method='cod'):
+        return self.client.post(reverse('order-create'), {
+            "full_name": "A", "phone": "0123", "email": "a@test.com", "address": "123",
+            "ward": "W", "district": "D", "city": "C", "payment_method": payment_method,
+            "items": items,
+        }, format='json')
+
+    def stock(self):
+        self.product.refresh_from_db()
+        self.other.refresh_from_db()
+        self.variant.refresh_from_db()
+        return self.product.stock, self.other.stock, self.variant.stock
+
+    def test_checkout_decrements_stock_per_product_and_variant(self):
+        resp = self.order([
+            {"product_id": self.product.id, "quantity": 2, "price": "100"},
+            {"product_id": self.product.id, "quantity": 1, "price": "100"},
+            {"product_id": self.other.id, "quantity": 1, "color": "red", "size": "M", "price": "50"},
+        ])
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.stock(), (2, 0, 0))
+        statuses = set(StockReservation.objects.values_list('status', flat=True))
+        self.assertEqual(statuses, {StockReservation.COMMITTED})
+
+    def test_shortage_rolls_back_whole_cart(self):
+        resp = self.order([
+            {"product_id": self.product.id, "quantity": 2, "price": "100"},
+            {"product_id": self.other.id, "quantity": 1, "color": "Blue", "size": "M", "price": "50"},
+        ])
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.data['shortages'][0]['reason'], 'variant_not_found')
+        self.assertEqual(self.stock(), (5, 1, 1))
+        self.assertFalse(Order.objects.exists())
+
+    def test_cancel_releases_stock_once(self):
+        resp = self.order([{"product_id": self.product.id, "quantity": 3, "price": "100"}])
+        order = Order.objects.get(order_id=resp.data['order']['order_id'])
+        order.status = 'canceled'
+        order.save()
+        order.save()
+        self.assertEqual(self.stock()[0], 5)
+        self.assertEqual(order.reservations.get().status, StockReservation.RELEASED)
+
+    def test_unpaid_online_order_expires(self):
+        self.order([{"product_id": self.product.id, "quantity": 4, "price": "100"}], payment_method='momo')
+        paid = self.order([{"product_id": self.product.id, "quantity": 1, "price": "100"}], payment_method='vnpay')
+        paid_order = Order.objects.get(order_id=paid.data['order']['order_id'])
+        paid_order.status = 'paid'
+        paid_order.save()
+        self.assertEqual(self.stock()[0], 0)
+
+        self.assertEqual(release_expired(timezone.now() + timedelta(hours=1)), 1)
+        self.assertEqual(self.stock()[0], 4)
+        self.assertEqual(paid_order.reservations.get().status, StockReservation.COMMITTED)
+
+
+class StockReservationStressTest(TransactionTestCase):
+    """Nhiều luồng cùng mua một sản phẩm: không bán vượt tồn kho"""
+
+    def test_parallel_checkouts_do_not_oversell(self):
+        User = get_user_model()
+        seller = User.objects.create_user(username='seller1', email='seller@example.com', password='pass12345')
+        product = Product.objects.create(name='Flash sale', price=1, seller=seller, stock=40)
+
+        stats = run_stress(product.pk, workers=8, attempts=10)
+
+        product.refresh_from_db()
+        reserved = sum(StockReservation.objects.values_list('quantity', flat=True))
+        self.assertEqual(stats['attempts'], 80)
+        self.assertEqual(stats['sold'], 40)
+        self.assertEqual(stats['rejected'], 40)
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(reserved, 40)
+        self.assertEqual(Order.objects.count(), 40)
+
+
+def _generate_ids(count):
+    # Chạy trong process con (fork): không chạm DB
+    return [new_order_id() for _ in range(count)]
+
+
+class OrderIdTest(TestCase):
+    def test_format_is_short_sortable_and_parseable(self):
+        ids = [new_order_id() for _ in range(2000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids, sorted(ids))
+        self.assertTrue(all(len(order_id) == 18 and order_id.startswith('ORD') for order_id in ids))
+        parsed = parse_order_id(ids[-1])
+        self.assertLess(abs((parsed['created_at'] - timezone.now()).total_seconds()), 5)
+        self.assertIsNone(parse_order_id('ORD12345678'))
+
+    def test_sequence_overflow_borrows_next_millisecond(self):
+        generator = OrderIdGenerator(node=3)
+        with mock.patch('orders.ids.time.time', return_value=1800000000.0):
+            ids = [generator() for _ in range(MAX_SEQUENCE + 3)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(parse_order_id(ids[-1])['sequence'], 1)
+        self.assertEqual(parse_order_id(ids[-1])['node'], 3)
+
+    def test_unique_across_threads(self):
+        results = []
+
+        def worker():
+            results.extend(new_order_id() for _ in range(2000))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(results)), 16000)
+
+    @skipUnless('fork' in multiprocessing.get_all_start_methods(), 'cần fork')
+    def test_unique_across_processes(self):
+        with multiprocessing.get_context('fork').Pool(8) as pool:
+            batches = pool.map(_generate_ids, [5000] * 16)
+        ids = [order_id for batch in batches for order_id in batch]
+        self.assertEqual(len(set(ids)), len(ids))
+        # Trong mỗi process mã tăng dần
+        self.assertTrue(all(batch == sorted(batch) for batch in batches))
+        self.assertGreater(len({parse_order_id(order_id)['pid'] for order_id in ids}), 1)
+
+    def test_many_checkouts_in_the_same_second(self):
+        seller = get_user_model().objects.create_user(username='s', email='s@example.com', password='pass12345')
+        product = Product.objects.create(name='Shirt', price=100, seller=seller, stock=50)
+        client = APIClient()
+        for _ in range(20):
+            resp = client.post(reverse('order-create'), {
+                "full_name": "A", "phone": "0123", "email": "a@test.com", "address": "123",
+                "ward": "W", "district": "D", "city": "C", "payment_method": "cod",
+                "items": [{"product_id": product.pk, "quantity": 1, "price": "100"}], "total_amount": "100",
+            }, format='json')
+            self.assertEqual(resp.status_code, 201)
+        self.assertEqual(Order.objects.count(), 20)
+
+
+class CheckoutBulkItemsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        seller = get_user_model().objects.create_user(username='s', email='s@example.com', password='pass12345')
+        self.products = Product.objects.bulk_create([
+            Product(name=f'P{i}', price=10, seller=seller, stock=5) for i in range(30)
+        ])
+
+    def checkout(self, products, **extra):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(reverse('order-create'), {
+                "full_name": "A", "phone": "0123", "email": "a@test.com", "address": "123",
+                "ward": "W", "district": "D", "city": "C", "payment_method": "cod",
+                "items": [{"product_id": p.pk, "quantity": 1, "price": "10"} for p in products],
+                **extra,
+            }, format='json')
+        return resp, len(ctx.captured_queries)
+
+    def test_query_count_grows_only_with_stock_updates(self):
+        resp, small = self.checkout(self.products[:3])
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data['order']['items_count'], 3)
+        self.assertEqual(resp.data['order']['items'][0]['product']['name'], 'P0')
+        with CaptureQueriesContext(connection) as ctx:
+            resp, large = self.checkout(self.products)
+        self.assertEqual(resp.status_code, 201)
+        # Response dùng lại các dòng vừa bulk_create, không SELECT lại order.items
+        self.assertFalse(any(q['sql'].startswith('SELECT') and 'FROM "orders_orderitem"' in q['sql']
+                             for q in ctx.captured_queries))
+        self.assertEqual(OrderItem.objects.filter(order__order_id=resp.data['order']['order_id']).count(), 30)
+        # Mỗi product chỉ còn đúng một UPDATE trừ kho có điều kiện; đọc/ghi item không theo số dòng
+        self.assertEqual(large - small, 27)
+
+    def test_unknown_or_inactive_products_rejected_together(self):
+        Product.objects.filter(pk=self.products[1].pk).update(is_active=False)
+        resp, _ = self.checkout(self.products[:2] + [Product(pk=99999)])
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('99999', str(resp.data['items']))
+        resp, _ = self.checkout(self.products[:2])
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn(str(self.products[1].pk), str(resp.data['items']))
+        self.assertEqual(Order.objects.count(), 0)
+
+
+class CheckoutPricingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        seller = get_user_model().objects.create_user(username='s', email='s@example.com', password='pass12345')
+        self.product = Product.objects.create(name='Shirt', price=100, seller=seller, stock=10)
+        self.other = Product.objects.create(name='Hat', price=50, seller=seller, stock=5,
+                                            color_options=['Red'], size_options=['M', 'L'])
+        ProductVariant.objects.create(product=self.other, color='Red', size='M', stock=5)
+        ProductVariant.objects.create(product=self.other, color='Red', size='L', stock=5, price_delta=20)
+        self.items = [
+            {"product_id": self.product.pk, "quantity": 2, "price": "1"},
+            {"product_id": self.other.pk, "quantity": 1, "color": "red", "size": "L", "price": "1"},
+        ]
+
+    def checkout(self, **extra):
+        return self.client.post(reverse('order-create'), {
+            "full_name": "A", "phone": "0123", "email": "a@test.com", "address": "123",
+            "ward": "W", "district": "D", "city": "C", "payment_method": "cod",
+            "items": self.items, **extra,
+        }, format='json')
+
+    def test_server_prices_override_client_prices(self):
+        resp = self.checkout()
+        self.assertEqual(resp.status_code, 201)
+        order = Order.objects.get(order_id=resp.data['order']['order_id'])
+        self.assertEqual(order.total_amount, 270)
+        prices = sorted(order.items.values_list('price', flat=True))
+        self.assertEqual(prices, [70, 100])
+
+    def test_lower_client_total_is_rejected_with_fresh_quote(self):
+        resp = self.checkout(total_amount="200")
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.data['quote']['total'], '270.00')
+        self.assertFalse(Order.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+        # Client làm tròn, hoặc giá đã giảm: vẫn đặt được với giá server
+        self.assertEqual(self.checkout(total_amount="269.5").status_code, 201)
+        self.assertEqual(self.checkout(total_amount="300").status_code, 201)
+
+    def test_quote_matches_checkout_and_follows_price_changes(self):
+        url = reverse('order-quote')
+        resp = self.client.post(url, {"items": self.items}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['total'], '270.00')
+        self.assertTrue(resp.data['available'])
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(url, {"items": self.items}, format='json')
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        self.product.price = 120
+        self.product.save()
+        resp = self.client.post(url, {"items": self.items}, format='json')
+        self.assertEqual(resp.data['total'], '310.00')
+
+    def test_quote_flags_unavailable_lines(self):
+        quote = build_quote([
+            {"product_id": self.product.pk, "quantity": 11},
+            {"product_id": self.other.pk, "quantity": 1, "color": "Blue", "size": "M"},
+            {"product_id": 99999, "quantity": 1},
+        ])
+        self.assertEqual([line['reason'] for line in quote.lines],
+                         ['out_of_stock', 'variant_not_found', 'not_found'])
+        self.assertEqual(quote.missing, [99999])
+        self.assertFalse(quote.as_dict()['available'])
+
+
+class SellerOrdersTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(username='seller1', email='seller@example.com', password='pass12345')
+        other_seller = User.objects.create_user(username='seller2', email='seller2@example.com', password='pass12345')
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        mine = Product.objects.create(name='Mine', price=100, seller=self.seller, stock=100)
+        theirs = Product.objects.create(name='Theirs', price=50, seller=other_seller, stock=100)
+        for i in range(12):
+            order = Order.objects.create(
+                user=self.buyer, full_name='A', phone='0123', email='a@test.com', address='123',
+                ward='W', district='D', city='C', total_amount=150,
+            )
+            OrderItem.objects.create(order=order, product=mine, quantity=1, price=100)
+            OrderItem.objects.create(order=order, product=theirs, quantity=1, price=50)
+        order = Order.objects.create(
+            full_name='B', phone='0123', email='b@test.com', address='123',
+            ward='W', district='D', city='C', total_amount=50,
+        )
+        OrderItem.objects.create(order=order, product=theirs, quantity=1, price=50)
+        self.foreign_order = order
+        self.client.force_authenticate(self.seller)
+
+    def test_full_list_is_streamed_with_only_seller_items(self):
+        resp = self.client.get(reverse('seller-orders'))
+        self.assertEqual(resp.status_code, 200)
+        data = json.loads(b''.join(resp.streaming_content))
+        self.assertTrue(data['success'])
+        self.assertEqual(data['count'], 12)
+        self.assertEqual(len(data['results']), 12)
+        self.assertTrue(all(o['items_count'] == 1 and o['seller_total'] == 100 for o in data['results']))
+        self.assertEqual(data['results'][0]['items'][0]['product_name'], 'Mine')
+
+    def test_stream_error_closes_json_with_error(self):
+        real = views._seller_order_data
+        calls = []
+
+        def failing(request, order, seller_items):
+            calls.append(order)
+            if len(calls) == 3:
+                raise DatabaseError('connection lost')
+            return real(request, order, seller_items)
+
+        with mock.patch('orders.views._seller_order_data', side_effect=failing):
+            resp = self.client.get(reverse('seller-orders'))
+            data = json.loads(b''.join(resp.streaming_content))
+        self.assertFalse(data['success'])
+        self.assertEqual(data['error'], 'connection lost')
+        self.assertEqual(len(data['results']), 2)
+
+    def test_pages_load_in_constant_queries(self):
+        url = reverse('seller-orders')
+        with CaptureQueriesContext(connection) as ctx:
+            first = self.client.get(url, {'page_size': 5})
+        self.assertEqual(len(first.data['results']), 5)
+        # orders + user (JOIN), dòng của seller + product (JOIN)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        seen = [o['order_id'] for o in first.data['results']]
+        second = self.client.get(first.data['next'])
+        seen += [o['order_id'] for o in second.data['results']]
+        self.assertEqual(len(set(seen)), 10)
+
+    def test_seller_is_denormalised_onto_items(self):
+        self.assertFalse(OrderItem.objects.filter(seller__isnull=True).exists())
+        self.assertEqual(OrderItem.objects.filter(seller=self.seller).count(), 12)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('seller-orders'), {'page_size': 5})
+        self.assertNotIn('products_product', ctx.captured_queries[0]['sql'])
+        resp = self.client.post(reverse('order-create'), {
+            "full_name": "A", "phone": "0123", "email": "a@test.com", "address": "123",
+            "ward": "W", "district": "D", "city": "C", "payment_method": "cod",
+            "items": [{"product_id": OrderItem.objects.first().product_id, "quantity": 1}],
+        }, format='json')
+        order = Order.objects.get(order_id=resp.data['order']['order_id'])
+        self.assertIsNotNone(order.items.get().seller_id)
+
+    def test_detail_forbidden_for_foreign_order(self):
+        resp = self.client.get(reverse('seller-order-detail', args=[self.foreign_order.order_id]))
+        self.assertEqual(resp.status_code, 403)
+        resp = self.client.get(reverse('seller-order-detail', args=['ORDMISSING']))
+        self.assertEqual(resp.status_code, 404)
+
+
+class SellerDailyStatsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(username='seller1', email='seller@example.com', password='pass12345')
+        self.other_seller = User.objects.create_user(username='seller2', email='seller2@example.com', password='pass12345')
+        self.mine = Product.objects.create(name='Mine', price=100, seller=self.seller, stock=100)
+        self.theirs = Product.objects.create(name='Theirs', price=50, seller=self.other_seller, stock=100)
+
+    def checkout(self, items):
+        resp = self.client.post(reverse('order-create'), {
+            "full_name": "A", "phone": "0123", "email": "a@test.com", "address": "123",
+            "ward": "W", "district": "D", "city": "C", "payment_method": "cod", "items": items,
+        }, format='json')
+        self.assertEqual(resp.status_code, 201)
+        return Order.objects.get(order_id=resp.data['order']['order_id'])
+
+    def summary(self, seller, **params):
+        self.client.force_authenticate(seller)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse('seller-order-stats'), params)
+        self.client.force_authenticate(None)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        return resp.data
+
+    def test_counters_follow_checkout_and_status_changes(self):
+        first = self.checkout([
+            {"product_id": self.mine.pk, "quantity": 2},
+            {"product_id": self.mine.pk, "quantity": 1},
+            {"product_id": self.theirs.pk, "quantity": 1},
+        ])
+        second = self.checkout([{"product_id": self.mine.pk, "quantity": 1}])
+        stats = self.summary(self.seller)
+        self.assertEqual((stats['total'], stats['pending'], stats['today']), (2, 2, 2))
+
+        first.status = 'completed'
+        first.save()
+        second.status = 'canceled'
+        second.save()
+        stats = self.summary(self.seller)
+        self.assertEqual((stats['total'], stats['pending'], stats['completed'], stats['canceled']), (2, 0, 1, 1))
+        self.assertEqual((stats['units_sold'], stats['total_revenue']), (3, 300.0))
+        other = self.summary(self.other_seller)
+        self.assertEqual((other['total'], other['completed'], other['total_revenue']), (1, 1, 50.0))
+
+        first.status = 'canceled'
+        first.save()
+        self.assertEqual(self.summary(self.seller)['total_revenue'], 0)
+        second.delete()
+        self.assertEqual(self.summary(self.seller)['total'], 1)
+
+    def test_rebuild_skips_items_without_seller(self):
+        order = self.checkout([
+            {"product_id": self.mine.pk, "quantity": 2},
+            {"product_id": self.theirs.pk, "quantity": 1},
+        ])
+        OrderItem.objects.filter(order=order, product=self.theirs).update(seller=None)
+        out = StringIO()
+        call_command('rebuild_seller_stats', stdout=out)
+        self.assertEqual(list(SellerDailyStats.objects.values_list('seller_id', 'orders_total')), [(self.seller.pk, 1)])
+
+    def test_rebuild_matches_incremental_rollup_and_ranges(self):
+        order = self.checkout([{"product_id": self.mine.pk, "quantity": 2}])
+        order.status = 'completed'
+        order.save()
+        manual = Order.objects.create(full_name='B', phone='0123', email='b@test.com', address='123',
+                                      ward='W', district='D', city='C', total_amount=150)
+        OrderItem.objects.create(order=manual, product=self.mine, quantity=1, price=100)
+        OrderItem.objects.create(order=manual, product=self.mine, quantity=1, price=100)
+        OrderItem.objects.create(order=manual, product=self.theirs, quantity=1, price=50)
+        fields = ('seller_id', 'day', 'orders_total', 'orders_pending', 'orders_completed', 'units_sold', 'revenue')
+        incremental = sorted(SellerDailyStats.objects.values_list(*fields))
+        rebuild_seller_stats()
+        self.assertEqual(sorted(SellerDailyStats.objects.values_list(*fields)), incremental)
+
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=10))
+        rebuild_seller_stats()
+        today = timezone.localdate()
+        recent = self.summary(self.seller, **{'from': str(today - timedelta(days=3))})
+        self.assertEqual((recent['total'], recent['completed']), (1, 0))
+        older = self.summary(self.seller, to=str(today - timedelta(days=3)))
+        self.assertEqual((older['total'], older['total_revenue']), (1, 200.0))
+
+        self.client.force_authenticate(self.seller)
+        resp = self.client.get(reverse('seller-order-stats'), {'from': '2024-02-30'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class BuyerOrderListTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User = get_user_model()
+        seller = User.objects.create_user(username='seller1', email='seller@example.com', password='pass12345')
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        products = Product.objects.bulk_create([
+            Product(name=f'P{i}', price=10, seller=seller, stock=100) for i in range(5)
+        ])
+        for n in range(1, 8):
+            order = Order.objects.create(
+                user=self.buyer, full_name='A', phone='0123', email='a@test.com', address='123',
+                ward='W', district='D', city='C', total_amount=10 * n,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=products[i % 5], seller=seller, quantity=1, price=10)
+                for i in range(n)
+            ])
+        self.client.force_authenticate(self.buyer)
+
+    def test_list_is_compact_and_constant_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse('order-list'))
+        # đơn (+ đếm dòng, JOIN user) và các dòng xem trước
+        self.assertEqual(len(ctx.captured_queries), 2)
+        results = resp.data['results']
+        self.assertEqual(len(results), 7)
+        self.assertEqual([o['items_count'] for o in results], [7, 6, 5, 4, 3, 2, 1])
+        self.assertEqual([len(o['items_preview']) for o in results], [3, 3, 3, 3, 3, 2, 1])
+        self.assertNotIn('items', results[0])
+        self.assertEqual(results[0]['items_preview'][0]['product']['name'], 'P0')
+
+    def test_cursor_pages(self):
+        first = self.client.get(reverse('order-list'), {'page_size': 4})
+        self.assertEqual(len(first.data['results']), 4)
+        second = self.client.get(first.data['next'])
+        self.assertEqual([o['items_count'] for o in second.data['results']], [3, 2, 1])
+        self.assertIsNone(second.data['next'])
+
+    def test_detail_keeps_full_items_without_count_query(self):
+        order = Order.objects.get(total_amount=50)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse('order-detail', args=[order.order_id]))
+        self.assertEqual(resp.data['order']['items_count'], 5)
+        self.assertEqual(len(resp.data['order']['items']), 5)
+        self.assertEqual(len(ctx.captured_queries), 3)
+
+
+class OrderStatusTrackingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(username='seller1', email='seller@example.com', password='pass12345')
+        self.product = Product.objects.create(name='Shirt', price=100, seller=self.seller, stock=5)
+        resp = self.client.post(reverse('order-create'), {
+            "full_name": "A", "phone": "0123", "email": "a@test.com", "address": "123",
+            "ward": "W", "district": "D", "city": "C", "payment_method": "momo",
+            "items": [{"product_id": self.product.pk, "quantity": 2}],
+        }, format='json')
+        self.order_id = resp.data['order']['order_id']
+
+    def load(self):
+        return Order.objects.get(order_id=self.order_id)
+
+    def test_save_reads_previous_status_from_snapshot(self):
+        order = self.load()
+        self.assertEqual(order.get_dirty_fields(), {})
+        order.notes = 'Giao giờ hành chính'
+        self.assertEqual(order.get_dirty_fields(), {'notes': ''})
+        with CaptureQueriesContext(connection) as ctx:
+            order.save()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertTrue(ctx.captured_queries[0]['sql'].startswith('UPDATE'))
+        self.assertEqual(order.get_dirty_fields(), {})
+
+        order.status = 'canceled'
+        with CaptureQueriesContext(connection) as ctx:
+            order.save()
+        self.assertFalse(any(q['sql'].startswith('SELECT "orders_order"') for q in ctx.captured_queries))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_transition_is_conditional(self):
+        paying, expiring = self.load(), self.load()
+        self.assertTrue(paying.transition('paid'))
+        self.assertFalse(expiring.transition('canceled'))
+        self.assertEqual(self.load().status, 'paid')
+        self.assertEqual(self.load().reservations.get().status, StockReservation.COMMITTED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        # Hết hạn giữ hàng sau khi đã thanh toán: không huỷ
+        self.assertEqual(release_expired(timezone.now() + timedelta(hours=1)), 0)
+
+    def test_status_endpoint_rejects_stale_transition(self):
+        self.client.force_authenticate(self.seller)
+        url = reverse('seller-update-order-status', args=[self.order_id])
+        with mock.patch.object(Order, 'transition', return_value=False):
+            resp = self.client.patch(url, {'status': 'shipping'}, format='json')
+        self.assertEqual(resp.status_code, 409)
+        resp = self.client.patch(url, {'status': 'shipping'}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['order']['status'], 'shipping')
@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
     OrderCreateView, 
+    OrderQuoteView,
     OrderListView, 
     OrderDetailView, 
     OrderStatusUpdateView,
@@ -15,6 +16,7 @@ urlpatterns = [
     # Customer endpoints
     # =====================
     path('', OrderCreateView.as_view(), name='order-create'),
+    path('quote/', OrderQuoteView.as_view(), name='order-quote'),
     path('mine/', OrderListView.as_view(), name='order-list'),
     path('<str:order_id>/', OrderDetailView.as_view(), name='order-detail'),
     path('<str:order_id>/status/', OrderStatusUpdateView.as_view(), name='order-status'),
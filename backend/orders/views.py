@@ -2,17 +2,22 @@ from rest_framework import status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-from django.db.models import Q, Count, Sum
+from django.db.models import Q, Count, Sum, Exists, OuterRef, Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from rest_framework.utils.encoders import JSONEncoder
+from products.pagination import OptionalCursorPagination
 from .serializers import (
     OrderSerializer, 
     OrderResponseSerializer, 
-    OrderListSerializer
+    OrderListSerializer,
+    OrderQuoteSerializer,
 )
 from .models import Order, OrderItem
-import time
-
-def generate_order_id():
-    return "ORD" + str(int(time.time()))[-8:]
+from .ids import new_order_id
+from .inventory import InsufficientStock
+from .pricing import PriceChanged, cached_quote
+from .stats import seller_summary
 
 
 class OrderCreateView(APIView):
@@ -20,23 +25,69 @@ class OrderCreateView(APIView):
     
     def post(self, request):
         data = request.data.copy()
-        data['order_id'] = generate_order_id()
+        data['order_id'] = new_order_id()
         serializer = OrderSerializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        order = serializer.save(user=request.user if request.user.is_authenticated else None)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except PriceChanged as exc:
+            return Response({
+                'success': False,
+                'detail': 'Giá sản phẩm đã thay đổi, vui lòng kiểm tra lại giỏ hàng',
+                'quote': exc.quote.as_dict(),
+            }, status=409)
+        try:
+            order = serializer.save(user=request.user if request.user.is_authenticated else None)
+        except InsufficientStock as exc:
+            return Response({
+                'success': False,
+                'detail': 'Một số sản phẩm không đủ hàng',
+                'shortages': exc.shortages,
+            }, status=409)
         return Response({
             'success': True,
             'order': OrderResponseSerializer(order, context={'request': request}).data
         }, status=201)
 
 
+class OrderQuoteView(APIView):
+    """
+    Xem trước giá giỏ hàng (cùng cách tính với lúc đặt hàng)
+    POST /api/orders/quote/  {"items": [{"product_id", "quantity", "color", "size"}, ...]}
+    """
+    permission_classes = []
+
+    def post(self, request):
+        serializer = OrderQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(cached_quote(serializer.validated_data['items']))
+
+
 class OrderListView(APIView):
+    """
+    Lịch sử đơn của người mua (bản gọn, xem OrderListSerializer)
+    GET /api/orders/mine/  (?cursor= / ?page_size= để phân trang)
+    Số query cố định: đơn + đếm dòng (annotate) + các dòng xem trước (một Prefetch).
+    """
     permission_classes = [permissions.IsAuthenticated]
-    
+    ordering = ('-created_at', '-id')
+
     def get(self, request):
-        qs = Order.objects.filter(user=request.user).prefetch_related('items__product').order_by('-created_at')
-        data = [OrderResponseSerializer(o, context={'request': request}).data for o in qs]
-        return Response({'results': data})
+        preview = OrderItem.objects.select_related('product').only(
+            'id', 'order_id', 'quantity', 'price', 'color', 'size',
+            'product__id', 'product__name', 'product__image',
+        ).order_by('id')[:OrderListSerializer.PREVIEW_ITEMS]
+        qs = Order.objects.filter(user=request.user).select_related('user')\
+            .annotate(items_count=Count('items'))\
+            .prefetch_related(Prefetch('items', queryset=preview, to_attr='preview_items'))\
+            .order_by(*self.ordering)
+
+        paginator = OptionalCursorPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
+        if page is not None:
+            return paginator.get_paginated_response(
+                OrderListSerializer(page, many=True, context={'request': request}).data
+            )
+        return Response({'results': OrderListSerializer(qs, many=True, context={'request': request}).data})
 
 
 class OrderDetailView(APIView):
@@ -44,7 +95,7 @@ class OrderDetailView(APIView):
     
     def get(self, request, order_id):
         try:
-            order = Order.objects.prefetch_related('items__product').get(
+            order = Order.objects.select_related('user').prefetch_related('items__product').get(
                 order_id=order_id, 
                 user=request.user
             )
@@ -66,8 +117,8 @@ class OrderStatusUpdateView(APIView):
             order = Order.objects.get(order_id=order_id)
         except Order.DoesNotExist:
             return Response({'detail': 'Không tìm thấy'}, status=404)
-        order.status = status_value
-        order.save()
+        if not order.transition(status_value):
+            return Response({'detail': 'Đơn hàng vừa được cập nhật ở nơi khác, vui lòng tải lại'}, status=409)
         return Response({
             'success': True, 
             'order': OrderResponseSerializer(order, context={'request': request}).data
@@ -78,25 +129,89 @@ class OrderStatusUpdateView(APIView):
 # SELLER ORDER ENDPOINTS
 # ============================================
 
+SELLER_ORDERS_CHUNK = 500
+
+
+def _seller_orders_queryset(seller):
+    """
+    Đơn có sản phẩm của seller, kèm user (JOIN) và chỉ các dòng của seller
+    (một Prefetch đã lọc + JOIN product) -> 2 query cho bao nhiêu đơn cũng được.
+    """
+    seller_items = OrderItem.objects.filter(seller=seller)\
+        .select_related('product').only(
+            'id', 'order_id', 'quantity', 'color', 'size', 'price',
+            'product__id', 'product__name', 'product__image',
+        ).order_by('id')
+    return Order.objects.filter(
+        Exists(OrderItem.objects.filter(seller=seller, order_id=OuterRef('pk')))
+    ).select_related('user').prefetch_related(
+        Prefetch('items', queryset=seller_items, to_attr='seller_items')
+    )
+
+
+def _seller_order_data(request, order, seller_items):
+    seller_total = sum(item.price * item.quantity for item in seller_items)
+    items_data = [{
+        'id': item.id,
+        'product_id': item.product.id,
+        'product_name': item.product.name,
+        'product_image': request.build_absolute_uri(item.product.image.url) if item.product.image else None,
+        'quantity': item.quantity,
+        'color': item.color,
+        'size': item.size,
+        'price': float(item.price),
+        'total': float(item.price * item.quantity),
+    } for item in seller_items]
+    return {
+        'order_id': order.order_id,
+        'buyer_name': order.user.full_name if (order.user and hasattr(order.user, 'full_name')) else order.full_name,
+        'buyer_email': order.email,
+        'buyer_phone': order.phone,
+        'full_name': order.full_name,
+        'address': order.address,
+        'ward': order.ward,
+        'district': order.district,
+        'city': order.city,
+        'payment_method': order.payment_method,
+        'notes': order.notes,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'seller_total': float(seller_total),
+        'items': items_data,
+        'items_count': len(items_data),
+        'created_at': order.created_at,
+    }
+
+
+def _stream_seller_orders(request, orders, count):
+    """
+    JSON {count, results, success} ghi dần từng đơn; prefetch chạy theo từng chunk.
+    Status 200 đã gửi đi nên lỗi giữa chừng (DB, serialize) không thành 500 được:
+    đóng mảng results và kết thúc bằng "success": false kèm "error", body vẫn là JSON hợp lệ.
+    """
+    encoder = JSONEncoder(ensure_ascii=False)
+    yield '{"count": %d, "results": [' % count
+    try:
+        for index, order in enumerate(orders.iterator(chunk_size=SELLER_ORDERS_CHUNK)):
+            yield (',' if index else '') + encoder.encode(_seller_order_data(request, order, order.seller_items))
+    except Exception as e:
+        yield '], "success": false, "error": %s}' % encoder.encode(str(e))
+        return
+    yield '], "success": true}'
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def seller_orders(request):
     """
     Lấy danh sách đơn hàng chứa sản phẩm của seller
-    GET /api/orders/seller/orders/
+    GET /api/orders/seller/orders/?status=&search=
+
+    Có ?cursor= hoặc ?page_size= thì trả theo trang (cursor, số query cố định mỗi trang);
+    không có thì stream toàn bộ list như cũ.
     """
     try:
-        seller = request.user
-        
-        # Lấy order_id của các đơn hàng có chứa sản phẩm của seller
-        order_ids = OrderItem.objects.filter(
-            product__seller=seller
-        ).values_list('order_id', flat=True).distinct()
-        
-        # Lấy các orders
-        orders = Order.objects.filter(
-            id__in=order_ids
-        ).prefetch_related('items__product').order_by('-created_at')
+        orders = _seller_orders_queryset(request.user)
         
         # Filter theo status
         status_filter = request.GET.get('status')
@@ -112,56 +227,20 @@ def seller_orders(request):
                 Q(email__icontains=search) |
                 Q(phone__icontains=search)
             )
-        
-        # Build response với chỉ items của seller
-        orders_data = []
-        for order in orders:
-            # Lọc items thuộc seller
-            seller_items = order.items.filter(product__seller=seller).select_related('product')
-            
-            # Tính tổng tiền của seller trong đơn hàng này
-            seller_total = sum(item.price * item.quantity for item in seller_items)
-            
-            # Serialize items
-            items_data = []
-            for item in seller_items:
-                items_data.append({
-                    'id': item.id,
-                    'product_id': item.product.id,
-                    'product_name': item.product.name,
-                    'product_image': request.build_absolute_uri(item.product.image.url) if item.product.image else None,
-                    'quantity': item.quantity,
-                    'color': item.color,
-                    'size': item.size,
-                    'price': float(item.price),
-                    'total': float(item.price * item.quantity),
-                })
-            
-            orders_data.append({
-                'order_id': order.order_id,
-                'buyer_name': order.user.full_name if (order.user and hasattr(order.user, 'full_name')) else order.full_name,
-                'buyer_email': order.email,
-                'buyer_phone': order.phone,
-                'full_name': order.full_name,
-                'address': order.address,
-                'ward': order.ward,
-                'district': order.district,
-                'city': order.city,
-                'payment_method': order.payment_method,
-                'notes': order.notes,
-                'status': order.status,
-                'status_display': order.get_status_display(),
-                'seller_total': float(seller_total),
-                'items': items_data,
-                'items_count': len(items_data),
-                'created_at': order.created_at,
-            })
-        
-        return Response({
-            'success': True,
-            'count': len(orders_data),
-            'results': orders_data
-        }, status=status.HTTP_200_OK)
+
+        paginator = OptionalCursorPagination()
+        paginator.ordering = ('-created_at', '-id')
+        page = paginator.paginate_queryset(orders, request)
+        if page is not None:
+            return paginator.get_paginated_response(
+                [_seller_order_data(request, order, order.seller_items) for order in page]
+            )
+
+        orders = orders.order_by('-created_at', '-id')
+        return StreamingHttpResponse(
+            _stream_seller_orders(request, orders, orders.count()),
+            content_type='application/json',
+        )
         
     except Exception as e:
         return Response(
@@ -170,56 +249,34 @@ def seller_orders(request):
         )
 
 
+def _parse_day(value):
+    """'' / None -> None; sai định dạng hoặc ngày không tồn tại -> ValueError"""
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return day
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def seller_order_stats(request):
     """
-    Thống kê đơn hàng của seller
-    GET /api/orders/seller/stats/
+    Thống kê đơn hàng của seller (đọc từ bảng SellerDailyStats, một query)
+    GET /api/orders/seller/stats/?from=YYYY-MM-DD&to=YYYY-MM-DD
     """
     try:
-        seller = request.user
-        
-        # Lấy order_id của các đơn hàng có chứa sản phẩm của seller
-        order_ids = OrderItem.objects.filter(
-            product__seller=seller
-        ).values_list('order_id', flat=True).distinct()
-        
-        orders = Order.objects.filter(id__in=order_ids)
-        
-        # Đếm theo status
-        total = orders.count()
-        pending = orders.filter(status='pending').count()
-        paid = orders.filter(status='paid').count()
-        shipping = orders.filter(status='shipping').count()
-        completed = orders.filter(status='completed').count()
-        canceled = orders.filter(status='canceled').count()
-        
-        # Tính tổng doanh thu (chỉ đơn completed)
-        completed_order_ids = orders.filter(status='completed').values_list('id', flat=True)
-        seller_items = OrderItem.objects.filter(
-            order_id__in=completed_order_ids,
-            product__seller=seller
-        ).select_related('product')
-        
-        total_revenue = sum(item.price * item.quantity for item in seller_items)
-        
-        # Đơn hôm nay
-        from datetime import datetime
-        today = datetime.now().date()
-        today_orders = orders.filter(created_at__date=today).count()
-        
-        stats = {
-            'total': total,
-            'pending': pending,
-            'paid': paid,
-            'shipping': shipping,
-            'completed': completed,
-            'canceled': canceled,
-            'today': today_orders,
-            'total_revenue': float(total_revenue),
-        }
-        
+        start = _parse_day(request.GET.get('from'))
+        end = _parse_day(request.GET.get('to'))
+    except ValueError:
+        return Response(
+            {'error': 'Ngày không hợp lệ, dùng định dạng YYYY-MM-DD'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        stats = seller_summary(request.user, start, end)
         return Response(stats, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -241,59 +298,19 @@ def seller_order_detail(request, order_id):
         
         # Lấy order
         try:
-            order = Order.objects.prefetch_related('items__product').get(order_id=order_id)
+            order = _seller_orders_queryset(seller).get(order_id=order_id)
         except Order.DoesNotExist:
+            if Order.objects.filter(order_id=order_id).exists():
+                return Response(
+                    {'error': 'Bạn không có sản phẩm trong đơn hàng này'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
             return Response(
                 {'error': 'Không tìm thấy đơn hàng'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Kiểm tra seller có sản phẩm trong đơn này không
-        seller_items = order.items.filter(product__seller=seller).select_related('product')
-        
-        if not seller_items.exists():
-            return Response(
-                {'error': 'Bạn không có sản phẩm trong đơn hàng này'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        
-        # Tính tổng
-        seller_total = sum(item.price * item.quantity for item in seller_items)
-        
-        # Serialize items
-        items_data = []
-        for item in seller_items:
-            items_data.append({
-                'id': item.id,
-                'product_id': item.product.id,
-                'product_name': item.product.name,
-                'product_image': request.build_absolute_uri(item.product.image.url) if item.product.image else None,
-                'quantity': item.quantity,
-                'color': item.color,
-                'size': item.size,
-                'price': float(item.price),
-                'total': float(item.price * item.quantity),
-            })
-        
-        order_data = {
-            'order_id': order.order_id,
-            'buyer_name': order.user.full_name if (order.user and hasattr(order.user, 'full_name')) else order.full_name,
-            'buyer_email': order.email,
-            'buyer_phone': order.phone,
-            'full_name': order.full_name,
-            'address': order.address,
-            'ward': order.ward,
-            'district': order.district,
-            'city': order.city,
-            'payment_method': order.payment_method,
-            'notes': order.notes,
-            'status': order.status,
-            'status_display': order.get_status_display(),
-            'seller_total': float(seller_total),
-            'items': items_data,
-            'items_count': len(items_data),
-            'created_at': order.created_at,
-        }
+        order_data = _seller_order_data(request, order, order.seller_items)
         
         return Response(order_data, status=status.HTTP_200_OK)
         
@@ -325,8 +342,8 @@ def seller_update_order_status(request, order_id):
         
         # Kiểm tra seller có sản phẩm trong đơn này không
         has_products = OrderItem.objects.filter(
-            order=order,
-            product__seller=seller
+            seller=seller,
+            order=order
         ).exists()
         
         if not has_products:
@@ -351,9 +368,12 @@ def seller_update_order_status(request, order_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Cập nhật
-        order.status = new_status
-        order.save()
+        # Cập nhật (chỉ khi trạng thái chưa bị đổi từ lúc đọc)
+        if not order.transition(new_status):
+            return Response(
+                {'error': 'Đơn hàng vừa được cập nhật ở nơi khác, vui lòng tải lại'},
+                status=status.HTTP_409_CONFLICT
+            )
         
         return Response({
             'success': True,
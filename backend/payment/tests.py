@@ -1,3 +1,71 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders.inventory import release_expired
+from orders.models import Order, StockReservation
+from products.models import Product
+from .utils.vnpay import create_secure_hash
+
+
+class VnpayIpnTest(TestCase):
+    """IPN của VNPay xác nhận thanh toán: đơn chuyển paid, không bị huỷ khi hết hạn giữ hàng"""
+
+    def setUp(self):
+        self.client = APIClient()
+        seller = get_user_model().objects.create_user(
+            username='seller1', email='seller@example.com', password='pass12345'
+        )
+        self.product = Product.objects.create(name='Shirt', price=100, seller=seller, stock=5)
+        resp = self.client.post(reverse('order-create'), {
+            "full_name": "A", "phone": "0123", "email": "a@test.com", "address": "123",
+            "ward": "W", "district": "D", "city": "C", "payment_method": "vnpay",
+            "items": [{"product_id": self.product.id, "quantity": 2, "price": "100"}],
+        }, format='json')
+        self.order = Order.objects.get(order_id=resp.data['order']['order_id'])
+
+    def ipn(self, amount=20000, response_code='00', **extra):
+        params = {
+            'vnp_TxnRef': self.order.order_id, 'vnp_Amount': str(amount),
+            'vnp_ResponseCode': response_code, 'vnp_TransactionStatus': response_code, **extra,
+        }
+        params['vnp_SecureHash'] = create_secure_hash(settings.VNPAY_HASH_SECRET, params)
+        return self.client.get(reverse('vnpay-ipn'), params).json()['RspCode']
+
+    def test_successful_payment_marks_order_paid(self):
+        self.assertEqual(self.ipn(), '00')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+        self.assertEqual(self.order.reservations.get().status, StockReservation.COMMITTED)
+
+        self.assertEqual(release_expired(timezone.now() + timedelta(hours=1)), 0)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+        # IPN gửi lại không đổi gì
+        self.assertEqual(self.ipn(), '02')
+
+    def test_rejected_requests_leave_order_pending(self):
+        self.assertEqual(self.ipn(amount=100), '04')
+        self.assertEqual(self.ipn(vnp_TxnRef='missing'), '01')
+        resp = self.client.get(reverse('vnpay-ipn'), {
+            'vnp_TxnRef': self.order.order_id, 'vnp_Amount': '20000', 'vnp_SecureHash': 'bad',
+        }).json()
+        self.assertEqual(resp['RspCode'], '97')
+        # Thanh toán lỗi: giữ pending, hết hạn thì huỷ và hoàn kho như trước
+        self.assertEqual(self.ipn(response_code='24'), '00')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+        self.assertEqual(release_expired(timezone.now() + timedelta(hours=1)), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
 
-# Create your tests here.
+    def test_ipn_after_expiry_does_not_revive_order(self):
+        release_expired(timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.ipn(), '02')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'canceled')
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import create_vnpay_payment, vnpay_return
+from .views import create_vnpay_payment, vnpay_return, vnpay_ipn
 
 urlpatterns = [
     path('vnpay/', create_vnpay_payment, name='vnpay-create'),
     path('vnpay_return/', vnpay_return, name='vnpay-return'),
+    path('vnpay_ipn/', vnpay_ipn, name='vnpay-ipn'),
 ]
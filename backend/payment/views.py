@@ -1,7 +1,9 @@
+import json
 from datetime import datetime
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from orders.models import Order
 from .utils.vnpay import build_query, create_secure_hash, verify_secure_hash
 
 def _client_ip(request):
@@ -76,13 +78,17 @@ def vnpay_ipn(request):
     if not verify_secure_hash(settings.VNPAY_HASH_SECRET, vnp_data, received_hash):
         return JsonResponse({'RspCode': '97', 'Message': 'Invalid Signature'})
 
-    order_id = vnp_data.get("vnp_TxnRef")
-    amount = int(vnp_data.get("vnp_Amount", 0)) / 100
-    response_code = vnp_data.get("vnp_ResponseCode")
+    order = Order.objects.filter(order_id=vnp_data.get("vnp_TxnRef")).first()
+    if order is None:
+        return JsonResponse({'RspCode': '01', 'Message': 'Order not found'})
+    if vnp_data.get("vnp_Amount") != str(int(order.total_amount * 100)):
+        return JsonResponse({'RspCode': '04', 'Message': 'Invalid amount'})
+    if order.status != 'pending':
+        return JsonResponse({'RspCode': '02', 'Message': 'Order already confirmed'})
 
-    # TODO: Kiểm tra order_id trong DB, so sánh amount, update trạng thái
-    # Giả lập update thành công
-    success = True
-    if success:
-        return JsonResponse({'RspCode': '00', 'Message': 'Confirm Success'})
-    return JsonResponse({'RspCode': '01', 'Message': 'Order not found or invalid'})
+    # Giao dịch lỗi: để đơn pending, release_expired hoàn kho khi hết hạn giữ hàng
+    succeeded = vnp_data.get("vnp_ResponseCode") == "00" and vnp_data.get("vnp_TransactionStatus", "00") == "00"
+    # UPDATE có điều kiện: đơn vừa bị huỷ do quá hạn (hoặc IPN gửi lại) thì không ghi đè
+    if succeeded and not order.transition('paid', expected='pending'):
+        return JsonResponse({'RspCode': '02', 'Message': 'Order already confirmed'})
+    return JsonResponse({'RspCode': '00', 'Message': 'Confirm Success'})
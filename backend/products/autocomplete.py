@@ -0,0 +1,333 @@
+"""
+Autocomplete (gợi ý theo tiền tố) cho tên sản phẩm, danh mục và shop.
+
+Index nằm trong bộ nhớ của process: một mảng key đã sắp xếp, tra bằng bisect
+(O(log n) + số kết quả), thay cho quét icontains trên DB mỗi lần gõ phím.
+- Key được chuẩn hoá: chữ thường, bỏ dấu tiếng Việt ("Áo sơ mi" -> "ao so mi").
+- Mỗi tên được index tại mọi vị trí bắt đầu từ, nên "mi" khớp "Áo sơ mi".
+- Cập nhật từng phần qua signals (products/signals.py); index được dựng lại
+  sau MAX_AGE giây để nhận thay đổi từ các worker khác.
+- Tiền tố ngắn (<= SHORT_PREFIX_LENGTH ký tự) khớp rất nhiều key: top TOP_K mỗi
+  loại được tính một lần rồi sửa tại chỗ khi upsert/remove. Tiền tố dài quét tối
+  đa MAX_SCAN key. Việc xếp hạng chạy ngoài lock, lock
+  chỉ giữ trong lúc bisect và cắt mảng.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+MAX_AGE = getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 300)
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+MIN_QUERY_LENGTH = 2
+SHORT_PREFIX_LENGTH = 4
+MAX_SCAN = 5000
+# Giữ dư so với MAX_LIMIT để xoá / đổi tên vài item không phải tính lại top
+TOP_K = 2 * MAX_LIMIT
+
+PRODUCT = 'product'
+CATEGORY = 'category'
+SHOP = 'shop'
+# Thứ tự ưu tiên khi cùng vị trí khớp
+KIND_ORDER = {PRODUCT: 0, CATEGORY: 1, SHOP: 2}
+
+
+def normalize(text):
+    """Chữ thường, bỏ dấu, gộp khoảng trắng"""
+    if not text:
+        return ''
+    text = text.lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.split())
+
+
+def index_keys(label):
+    """(key, position) cho mỗi vị trí bắt đầu từ trong tên đã chuẩn hoá"""
+    words = normalize(label).split(' ')
+    return [(' '.join(words[i:]), i) for i in range(len(words)) if words[i]]
+
+
+def short_prefixes(keys):
+    """Các tiền tố ngắn (được giữ top-k) của những key này"""
+    return {
+        key[:length]
+        for key, _ in keys
+        for length in range(MIN_QUERY_LENGTH, SHORT_PREFIX_LENGTH + 1)
+        if len(key) >= length
+    }
+
+
+def rank(position, kind, label):
+    """Khớp đầu tên trước, rồi sản phẩm -> danh mục -> shop, tên ngắn trước"""
+    return (min(position, 1), KIND_ORDER[kind], len(label), label)
+
+
+def top_items(matches, labels, kinds, limit):
+    """[(rank, kind, id)] tốt nhất của các entry khớp, mỗi item một lần (chạy ngoài lock)"""
+    best = {}
+    for _, position, kind, pk in matches:
+        if kinds and kind not in kinds:
+            continue
+        label = labels.get((kind, pk))
+        if label is None:
+            continue
+        item_rank = rank(position, kind, label)
+        if (kind, pk) not in best or item_rank < best[(kind, pk)]:
+            best[(kind, pk)] = item_rank
+    return heapq.nsmallest(limit, ((r, kind, pk) for (kind, pk), r in best.items()))
+
+
+class PrefixIndex:
+    """
+    Mảng _keys đã sắp xếp và _entries song song: (key, position, kind, id).
+    _labels giữ tên hiển thị, _by_item giữ các key của mỗi item để xoá/sửa,
+    _top giữ ([(rank, kind, id)] top TOP_K, đã đủ mọi item khớp?) theo (tiền tố ngắn, loại).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._entries = []
+        self._labels = {}
+        self._by_item = {}
+        self._top = {}
+        self._generation = 0
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._labels)
+
+    def load(self, items):
+        """Dựng lại toàn bộ từ [(kind, id, label)] - sort một lần thay vì insort từng key"""
+        entries, labels, by_item = [], {}, {}
+        for kind, pk, label in items:
+            keys = index_keys(label)
+            if not keys:
+                continue
+            labels[(kind, pk)] = label
+            by_item[(kind, pk)] = keys
+            entries.extend((key, position, kind, pk) for key, position in keys)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._keys = [entry[0] for entry in entries]
+            self._labels = labels
+            self._by_item = by_item
+            self._top = {}
+            self._generation += 1
+            self.built_at = time.monotonic()
+
+    def _remove_locked(self, kind, pk):
+        keys = self._by_item.pop((kind, pk), ())
+        for key, position in keys:
+            entry = (key, position, kind, pk)
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+                del self._keys[i]
+        self._labels.pop((kind, pk), None)
+        for prefix in short_prefixes(keys):
+            cached = self._top.get((prefix, kind))
+            if cached is None:
+                continue
+            top, complete = cached
+            top[:] = [candidate for candidate in top if candidate[2] != pk]
+            if len(top) < MAX_LIMIT and not complete:
+                # Phần dự phòng đã cạn, có thể còn item khớp chưa nằm trong top: tính lại
+                del self._top[(prefix, kind)]
+        self._generation += 1
+
+    def upsert(self, kind, pk, label):
+        keys = index_keys(label)
+        with self._lock:
+            if self._labels.get((kind, pk)) == label:
+                return
+            self._remove_locked(kind, pk)
+            if not keys:
+                return
+            self._labels[(kind, pk)] = label
+            self._by_item[(kind, pk)] = keys
+            for key, position in keys:
+                entry = (key, position, kind, pk)
+                i = bisect_left(self._entries, entry)
+                self._entries.insert(i, entry)
+                self._keys.insert(i, key)
+            for prefix in short_prefixes(keys):
+                cached = self._top.get((prefix, kind))
+                if cached is None:
+                    continue
+                top, complete = cached
+                position = min(p for key, p in keys if key.startswith(prefix))
+                candidate = (rank(position, kind, label), kind, pk)
+                if not complete and top and candidate > top[-1]:
+                    # Có thể có item chưa nằm trong top xếp trên nó: bỏ qua để top luôn đúng thứ tự
+                    continue
+                insort(top, candidate)
+                if len(top) > TOP_K:
+                    del top[TOP_K:]
+                    self._top[(prefix, kind)] = (top, False)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._remove_locked(kind, pk)
+
+    def _slice_locked(self, prefix, cap=None):
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + '\uffff', lo=start)
+        if cap is not None:
+            end = min(end, start + cap)
+        return self._entries[start:end]
+
+    def _short_prefix_top(self, prefix, kind, limit):
+        """
+        limit item tốt nhất của một loại cho tiền tố ngắn. Top TOP_K được tính một lần
+        (ngoài lock) rồi upsert/remove sửa tại chỗ.
+        """
+        with self._lock:
+            cached = self._top.get((prefix, kind))
+            if cached is not None:
+                return cached[0][:limit]
+            matches, labels, generation = self._slice_locked(prefix), self._labels, self._generation
+        top = top_items(matches, labels, {kind}, TOP_K + 1)
+        complete = len(top) <= TOP_K
+        top = top[:TOP_K]
+        with self._lock:
+            # Có ghi xen giữa thì không lưu (kết quả có thể đã cũ), lần sau tính lại
+            if generation == self._generation:
+                self._top[(prefix, kind)] = (top, complete)
+        return top[:limit]
+
+    def search(self, query, limit=DEFAULT_LIMIT, kinds=None):
+        """
+        Gợi ý cho tiền tố query: khớp đầu tên trước, rồi khớp giữa tên; trong
+        cùng nhóm ưu tiên sản phẩm -> danh mục -> shop, tên ngắn trước.
+        """
+        prefix = normalize(query)
+        if len(prefix) < MIN_QUERY_LENGTH:
+            return []
+        limit = min(limit, MAX_LIMIT)
+        if len(prefix) <= SHORT_PREFIX_LENGTH:
+            ranked = heapq.nsmallest(limit, (
+                candidate
+                for kind in (kinds or KIND_ORDER) if kind in KIND_ORDER
+                for candidate in self._short_prefix_top(prefix, kind, limit)
+            ))
+        else:
+            with self._lock:
+                matches, labels = self._slice_locked(prefix, cap=MAX_SCAN), self._labels
+            ranked = top_items(matches, labels, kinds, limit)
+        return [{'type': kind, 'id': pk, 'label': r[3]} for r, kind, pk in ranked]
+
+
+index = PrefixIndex()
+_build_lock = threading.Lock()
+
+
+# ============================================
+# NGUỒN DỮ LIỆU
+# ============================================
+
+def shop_label(user):
+    return user.full_name or user.username
+
+
+def is_listed_shop(user):
+    return user.user_type == 'seller' and user.status == 'active' and user.is_active
+
+
+def load_items():
+    """3 query: sản phẩm đang bán, danh mục active, shop active"""
+    from .models import Product, Category
+
+    User = get_user_model()
+    items = [
+        (PRODUCT, pk, name)
+        for pk, name in Product.objects.filter(is_active=True).values_list('id', 'name')
+    ]
+    items += [
+        (CATEGORY, pk, name)
+        for pk, name in Category.objects.filter(is_active=True).values_list('id', 'name')
+    ]
+    items += [
+        (SHOP, pk, full_name or username)
+        for pk, username, full_name in User.objects.filter(
+            user_type='seller', status='active', is_active=True
+        ).values_list('user_id', 'username', 'full_name')
+    ]
+    return items
+
+
+def get_index():
+    """Index đã dựng (lần đầu hoặc khi quá MAX_AGE thì dựng lại)"""
+    if index.built_at is None or time.monotonic() - index.built_at > MAX_AGE:
+        with _build_lock:
+            if index.built_at is None or time.monotonic() - index.built_at > MAX_AGE:
+                index.load(load_items())
+    return index
+
+
+def invalidate():
+    """Buộc dựng lại ở lần đọc kế tiếp (vd. sau khi ghi thẳng bằng queryset.update)"""
+    index.built_at = None
+
+
+def suggest(query, limit=DEFAULT_LIMIT, kinds=None):
+    return get_index().search(query, limit=limit, kinds=kinds)
+
+
+# ============================================
+# CẬP NHẬT TỪ SIGNALS
+# ============================================
+
+def _ready():
+    # Chưa dựng thì không cần cập nhật: lần đọc đầu sẽ load từ DB
+    return index.built_at is not None
+
+
+def sync_products(products):
+    if not _ready():
+        return
+    for product in products:
+        if product.is_active:
+            index.upsert(PRODUCT, product.pk, product.name)
+        else:
+            index.remove(PRODUCT, product.pk)
+
+
+def remove_product(pk):
+    if _ready():
+        index.remove(PRODUCT, pk)
+
+
+def sync_category(category):
+    if not _ready():
+        return
+    if category.is_active:
+        index.upsert(CATEGORY, category.pk, category.name)
+    else:
+        index.remove(CATEGORY, category.pk)
+
+
+def remove_category(pk):
+    if _ready():
+        index.remove(CATEGORY, pk)
+
+
+def sync_shop(user):
+    if not _ready():
+        return
+    if is_listed_shop(user):
+        index.upsert(SHOP, user.pk, shop_label(user))
+    else:
+        index.remove(SHOP, user.pk)
+
+
+def remove_shop(pk):
+    if _ready():
+        index.remove(SHOP, pk)
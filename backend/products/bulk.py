@@ -0,0 +1,222 @@
+"""
+Upsert sản phẩm hàng loạt theo SKU của seller (JSON lines hoặc CSV).
+
+Luồng: parse -> validate từng dòng (không query) -> một query kiểm tra category,
+một query lấy sản phẩm hiện có theo SKU -> ghi theo chunk (bulk_create/bulk_update,
+mỗi chunk một transaction) -> trả kết quả từng dòng dạng stream. Mọi thao tác ghi
+xong trước khi gửi response, nên client ngắt kết nối giữa chừng không để lại upload
+ghi dở và lỗi ghi luôn có trong kết quả.
+"""
+import csv
+import io
+import json
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Product, ProductVariant, Category
+from .signals import products_bulk_created, products_bulk_updated
+from .variants import MANAGED_FIELDS, MANAGED_FIELD_ERROR
+
+MAX_ROWS = 5000
+CHUNK_SIZE = 500
+# Các field dạng list trong CSV được phân tách bằng "|", vd. "Red|Blue"
+LIST_SEPARATOR = '|'
+WRITABLE_FIELDS = (
+    'name', 'description', 'price', 'stock', 'category',
+    'color_options', 'size_options', 'is_active',
+)
+
+
+class BulkUpsertError(Exception):
+    pass
+
+
+class ProductBulkRowSerializer(serializers.Serializer):
+    """Validate một dòng upload; không chạm DB (category kiểm tra theo lô)"""
+    sku = serializers.CharField(max_length=64)
+    name = serializers.CharField(max_length=200, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    price = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    stock = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False, allow_null=True)
+    color_options = serializers.ListField(child=serializers.CharField(max_length=50), required=False)
+    size_options = serializers.ListField(child=serializers.CharField(max_length=50), required=False)
+    is_active = serializers.BooleanField(required=False)
+
+    def validate_sku(self, value):
+        value = value.strip()
+        if not value:
+            raise serializers.ValidationError("SKU không được để trống")
+        return value
+
+    def validate_price(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Giá phải lớn hơn 0")
+        return value
+
+    def validate_stock(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Số lượng không được âm")
+        return value
+
+
+def parse_rows(raw, fmt):
+    """Trả về list dict từ nội dung JSON lines hoặc CSV"""
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8-sig')
+    if fmt == 'csv':
+        rows = []
+        for row in csv.DictReader(io.StringIO(raw)):
+            item = {}
+            for key, value in row.items():
+                if key is None or value is None or value == '':
+                    continue
+                key = key.strip()
+                if key in ('color_options', 'size_options'):
+                    value = [v.strip() for v in value.split(LIST_SEPARATOR) if v.strip()]
+                item[key] = value
+            rows.append(item)
+            if len(rows) > MAX_ROWS:
+                break
+    else:
+        rows = []
+        for lineno, line in enumerate(raw.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                raise BulkUpsertError(f"Dòng {lineno} không phải JSON hợp lệ")
+            if len(rows) > MAX_ROWS:
+                break
+    if len(rows) > MAX_ROWS:
+        raise BulkUpsertError(f"Tối đa {MAX_ROWS} sản phẩm mỗi lần upload")
+    return rows
+
+
+def validate_rows(seller, rows):
+    """
+    Validate toàn bộ upload: trả về (valid, results) với valid = [(index, data)] và
+    results = {index: kết quả lỗi}. Chỉ tốn 3 query cho cả upload.
+    """
+    valid, results, seen = [], {}, set()
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            results[index] = {'row': index, 'status': 'error', 'errors': {'non_field_errors': ['Dòng phải là object']}}
+            continue
+        ser = ProductBulkRowSerializer(data=row)
+        if not ser.is_valid():
+            results[index] = {'row': index, 'sku': row.get('sku'), 'status': 'error', 'errors': ser.errors}
+            continue
+        data = ser.validated_data
+        if data['sku'] in seen:
+            results[index] = {'row': index, 'sku': data['sku'], 'status': 'error',
+                              'errors': {'sku': ['SKU bị lặp trong file upload']}}
+            continue
+        seen.add(data['sku'])
+        valid.append((index, data))
+
+    category_ids = {data['category'] for _, data in valid if data.get('category')}
+    known_categories = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+    existing = {
+        p.sku: p for p in Product.objects.filter(seller=seller, sku__in=[data['sku'] for _, data in valid])
+    }
+    # Product có biến thể: stock/màu/size là bản tóm tắt của ProductVariant, không ghi đè ở đây
+    with_variants = set(
+        ProductVariant.objects.filter(product__in=existing.values()).values_list('product_id', flat=True)
+    ) if existing else set()
+
+    checked = []
+    for index, data in valid:
+        errors = {}
+        if data.get('category') and data['category'] not in known_categories:
+            errors['category'] = ['Danh mục không tồn tại']
+        product = existing.get(data['sku'])
+        if product is None:
+            # Tạo mới cần đủ name + price
+            for field in ('name', 'price'):
+                if field not in data:
+                    errors[field] = ['Trường này là bắt buộc khi tạo mới']
+        elif product.pk in with_variants:
+            for field in MANAGED_FIELDS:
+                if field in data and data[field] != getattr(product, field):
+                    errors[field] = [MANAGED_FIELD_ERROR]
+        if errors:
+            results[index] = {'row': index, 'sku': data['sku'], 'status': 'error', 'errors': errors}
+        else:
+            checked.append((index, data, product))
+    return checked, results
+
+
+def apply_row(product, data):
+    for field in WRITABLE_FIELDS:
+        if field not in data:
+            continue
+        if field == 'category':
+            product.category_id = data['category']
+        else:
+            setattr(product, field, data[field])
+
+
+def write_chunk(seller, chunk):
+    """Ghi một chunk trong một transaction; trả về kết quả từng dòng"""
+    to_create, to_update, update_fields = [], [], set()
+    for index, data, product in chunk:
+        if product is None:
+            product = Product(seller=seller, sku=data['sku'])
+            apply_row(product, data)
+            to_create.append((index, product))
+        else:
+            apply_row(product, data)
+            update_fields.update('category_id' if f == 'category' else f for f in data if f in WRITABLE_FIELDS)
+            to_update.append((index, product))
+
+    with transaction.atomic():
+        created = Product.objects.bulk_create([p for _, p in to_create], batch_size=CHUNK_SIZE)
+        if to_update and update_fields:
+            # bulk_update không tự set auto_now
+            now = timezone.now()
+            for _, product in to_update:
+                product.updated_at = now
+            Product.objects.bulk_update(
+                [p for _, p in to_update], sorted(update_fields | {'updated_at'}), batch_size=CHUNK_SIZE
+            )
+        products_bulk_created(created)
+        products_bulk_updated([p for _, p in to_update])
+
+    results = {}
+    for index, product in to_create:
+        results[index] = {'row': index, 'sku': product.sku, 'status': 'created', 'id': product.pk}
+    for index, product in to_update:
+        results[index] = {'row': index, 'sku': product.sku, 'status': 'updated', 'id': product.pk}
+    return results
+
+
+def upsert_rows(seller, rows):
+    """
+    Validate và ghi toàn bộ upload trước khi trả response; trả về (kết quả từng dòng
+    theo thứ tự, summary). Chunk ghi lỗi đã được rollback: các dòng của nó thành lỗi,
+    các chunk khác vẫn được ghi.
+    """
+    checked, results = validate_rows(seller, rows)
+    for start in range(0, len(checked), CHUNK_SIZE):
+        chunk = checked[start:start + CHUNK_SIZE]
+        try:
+            results.update(write_chunk(seller, chunk))
+        except DatabaseError as exc:
+            for index, data, _ in chunk:
+                results[index] = {'row': index, 'sku': data['sku'], 'status': 'error',
+                                  'errors': {'non_field_errors': [f'Lỗi khi ghi: {exc}']}}
+    summary = {'created': 0, 'updated': 0, 'error': 0}
+    for result in results.values():
+        summary[result['status']] += 1
+    return [results[index] for index in sorted(results)], summary
+
+
+def result_lines(results, summary):
+    """Generator NDJSON: một dòng kết quả cho mỗi dòng input, cuối cùng là summary"""
+    for result in results:
+        yield json.dumps(result, ensure_ascii=False, default=str) + '\n'
+    yield json.dumps({'summary': summary}) + '\n'
@@ -0,0 +1,300 @@
+"""
+Cache phản hồi (server-side) cho các endpoint catalog đọc nhiều.
+
+- Key = namespace + host + query params đã chuẩn hoá + các version counter liên quan.
+- Version counter (per-product, per-category, toàn bộ products/categories) được
+  bump trong products/signals.py khi save/delete, nên entry cũ tự động không còn
+  được tra tới (và hết hạn theo TTL).
+- Backend cắm được qua CACHES['catalog'] (locmem hoặc file).
+- Chống stampede: chỉ một request tính lại một key tại một thời điểm, các request
+  khác chờ ngắn rồi đọc kết quả.
+- ETag/Last-Modified: 304 Not Modified được trả trước khi serialize. Last-Modified là
+  mốc muộn hơn giữa updated_at và lần bump version gần nhất.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+CACHE_ALIAS = getattr(settings, 'CATALOG_CACHE_ALIAS', 'catalog')
+RESPONSE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+
+VERSION_PREFIX = 'catalog:ver:'
+BUMPED_AT_SUFFIX = ':at'
+RESPONSE_PREFIX = 'catalog:resp:'
+PART_PREFIX = 'catalog:part:'
+LOCK_PREFIX = 'catalog:lock:'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+# ============================================
+# VERSION COUNTERS
+# ============================================
+
+def _initial_version():
+    # Dựa trên thời gian để counter bị evict rồi tạo lại vẫn lớn hơn giá trị cũ
+    return time.time_ns()
+
+
+def get_versions(names):
+    """Đọc nhiều version counter trong một lần gọi cache"""
+    cache = get_cache()
+    keys = [VERSION_PREFIX + name for name in names]
+    found = cache.get_many(keys)
+    result = []
+    for name, key in zip(names, keys):
+        value = found.get(key)
+        if value is None:
+            cache.add(key, _initial_version(), None)
+            value = cache.get(key)
+        result.append(value)
+    return result
+
+
+def bump_versions(*names):
+    cache = get_cache()
+    for name in set(names):
+        key = VERSION_PREFIX + name
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+    # Thời điểm bump, để Last-Modified cũng đổi khi có xoá / đổi bộ đếm denormalised
+    # (những thay đổi không làm tăng updated_at)
+    now = time.time()
+    cache.set_many({VERSION_PREFIX + name + BUMPED_AT_SUFFIX: now for name in names}, None)
+
+
+def last_bumped(names):
+    """
+    Lần bump gần nhất (datetime UTC) của các version counter. Counter chưa có mốc
+    (vừa tạo / bị evict) được tính là đổi ngay bây giờ, giống version mới tạo làm ETag đổi.
+    """
+    cache = get_cache()
+    keys = [VERSION_PREFIX + name + BUMPED_AT_SUFFIX for name in names]
+    found = cache.get_many(keys)
+    stamps = []
+    for key in keys:
+        value = found.get(key)
+        if value is None:
+            cache.add(key, time.time(), None)
+            value = cache.get(key)
+        stamps.append(value)
+    return datetime.fromtimestamp(max(stamps), tz=timezone.utc) if stamps else None
+
+
+def product_version(pk):
+    return f'product:{pk}'
+
+
+def category_version(pk):
+    return f'category:{pk}'
+
+
+def seller_version(pk):
+    return f'seller:{pk}'
+
+
+PRODUCTS_VERSION = 'products'
+CATEGORIES_VERSION = 'categories'
+
+
+# ============================================
+# METRICS
+# ============================================
+
+class CacheStats:
+    """Đếm hit/miss theo namespace (trong process hiện tại)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, namespace, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {'hit': 0, 'miss': 0, 'wait_hit': 0})
+            counters[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            data = {}
+            for namespace, counters in self._counters.items():
+                hits = counters['hit'] + counters['wait_hit']
+                total = hits + counters['miss']
+                data[namespace] = dict(counters, hit_ratio=round(hits / total, 4) if total else 0.0)
+            return data
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+stats = CacheStats()
+
+
+# ============================================
+# PART CACHE
+# ============================================
+
+def cached_part(namespace, key, version_names, compute, timeout=RESPONSE_TIMEOUT):
+    """
+    Cache một phần payload (không phụ thuộc người xem) theo version counter, để
+    endpoint ghép nhiều phần (vd. trang sản phẩm) vẫn dùng lại được các phần
+    chung kể cả khi request đã đăng nhập. compute() trả về None thì không lưu.
+    """
+    versions = get_versions(version_names)
+    cache = get_cache()
+    cache_key = PART_PREFIX + namespace + ':' + hashlib.md5(
+        f"{key}|{','.join(f'{n}={v}' for n, v in zip(version_names, versions))}".encode('utf-8')
+    ).hexdigest()
+    data = cache.get(cache_key)
+    if data is not None:
+        stats.record(namespace, 'hit')
+        return data
+    stats.record(namespace, 'miss')
+    data = compute()
+    if data is not None:
+        cache.set(cache_key, data, timeout)
+    return data
+
+
+# ============================================
+# RESPONSE CACHE + CONDITIONAL GET
+# ============================================
+
+def normalize_params(params):
+    return '&'.join(
+        f'{key}={value}'
+        for key in sorted(params.keys())
+        for value in sorted(params.getlist(key))
+    )
+
+
+def _representation(request, version_names, versions):
+    return '|'.join([
+        request.get_host(),
+        request.path,
+        normalize_params(request.query_params),
+        ','.join(f'{n}={v}' for n, v in zip(version_names, versions)),
+    ])
+
+
+def make_etag(representation, last_modified, token=''):
+    """ETag mạnh: hash của updated_at (max) + token phụ + representation (params, versions)"""
+    stamp = last_modified.isoformat() if last_modified else ''
+    raw = f'{stamp}|{token}|{representation}'
+    return '"' + hashlib.md5(raw.encode('utf-8')).hexdigest() + '"'
+
+
+def is_cacheable(request):
+    return request.method == 'GET' and not (request.user and request.user.is_authenticated)
+
+
+def _not_modified(request, etag, last_modified):
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+def _with_validators(response, etag, last_modified):
+    if etag:
+        response['ETag'] = etag
+        # Cho phép browser/proxy lưu nhưng luôn revalidate bằng If-None-Match
+        patch_cache_control(response, no_cache=True)
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def cached_response(request, namespace, version_names, compute, validators=None):
+    """
+    Trả về Response cho endpoint catalog với hai lớp:
+
+    1. Conditional GET: nếu If-None-Match/If-Modified-Since còn khớp thì trả 304
+       ngay, không serialize. validators() trả về (last_modified, token) và chỉ
+       được gọi khi không có entry trong cache.
+    2. Response cache: GET ẩn danh, status 200 được lưu kèm ETag/Last-Modified.
+    """
+    versions = get_versions(version_names)
+    representation = _representation(request, version_names, versions)
+    cacheable = is_cacheable(request)
+    cache = get_cache()
+    key = RESPONSE_PREFIX + namespace + ':' + hashlib.md5(representation.encode('utf-8')).hexdigest()
+
+    if cacheable:
+        entry = cache.get(key)
+        if entry is not None:
+            stats.record(namespace, 'hit')
+            return _from_entry(request, entry, 'HIT')
+
+    etag = last_modified = None
+    if validators is not None:
+        found = validators()
+        if found is not None:
+            last_modified, token = found
+            # updated_at không đổi khi xoá dòng hay đổi bộ đếm: lấy mốc muộn hơn giữa
+            # updated_at và lần bump version gần nhất
+            bumped = last_bumped(version_names)
+            if bumped is not None and (last_modified is None or bumped > last_modified):
+                last_modified = bumped
+            etag = make_etag(representation, last_modified, token)
+            not_modified = _not_modified(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+
+    if not cacheable:
+        return _with_validators(compute(), etag, last_modified)
+
+    lock_key = LOCK_PREFIX + key
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        # Một request khác đang tính key này: chờ ngắn thay vì cùng đập vào DB
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None:
+                stats.record(namespace, 'wait_hit')
+                return _from_entry(request, entry, 'HIT')
+        stats.record(namespace, 'miss')
+        return _with_validators(compute(), etag, last_modified)
+
+    try:
+        stats.record(namespace, 'miss')
+        response = compute()
+        if response.status_code == 200:
+            cache.set(key, {
+                'data': response.data,
+                'etag': etag,
+                'last_modified': last_modified,
+            }, RESPONSE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return _with_validators(response, etag, last_modified)
+    finally:
+        cache.delete(lock_key)
+
+
+def _from_entry(request, entry, label):
+    etag, last_modified = entry['etag'], entry['last_modified']
+    if etag:
+        not_modified = _not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+    response = Response(entry['data'])
+    response['X-Cache'] = label
+    return _with_validators(response, etag, last_modified)
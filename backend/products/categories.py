@@ -0,0 +1,94 @@
+from django.db.models import Q
+
+from .cache import get_cache, get_versions, CATEGORIES_VERSION
+from .models import Category
+
+MAP_PREFIX = 'catalog:category-map:'
+MAP_TIMEOUT = 3600
+
+
+def get_category_map():
+    """
+    {id: node} của toàn bộ danh mục, dựng từ một query và cache theo version
+    'categories' (bump khi category thay đổi hoặc product_count thay đổi).
+    """
+    version, = get_versions([CATEGORIES_VERSION])
+    cache = get_cache()
+    key = f'{MAP_PREFIX}{version}'
+    nodes = cache.get(key)
+    if nodes is None:
+        queryset = Category.objects.order_by('path')
+        nodes = {
+            c.id: {
+                'id': c.id,
+                'name': c.name,
+                'slug': c.slug,
+                'parent': c.parent_id,
+                'path': c.path,
+                'depth': c.depth,
+                'is_active': c.is_active,
+                'product_count': c.product_count,
+            }
+            for c in queryset
+        }
+        cache.set(key, nodes, MAP_TIMEOUT)
+    return nodes
+
+
+def build_tree(nodes, active_only=False):
+    """Cây lồng nhau (children sắp theo tên) từ map phẳng; active_only bỏ cả nhánh inactive"""
+    children = {}
+    for node in nodes.values():
+        if active_only and not node['is_active']:
+            continue
+        children.setdefault(node['parent'], []).append(node)
+
+    def attach(parent_id):
+        result = []
+        for node in sorted(children.get(parent_id, []), key=lambda n: n['name']):
+            result.append(dict(node, children=attach(node['id'])))
+        return result
+
+    return attach(None)
+
+
+def get_breadcrumbs(category_id, nodes=None):
+    """Danh sách tổ tiên (gốc -> node) lấy từ path, không cần query khi map đã cache"""
+    nodes = get_category_map() if nodes is None else nodes
+    node = nodes.get(category_id)
+    if node is None:
+        return None
+    return [
+        {'id': nodes[pk]['id'], 'name': nodes[pk]['name'], 'slug': nodes[pk]['slug']}
+        for pk in Category.ids_in_path(node['path'])
+        if pk in nodes
+    ]
+
+
+def ancestor_ids(category_ids):
+    """Id của các category và toàn bộ tổ tiên của chúng"""
+    category_ids = [pk for pk in category_ids if pk]
+    if not category_ids:
+        return set()
+    nodes = get_category_map()
+    result = set(category_ids)
+    for pk in category_ids:
+        node = nodes.get(pk)
+        if node:
+            result.update(Category.ids_in_path(node['path']))
+    return result
+
+
+def category_filter(category_id, include_descendants=True):
+    """
+    Q lọc sản phẩm theo category. Mặc định gồm cả danh mục con: một range query
+    [path, path~) trên index của Category.path thay vì đệ quy theo parent.
+    """
+    try:
+        category_id = int(category_id)
+    except (TypeError, ValueError):
+        return Q(pk__in=[])
+    node = get_category_map().get(category_id) if include_descendants else None
+    if node is None or not node['path']:
+        return Q(category_id=category_id)
+    return Q(category__path__gte=node['path'], category__path__lt=node['path'] + Category.PATH_END)
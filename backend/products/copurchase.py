@@ -0,0 +1,134 @@
+"""
+"Thường được mua cùng": ma trận đồng mua product x product, tính từ OrderItem.
+
+- Mỗi lần chạy chỉ đọc các đơn có id > watermark (RollupCheckpoint 'co_purchase')
+  và tạo trước SAFETY_LAG, theo lô BATCH_ORDERS đơn (mỗi lô một transaction).
+- Một lô: ma trận thưa B (đơn x product, giá trị 0/1) -> C = Bᵀ·B bằng scipy.sparse,
+  bỏ đường chéo; C[i, j] = số đơn có cả i và j. C được cộng dồn vào ProductCoPurchase.
+- Lưu mọi cặp đã từng mua cùng (chỉ các ô khác 0) để cộng dồn chính xác; top-N
+  của một product đọc thẳng theo index (product, -count).
+- Đơn đã huỷ lúc gộp không được tính; đơn huỷ sau đó vẫn giữ (vẫn là tín hiệu quan tâm).
+  Chạy lại từ đầu bằng rebuild() / `manage.py rollup_co_purchases --full`.
+"""
+import numpy as np
+from scipy import sparse
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Product, ProductCoPurchase, RollupCheckpoint
+from .rankings import SAFETY_LAG
+
+CHECKPOINT = 'co_purchase'
+BATCH_ORDERS = 5000
+BATCH_SIZE = 500
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+
+def co_occurrence(order_ids, product_ids):
+    """
+    Từ các cặp (order, product) song song -> (product, related, count) của Bᵀ·B,
+    không tính đường chéo. Mỗi cặp product xuất hiện theo cả hai chiều.
+    """
+    orders, order_idx = np.unique(order_ids, return_inverse=True)
+    products, product_idx = np.unique(product_ids, return_inverse=True)
+    basket = sparse.csr_matrix(
+        (np.ones(len(order_idx), dtype=np.int32), (order_idx, product_idx)),
+        shape=(len(orders), len(products)),
+    )
+    # Một product nhiều dòng trong đơn (khác màu/size) chỉ tính một lần
+    basket.data[:] = 1
+    matrix = (basket.T @ basket).tocoo()
+    off_diagonal = matrix.row != matrix.col
+    return (
+        products[matrix.row[off_diagonal]],
+        products[matrix.col[off_diagonal]],
+        matrix.data[off_diagonal],
+    )
+
+
+def _apply_deltas(rows, cols, counts):
+    """Cộng dồn các ô của C vào ProductCoPurchase; trả về số cặp đã ghi"""
+    deltas = dict(zip(zip(rows.tolist(), cols.tolist()), counts.tolist()))
+    if not deltas:
+        return 0
+    touched = sorted({product_id for product_id, _ in deltas})
+    current = {}
+    for start in range(0, len(touched), BATCH_SIZE):
+        for product_id, related_id, count in ProductCoPurchase.objects.filter(
+            product_id__in=touched[start:start + BATCH_SIZE]
+        ).values_list('product_id', 'related_id', 'count'):
+            if (product_id, related_id) in deltas:
+                current[(product_id, related_id)] = count
+
+    now = timezone.now()
+    ProductCoPurchase.objects.bulk_create(
+        [
+            ProductCoPurchase(product_id=product_id, related_id=related_id,
+                              count=current.get((product_id, related_id), 0) + delta, updated_at=now)
+            for (product_id, related_id), delta in deltas.items()
+        ],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True, unique_fields=['product', 'related'], update_fields=['count', 'updated_at'],
+    )
+    return len(deltas)
+
+
+def rollup(now=None, batch_orders=BATCH_ORDERS):
+    """Gộp các đơn mới (sau watermark) vào ma trận đồng mua; trả về thống kê"""
+    from orders.models import Order, OrderItem
+
+    now = now or timezone.now()
+    stats = {'orders': 0, 'pairs': 0}
+    while True:
+        with transaction.atomic():
+            checkpoint, _ = RollupCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT)
+            order_ids = list(
+                Order.objects.filter(pk__gt=checkpoint.last_id, created_at__lte=now - SAFETY_LAG)
+                .order_by('pk').values_list('pk', flat=True)[:batch_orders]
+            )
+            if not order_ids:
+                break
+            pairs = np.array(list(
+                OrderItem.objects.filter(order__gt=checkpoint.last_id, order__lte=order_ids[-1])
+                .exclude(order__status='canceled')
+                .values_list('order', 'product')
+            ), dtype=np.int64).reshape(-1, 2)
+            if len(pairs):
+                stats['pairs'] += _apply_deltas(*co_occurrence(pairs[:, 0], pairs[:, 1]))
+            stats['orders'] += len(order_ids)
+            checkpoint.last_id = order_ids[-1]
+            checkpoint.save(update_fields=['last_id', 'updated_at'])
+        if len(order_ids) < batch_orders:
+            break
+    stats['last_id'] = RollupCheckpoint.objects.filter(name=CHECKPOINT).values_list('last_id', flat=True).first() or 0
+    return stats
+
+
+def rebuild(now=None):
+    """Xoá ma trận và gộp lại toàn bộ lịch sử đơn"""
+    with transaction.atomic():
+        ProductCoPurchase.objects.all().delete()
+        RollupCheckpoint.objects.update_or_create(name=CHECKPOINT, defaults={'last_id': 0})
+    return rollup(now)
+
+
+def bought_together(product_ids, limit=DEFAULT_LIMIT):
+    """
+    [(product, score)] đang bán, hay được mua cùng product_ids (không gồm chính chúng).
+    Một product: đọc top-N theo index; nhiều product (giỏ hàng): cộng điểm các dòng.
+    """
+    product_ids = list(product_ids)
+    rows = ProductCoPurchase.objects.filter(
+        product_id__in=product_ids, related__is_active=True
+    ).exclude(related_id__in=product_ids)
+    if len(product_ids) == 1:
+        rows = rows.order_by('-count', 'related_id').values_list('related_id', 'count')
+    else:
+        rows = rows.values('related_id').annotate(score=Sum('count'))\
+            .order_by('-score', 'related_id').values_list('related_id', 'score')
+    scores = dict(rows[:limit])
+    products = Product.objects.in_bulk(list(scores))
+    return [(products[pk], score) for pk, score in scores.items() if pk in products]
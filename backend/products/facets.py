@@ -0,0 +1,104 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Min, Q
+
+from .models import ProductAttribute
+
+# Khoảng giá (VND) cho facet giá: (key, min, max) - max=None là không giới hạn
+PRICE_BUCKETS = (
+    ('0-200000', 0, 200_000),
+    ('200000-500000', 200_000, 500_000),
+    ('500000-1000000', 500_000, 1_000_000),
+    ('1000000-2000000', 1_000_000, 2_000_000),
+    ('2000000-5000000', 2_000_000, 5_000_000),
+    ('5000000+', 5_000_000, None),
+)
+
+FACETS_CACHE_TIMEOUT = getattr(settings, 'PRODUCT_FACETS_CACHE_TIMEOUT', 30)
+
+
+def _bucket_q(low, high):
+    q = Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def compute_facets(queryset):
+    """
+    Đếm facet category / giá / màu / size cho một queryset sản phẩm đã lọc.
+
+    - Category + khoảng giá: một câu GROUP BY category với COUNT có điều kiện
+      cho từng khoảng giá (một lượt quét qua tập sản phẩm).
+    - Màu + size: một câu GROUP BY trên bảng ProductAttribute (inverted index),
+      không phải đọc JSON của từng dòng.
+    """
+    queryset = queryset.order_by()
+    bucket_aggs = {
+        f'bucket_{i}': Count('id', filter=_bucket_q(low, high))
+        for i, (_key, low, high) in enumerate(PRICE_BUCKETS)
+    }
+    rows = queryset.values('category_id', 'category__name').annotate(count=Count('id'), **bucket_aggs)
+
+    total = 0
+    categories = []
+    bucket_counts = [0] * len(PRICE_BUCKETS)
+    for row in rows:
+        total += row['count']
+        for i in range(len(PRICE_BUCKETS)):
+            bucket_counts[i] += row[f'bucket_{i}']
+        if row['category_id'] is not None:
+            categories.append({
+                'id': row['category_id'],
+                'name': row['category__name'],
+                'count': row['count'],
+            })
+    categories.sort(key=lambda c: (-c['count'], c['name']))
+
+    price = [
+        {'key': key, 'min': low, 'max': high, 'count': bucket_counts[i]}
+        for i, (key, low, high) in enumerate(PRICE_BUCKETS)
+    ]
+
+    attributes = {ProductAttribute.COLOR: [], ProductAttribute.SIZE: []}
+    attr_rows = ProductAttribute.objects.filter(product_id__in=queryset.values('id'))\
+        .values('attribute', 'value')\
+        .annotate(count=Count('product_id'), label=Min('label'))\
+        .order_by('attribute', '-count', 'value')
+    for row in attr_rows:
+        attributes[row['attribute']].append({
+            'value': row['value'],
+            'label': row['label'] or row['value'],
+            'count': row['count'],
+        })
+
+    return {
+        'total': total,
+        'categories': categories,
+        'price': price,
+        'colors': attributes[ProductAttribute.COLOR],
+        'sizes': attributes[ProductAttribute.SIZE],
+    }
+
+
+def facets_cache_key(params):
+    """Khoá cache dựa trên query params đã chuẩn hoá (sắp xếp key và value)"""
+    normalized = '&'.join(
+        f'{key}={value}'
+        for key in sorted(params.keys())
+        for value in sorted(params.getlist(key))
+    )
+    digest = hashlib.md5(normalized.encode('utf-8')).hexdigest()
+    return f'product-facets:{digest}'
+
+
+def get_facets(queryset, params):
+    """compute_facets có cache TTL ngắn theo bộ lọc hiện tại"""
+    key = facets_cache_key(params)
+    data = cache.get(key)
+    if data is None:
+        data = compute_facets(queryset)
+        cache.set(key, data, FACETS_CACHE_TIMEOUT)
+    return data
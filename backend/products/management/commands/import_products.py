@@ -0,0 +1,299 @@
+import csv
+import os
+import random
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.models import Product, Category
+from products.signals import products_bulk_created
+
+User = get_user_model()
+
+COLORS = [
+    'Red', 'Blue', 'Green', 'Black', 'White', 'Yellow',
+    'Pink', 'Gray', 'Purple', 'Orange', 'Brown', 'Beige',
+    'Turquoise', 'Navy', 'Olive'
+]
+SIZES = ['S', 'M', 'L', 'XL', 'XXL']
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp')
+SKU_PREFIX = 'styles-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Import sản phẩm từ styles.csv (fashion dataset) theo dạng stream: đọc từng chunk, "
+        "resolve category theo lô, copy ảnh song song, bulk_create và embed theo batch. "
+        "Chạy lại nhiều lần an toàn (bỏ qua SKU đã có)."
+    )
+
+    def add_arguments(self, parser):
+        scripts_dir = Path(settings.BASE_DIR) / "scripts"
+        parser.add_argument("--styles", default=str(scripts_dir / "styles.csv"), help="Đường dẫn styles.csv")
+        parser.add_argument("--images-csv", default=str(scripts_dir / "images.csv"), help="Đường dẫn images.csv (filename,link)")
+        parser.add_argument("--image-dir", default=os.environ.get("IMPORT_IMAGE_DIR", ""),
+                            help="Thư mục ảnh local <id>.jpg (mặc định $IMPORT_IMAGE_DIR)")
+        parser.add_argument("--sellers", default="seller1,seller2,seller3", help="Danh sách username seller")
+        parser.add_argument("--limit", type=int, default=None, help="Chỉ đọc N dòng đầu")
+        parser.add_argument("--sample", type=int, default=None, help="Lấy ngẫu nhiên N dòng (reservoir sampling)")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=8, help="Số thread copy ảnh")
+        parser.add_argument("--embed-batch-size", type=int, default=64)
+        parser.add_argument("--no-embed", action="store_true", help="Không tạo CLIP embedding")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **opts):
+        styles_csv = Path(opts["styles"])
+        if not styles_csv.exists():
+            raise CommandError(f"Không tìm thấy file: {styles_csv}")
+
+        self.rng = random.Random(opts["seed"])
+        self.chunk_size = max(1, opts["chunk_size"])
+        self.workers = max(1, opts["workers"])
+        self.embed_batch_size = max(1, opts["embed_batch_size"])
+        self.image_dir = Path(opts["image_dir"]) if opts["image_dir"] else None
+        if self.image_dir and not self.image_dir.exists():
+            self.stdout.write(f"⚠️ Thư mục ảnh local chưa tồn tại: {self.image_dir}")
+            self.image_dir = None
+
+        usernames = [u.strip() for u in opts["sellers"].split(",") if u.strip()]
+        self.sellers = list(User.objects.filter(username__in=usernames).order_by("username"))
+        if not self.sellers:
+            raise CommandError(f"Không tìm thấy seller nào trong: {', '.join(usernames)}")
+
+        self.embed = None
+        if not opts["no_embed"] and self.image_dir:
+            try:
+                from clip_service import embed_images
+                self.embed = embed_images
+            except ImportError as e:
+                self.stdout.write(f"⚠️ Bỏ qua embedding: {e}")
+
+        self.image_map = self.load_image_map(Path(opts["images_csv"]))
+        self.category_cache = {}
+        self.stats = {"read": 0, "created": 0, "skipped": 0, "local": 0, "remote": 0, "no_image": 0, "embedded": 0}
+
+        started = time.monotonic()
+        with styles_csv.open(newline="", encoding="utf-8") as csvfile:
+            rows = csv.DictReader(csvfile)
+            if opts["sample"]:
+                rows = self.reservoir_sample(rows, opts["sample"])
+            elif opts["limit"]:
+                rows = islice(rows, opts["limit"])
+
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"  📦 {self.stats['read']} dòng | tạo {self.stats['created']} | "
+                    f"bỏ qua {self.stats['skipped']} | {self.stats['read'] / max(elapsed, 1e-6):.0f} dòng/s"
+                )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write("✅ Import hoàn tất!")
+        self.stdout.write(f"📊 Đã đọc: {self.stats['read']} dòng trong {elapsed:.1f}s "
+                          f"({self.stats['read'] / max(elapsed, 1e-6):.0f} dòng/s)")
+        self.stdout.write(f"➕ Tạo mới: {self.stats['created']} | ↩️ Đã có (bỏ qua): {self.stats['skipped']}")
+        self.stdout.write(f"🖼️  Ảnh local: {self.stats['local']} | 🌐 Ảnh URL: {self.stats['remote']} | "
+                          f"❌ Thiếu ảnh: {self.stats['no_image']}")
+        self.stdout.write(f"🧠 Embedding: {self.stats['embedded']}")
+        self.stdout.write(f"📂 Categories: {len(self.category_cache)}")
+
+    # ------------------------------------------------------------------
+    # Input
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def normalize_filename(name):
+        if not name:
+            return None
+        return name.strip().lower()
+
+    def load_image_map(self, images_csv):
+        image_map = {}
+        if not images_csv.exists():
+            self.stdout.write(f"⚠️ Không tìm thấy images.csv tại: {images_csv}. Sẽ import không có ảnh URL.")
+            return image_map
+        with images_csv.open(newline="", encoding="utf-8") as imgfile:
+            for row in csv.DictReader(imgfile):
+                fn = row.get("filename") or row.get("file_name") or row.get("image") or row.get("image_filename")
+                url = row.get("link") or row.get("url") or row.get("image_url")
+                fn_n = self.normalize_filename(fn)
+                if fn_n and url:
+                    image_map[fn_n] = url.strip()
+        self.stdout.write(f"✅ Đã load {len(image_map)} ảnh từ images.csv")
+        return image_map
+
+    def reservoir_sample(self, rows, k):
+        """Lấy ngẫu nhiên k dòng mà không phải nạp toàn bộ file vào bộ nhớ"""
+        sample = []
+        for i, row in enumerate(rows):
+            if i < k:
+                sample.append(row)
+            else:
+                j = self.rng.randint(0, i)
+                if j < k:
+                    sample[j] = row
+        return iter(sample)
+
+    @staticmethod
+    def row_id(row):
+        return row.get("id") or row.get("productId") or row.get("styleid") or row.get("product_id")
+
+    def find_local_image(self, row_id):
+        if not row_id or not self.image_dir:
+            return None
+        for ext in IMAGE_EXTS:
+            p = self.image_dir / f"{row_id}{ext}"
+            if p.exists():
+                return p
+        return None
+
+    def remote_image_url(self, row, row_id):
+        filename = row.get("filename") or row.get("file_name")
+        if not filename and row_id:
+            filename = f"{row_id}.jpg"
+        fn_norm = self.normalize_filename(filename)
+        if not fn_norm or not self.image_map:
+            return ""
+        url = self.image_map.get(fn_norm, "")
+        if not url and "." in fn_norm:
+            url = self.image_map.get(fn_norm.rsplit(".", 1)[0], "")
+        return url
+
+    # ------------------------------------------------------------------
+    # Chunk pipeline
+    # ------------------------------------------------------------------
+
+    def resolve_categories(self, names):
+        """Một query cho các tên chưa có trong cache; chỉ tạo mới những tên thật sự thiếu"""
+        missing = {n for n in names if n not in self.category_cache}
+        if not missing:
+            return
+        for category in Category.objects.filter(name__in=missing):
+            self.category_cache[category.name] = category
+        for name in sorted(missing - set(self.category_cache)):
+            # Category.save sinh slug + materialised path nên tạo từng cái (số lượng rất ít)
+            self.category_cache[name] = Category.objects.create(name=name, is_active=True)
+            self.stdout.write(f"  ➕ Tạo category mới: {name}")
+
+    def seller_for(self, row_id):
+        # Seller cố định theo id dòng để (seller, sku) ổn định giữa các lần chạy
+        return self.sellers[zlib.crc32(str(row_id).encode("utf-8")) % len(self.sellers)]
+
+    def import_chunk(self, chunk):
+        self.stats["read"] += len(chunk)
+        by_id = {}
+        for row in chunk:
+            row_id = self.row_id(row)
+            if not row_id or str(row_id).strip() in by_id:
+                self.stats["skipped"] += 1
+                continue
+            by_id[str(row_id).strip()] = row
+        rows = list(by_id.items())
+
+        existing = set(Product.objects.filter(
+            seller__in=self.sellers, sku__in=[SKU_PREFIX + rid for rid, _ in rows]
+        ).values_list("sku", flat=True))
+        fresh = [(rid, row) for rid, row in rows if SKU_PREFIX + rid not in existing]
+        self.stats["skipped"] += len(rows) - len(fresh)
+        if not fresh:
+            return
+
+        self.resolve_categories({
+            row.get("subCategory") or row.get("masterCategory") or "Uncategorized" for _, row in fresh
+        })
+
+        products = []
+        local_images = {}
+        for rid, row in fresh:
+            product = self.build_product(rid, row)
+            local_path = self.find_local_image(rid)
+            if local_path:
+                local_images[len(products)] = local_path
+            else:
+                product.image_url = self.remote_image_url(row, rid)
+                if product.image_url:
+                    self.stats["remote"] += 1
+                else:
+                    self.stats["no_image"] += 1
+            products.append(product)
+
+        if local_images:
+            self.copy_images(products, local_images)
+            if self.embed:
+                self.embed_products(products, local_images)
+
+        with transaction.atomic():
+            created = Product.objects.bulk_create(products, batch_size=500)
+            products_bulk_created(created)
+        self.stats["created"] += len(created)
+
+    def build_product(self, rid, row):
+        name = row.get("productDisplayName") or row.get("name") or "Unknown Product"
+        desc_parts = []
+        for key in ["gender", "usage", "articleType", "baseColour", "season", "year"]:
+            val = (row.get(key) or "").strip()
+            if val:
+                desc_parts.append(val)
+        description = " - ".join(desc_parts) if desc_parts else "No description"
+        category = self.category_cache[row.get("subCategory") or row.get("masterCategory") or "Uncategorized"]
+
+        # Random giá từ 100k → 5 triệu, làm tròn 1000
+        price = (self.rng.randint(100_000, 5_000_000) // 1000) * 1000
+        stock = self.rng.randint(1, 50)
+        variant_colors = self.rng.sample(COLORS, k=self.rng.randint(1, min(len(COLORS), 6)))
+        variant_sizes = self.rng.sample(SIZES, k=self.rng.randint(1, min(len(SIZES), 5)))
+        variants_str = f"Colors: {', '.join(variant_colors)} | Sizes: {', '.join(variant_sizes)}"
+
+        return Product(
+            seller=self.seller_for(rid),
+            category=category,
+            name=name[:200],
+            sku=SKU_PREFIX + rid,
+            # Lượt bán / đánh giá thật lấy từ ProductRanking và Review, không ghi vào mô tả
+            description=f"{description}\n{variants_str}",
+            price=price,
+            stock=stock,
+            is_active=True,
+            color_options=variant_colors,
+            size_options=variant_sizes,
+            image="",
+            image_url="",
+        )
+
+    def copy_images(self, products, local_images):
+        """Copy ảnh vào MEDIA_ROOT/products/ bằng thread pool (I/O bound)"""
+        def copy(item):
+            index, src = item
+            name = f"products/{src.name}"
+            if not default_storage.exists(name):
+                with src.open("rb") as f:
+                    name = default_storage.save(name, File(f))
+            return index, name
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for index, name in pool.map(copy, local_images.items()):
+                products[index].image = name
+        self.stats["local"] += len(local_images)
+
+    def embed_products(self, products, local_images):
+        items = list(local_images.items())
+        for start in range(0, len(items), self.embed_batch_size):
+            batch = items[start:start + self.embed_batch_size]
+            embs = self.embed([str(path) for _, path in batch])  # shape: (B, D)
+            for (index, _), vec in zip(batch, embs):
+                products[index].image_embedding = vec.numpy().astype("float32").tolist()
+            self.stats["embedded"] += len(batch)
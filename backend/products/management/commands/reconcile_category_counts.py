@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from products.models import Category
+from products.cache import bump_versions, CATEGORIES_VERSION
+
+
+class Command(BaseCommand):
+    help = "Tính lại product_count/total_product_count của Category và sửa các dòng bị lệch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ báo cáo, không ghi")
+
+    def handle(self, *args, **opts):
+        dry_run = opts.get("dry_run", False)
+        actual = Category.objects.annotate(
+            actual_total=Count("products"),
+            actual_active=Count("products", filter=Q(products__is_active=True)),
+        )
+
+        drifted = []
+        for category in actual:
+            if (category.total_product_count, category.product_count) != (category.actual_total, category.actual_active):
+                self.stdout.write(
+                    f"  ⚠️ {category.name}: total {category.total_product_count} -> {category.actual_total}, "
+                    f"active {category.product_count} -> {category.actual_active}"
+                )
+                category.total_product_count = category.actual_total
+                category.product_count = category.actual_active
+                drifted.append(category)
+
+        if drifted and not dry_run:
+            with transaction.atomic():
+                Category.objects.bulk_update(drifted, ["total_product_count", "product_count"], batch_size=500)
+            bump_versions(CATEGORIES_VERSION)
+
+        self.stdout.write(f"✅ Hoàn tất. Danh mục bị lệch: {len(drifted)}" + (" (dry-run)" if dry_run else ""))
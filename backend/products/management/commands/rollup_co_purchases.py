@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.copurchase import rebuild, rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Cộng dồn các đơn mới (sau watermark) vào ma trận đồng mua cho gợi ý "
+        "'thường được mua cùng'. Chạy định kỳ; --full để tính lại từ đầu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Xoá ma trận và gộp lại toàn bộ lịch sử đơn")
+
+    def handle(self, *args, **opts):
+        stats = rebuild() if opts["full"] else rollup()
+        self.stdout.write(
+            f"✅ Hoàn tất. Watermark: {stats['last_id']} | đơn đã gộp: {stats['orders']} "
+            f"| cặp sản phẩm cập nhật: {stats['pairs']}"
+        )
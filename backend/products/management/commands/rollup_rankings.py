@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.rankings import rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Gộp OrderItem mới (sau watermark) vào bucket theo giờ và làm mới bảng xếp hạng "
+        "trending/best_selling. Chạy định kỳ, vd. mỗi 5 phút."
+    )
+
+    def handle(self, *args, **opts):
+        stats = rollup()
+        self.stdout.write(
+            f"✅ Hoàn tất. Watermark: {stats['last_id']} | sản phẩm có đơn mới: {stats['products_sold']} "
+            f"| xếp hạng thay đổi: {stats['rankings_changed']}"
+        )
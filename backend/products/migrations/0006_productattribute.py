@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_attributes(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductAttribute = apps.get_model('products', 'ProductAttribute')
+    rows = []
+    for product in Product.objects.only('id', 'color_options', 'size_options').iterator():
+        seen = set()
+        for attribute, options in (('color', product.color_options), ('size', product.size_options)):
+            for option in options or []:
+                value = str(option or '').strip().lower()[:50]
+                if value and (attribute, value) not in seen:
+                    seen.add((attribute, value))
+                    rows.append(ProductAttribute(
+                        product_id=product.id, attribute=attribute,
+                        value=value, label=str(option).strip()[:50],
+                    ))
+        if len(rows) >= 1000:
+            ProductAttribute.objects.bulk_create(rows)
+            rows = []
+    if rows:
+        ProductAttribute.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_color_size_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAttribute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attribute', models.CharField(choices=[('color', 'Color'), ('size', 'Size')], max_length=10)),
+                ('value', models.CharField(max_length=50)),
+                ('label', models.CharField(max_length=50)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attributes', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['attribute', 'value', 'product'], name='product_attr_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'attribute', 'value'), name='uniq_product_attribute_value')],
+            },
+        ),
+        migrations.RunPython(backfill_attributes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:34
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_of(pk, seen=()):
+        if pk in paths:
+            return paths[pk]
+        parent_id = parents.get(pk)
+        prefix = ''
+        if parent_id and parent_id not in seen:
+            prefix = path_of(parent_id, seen + (pk,))
+        paths[pk] = f'{prefix}{pk:06d}/'
+        return paths[pk]
+
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.path = path_of(category.id)
+        category.depth = max(category.path.count('/') - 1, 0)
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_category_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:36
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_counts(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    categories = list(Category.objects.annotate(
+        actual_total=Count('products'),
+        actual_active=Count('products', filter=Q(products__is_active=True)),
+    ))
+    for category in categories:
+        category.total_product_count = category.actual_total
+        category.product_count = category.actual_active
+    Category.objects.bulk_update(categories, ['total_product_count', 'product_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='total_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
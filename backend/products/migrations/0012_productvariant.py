@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_variants(apps, schema_editor):
+    """Tích màu x size từ JSON; Product.stock chia đều để tổng tồn kho không đổi"""
+    Product = apps.get_model('products', 'Product')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+    rows = []
+    for product in Product.objects.only('id', 'stock', 'color_options', 'size_options').iterator():
+        colors = [c for c in dict.fromkeys(str(o).strip()[:50] for o in product.color_options or []) if c] or ['']
+        sizes = [s for s in dict.fromkeys(str(o).strip()[:50] for o in product.size_options or []) if s] or ['']
+        pairs, keys = [], set()
+        for color in colors:
+            for size in sizes:
+                key = (color.lower(), size.lower())
+                if (color or size) and key not in keys:
+                    keys.add(key)
+                    pairs.append((color, size, key))
+        if not pairs:
+            continue
+        base, extra = divmod(product.stock, len(pairs))
+        for i, (color, size, (color_key, size_key)) in enumerate(pairs):
+            rows.append(ProductVariant(
+                product_id=product.id, color=color, size=size,
+                color_key=color_key, size_key=size_key,
+                stock=base + (1 if i < extra else 0),
+            ))
+        if len(rows) >= 1000:
+            ProductVariant.objects.bulk_create(rows)
+            rows = []
+    if rows:
+        ProductVariant.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('color', models.CharField(blank=True, default='', max_length=50)),
+                ('size', models.CharField(blank=True, default='', max_length=50)),
+                ('color_key', models.CharField(blank=True, default='', editable=False, max_length=50)),
+                ('size_key', models.CharField(blank=True, default='', editable=False, max_length=50)),
+                ('stock', models.PositiveIntegerField(default=0)),
+                ('price_delta', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variant_set', to='products.product')),
+            ],
+            options={
+                'ordering': ['color_key', 'size_key'],
+                'indexes': [models.Index(condition=models.Q(('stock__gt', 0)), fields=['color_key', 'product'], name='variant_color_in_stock_idx'), models.Index(condition=models.Q(('stock__gt', 0)), fields=['size_key', 'product'], name='variant_size_in_stock_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'color_key', 'size_key'), name='uniq_product_variant')],
+            },
+        ),
+        migrations.RunPython(backfill_variants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_productvariant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='products.product')),
+                ('sold_24h', models.PositiveIntegerField(default=0)),
+                ('sold_7d', models.PositiveIntegerField(default=0)),
+                ('sold_30d', models.PositiveIntegerField(default=0)),
+                ('sold_total', models.PositiveIntegerField(default=0)),
+                ('trending_score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-trending_score'], name='ranking_trending_idx'), models.Index(fields=['-sold_30d', '-sold_total'], name='ranking_best_selling_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_buckets', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour', 'product'], name='sales_bucket_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'hour'), name='uniq_product_sales_hour')],
+            },
+        ),
+    ]
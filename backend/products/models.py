@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.signals import post_save, pre_save
 from django.conf import settings
 from django.utils.text import slugify
 
@@ -8,8 +9,20 @@ class Category(models.Model):
     name = models.CharField(max_length=120, unique=True)
     slug = models.SlugField(max_length=140, unique=True, blank=True)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='children')
+    # Materialised path: id (6 chữ số) của từng tổ tiên và chính nó, vd. "000001/000005/".
+    # Cả cây con của một node là khoảng [path, path + '~') -> một range scan trên index.
+    path = models.CharField(max_length=255, blank=True, default='', editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Bộ đếm denormalised (trực tiếp, không gồm danh mục con), cập nhật tăng dần trong
+    # products/signals.py; sửa lệch bằng `manage.py reconcile_category_counts`
+    product_count = models.PositiveIntegerField(default=0, editable=False)  # chỉ sản phẩm active
+    total_product_count = models.PositiveIntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    PATH_STEP = 6
+    PATH_END = '~'
 
     class Meta:
         ordering = ['name']
@@ -25,7 +38,69 @@ class Category(models.Model):
                 i += 1
                 slug = f"{base}-{i}"
             self.slug = slug
+        parent_path = self._parent_path()
+        if self.path and parent_path.startswith(self.path):
+            raise ValueError('Không thể chọn danh mục con làm danh mục cha')
+        self._previous_path = self.path
+        if self.pk is None:
+            self._insert(parent_path, kwargs.get('using'))
+            return
+        # Tính path trước khi lưu để signals post_save thấy path mới
+        self._set_path(parent_path + self.encode_segment(self.pk))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'path', 'depth'}
         super().save(*args, **kwargs)
+        if self.path != self._previous_path:
+            # Node bị chuyển chỗ: re-prefix toàn bộ cây con
+            Category.reprefix_subtree(self._previous_path, self.path)
+
+    def _insert(self, parent_path, using=None):
+        """
+        Bản ghi mới: path chứa chính pk nên chỉ biết sau INSERT. INSERT (không signal)
+        + UPDATE path trong một transaction rồi mới gửi post_save, để receivers
+        (bump version, dựng lại map danh mục) không thấy path rỗng.
+        """
+        using = using or router.db_for_write(Category, instance=self)
+        with transaction.atomic(using=using):
+            pre_save.send(sender=Category, instance=self, raw=False, using=using, update_fields=None)
+            Category.objects.using(using).bulk_create([self])
+            self._set_path(parent_path + self.encode_segment(self.pk))
+            Category.objects.using(using).filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            post_save.send(sender=Category, instance=self, created=True, update_fields=None, raw=False, using=using)
+
+    def _parent_path(self):
+        if not self.parent_id:
+            return ''
+        return Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+
+    def _set_path(self, path):
+        self.path = path
+        self.depth = self.depth_of(path)
+
+    @classmethod
+    def reprefix_subtree(cls, old_path, new_path):
+        descendants = list(cls.objects.filter(path__gt=old_path, path__lt=old_path + cls.PATH_END))
+        for node in descendants:
+            node.path = new_path + node.path[len(old_path):]
+            node.depth = cls.depth_of(node.path)
+        if descendants:
+            cls.objects.bulk_update(descendants, ['path', 'depth'], batch_size=500)
+
+    @classmethod
+    def encode_segment(cls, pk):
+        return f'{pk:0{cls.PATH_STEP}d}/'
+
+    @staticmethod
+    def depth_of(path):
+        return max(path.count('/') - 1, 0)
+
+    @staticmethod
+    def ids_in_path(path):
+        return [int(segment) for segment in path.split('/') if segment]
+
+    def subtree_range(self):
+        return self.path, self.path + self.PATH_END
 
     def __str__(self):
         return self.name
@@ -35,6 +110,8 @@ class Product(models.Model):
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     name = models.CharField(max_length=200)
+    # Mã sản phẩm do seller quản lý (duy nhất theo seller khi có), dùng cho import/upsert
+    sku = models.CharField(max_length=64, blank=True, default='')
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=12, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
@@ -49,11 +126,143 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['seller', 'sku'],
+                condition=~models.Q(sku=''),
+                name='uniq_product_seller_sku'
+            )
+        ]
+        # Đường truy cập nóng (xem products/tests.py::ProductQueryPlanTest):
+        # catalog lọc is_active rồi sort created_at/price, trang shop lọc seller,
+        # danh sách theo category, thống kê seller (hết hàng).
+        # Filter is_active=True được render thành WHERE "is_active" nên dùng partial
+        # index (condition) thay vì đặt is_active làm cột của index.
+        indexes = [
+            models.Index(fields=['-created_at'], name='product_created_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True),
+                         name='product_active_created_idx'),
+            models.Index(fields=['price'], condition=models.Q(is_active=True),
+                         name='product_active_price_idx'),
+            models.Index(fields=['category', '-created_at'], condition=models.Q(is_active=True),
+                         name='product_cat_active_idx'),
+            models.Index(fields=['seller', '-created_at'], condition=models.Q(is_active=True),
+                         name='product_seller_active_idx'),
+            models.Index(fields=['seller', 'price'], condition=models.Q(is_active=True),
+                         name='product_seller_price_idx'),
+            models.Index(fields=['seller'], condition=models.Q(stock=0), name='product_seller_oos_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Giữ lại giá trị lúc load để signals biết category/is_active cũ mà không cần SELECT lại
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return f'{self.name} ({self.seller})'
 
 
+class ProductAttribute(models.Model):
+    """Inverted index cho color_options/size_options (JSON) để lọc và đếm facet"""
+    COLOR = 'color'
+    SIZE = 'size'
+    ATTRIBUTE_CHOICES = (
+        (COLOR, 'Color'),
+        (SIZE, 'Size'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='attributes')
+    attribute = models.CharField(max_length=10, choices=ATTRIBUTE_CHOICES)
+    value = models.CharField(max_length=50)
+    label = models.CharField(max_length=50)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'attribute', 'value'],
+                name='uniq_product_attribute_value'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['attribute', 'value', 'product'], name='product_attr_lookup_idx'),
+        ]
+
+    @staticmethod
+    def normalize(value):
+        return str(value or '').strip().lower()
+
+    @classmethod
+    def build_for(cls, product):
+        """Tạo (chưa lưu) các dòng index từ JSON của product"""
+        rows = {}
+        for attribute, options in ((cls.COLOR, product.color_options), (cls.SIZE, product.size_options)):
+            for option in options or []:
+                value = cls.normalize(option)[:50]
+                if value and (attribute, value) not in rows:
+                    rows[(attribute, value)] = cls(
+                        product_id=product.pk,
+                        attribute=attribute,
+                        value=value,
+                        label=str(option).strip()[:50],
+                    )
+        return list(rows.values())
+
+    def __str__(self):
+        return f'{self.product_id} {self.attribute}={self.value}'
+
+
+class ProductVariant(models.Model):
+    """
+    Biến thể màu/size với tồn kho riêng. Khi product có biến thể thì Product.stock,
+    color_options và size_options là bản tóm tắt (xem products/variants.py).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variant_set')
+    color = models.CharField(max_length=50, blank=True, default='')
+    size = models.CharField(max_length=50, blank=True, default='')
+    # Khoá đã chuẩn hoá (như ProductAttribute.value) để tra cứu không phân biệt hoa thường
+    color_key = models.CharField(max_length=50, blank=True, default='', editable=False)
+    size_key = models.CharField(max_length=50, blank=True, default='', editable=False)
+    stock = models.PositiveIntegerField(default=0)
+    # Chênh lệch so với Product.price (có thể âm)
+    price_delta = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['color_key', 'size_key']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'color_key', 'size_key'],
+                name='uniq_product_variant'
+            )
+        ]
+        indexes = [
+            # Lọc "còn hàng màu X / size Y" mà không quét JSON
+            models.Index(fields=['color_key', 'product'], condition=models.Q(stock__gt=0),
+                         name='variant_color_in_stock_idx'),
+            models.Index(fields=['size_key', 'product'], condition=models.Q(stock__gt=0),
+                         name='variant_size_in_stock_idx'),
+        ]
+
+    def set_keys(self):
+        self.color = str(self.color or '').strip()[:50]
+        self.size = str(self.size or '').strip()[:50]
+        self.color_key = ProductAttribute.normalize(self.color)
+        self.size_key = ProductAttribute.normalize(self.size)
+
+    def save(self, *args, **kwargs):
+        self.set_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'color', 'size'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'color_key', 'size_key'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.product_id} {self.color or "-"}/{self.size or "-"}'
+
+
 class WishlistItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wishlist_items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='wishlisted_items')
@@ -142,3 +351,75 @@ class SavedItem(models.Model):
         return f"{self.user} saved {self.product}"
     def __str__(self):
         return f'{self.name} ({self.seller})'
+
+
+# ============================================
+# SALES ROLLUPS (xem products/rankings.py)
+# ============================================
+
+class RollupCheckpoint(models.Model):
+    """Watermark của các job rollup tăng dần: id lớn nhất đã xử lý của bảng nguồn"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}@{self.last_id}'
+
+
+class ProductSalesBucket(models.Model):
+    """Số lượng bán của một product trong một giờ (theo Order.created_at)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_buckets')
+    hour = models.DateTimeField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'hour'], name='uniq_product_sales_hour')
+        ]
+        indexes = [
+            models.Index(fields=['hour', 'product'], name='sales_bucket_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} {self.hour:%Y-%m-%d %H}h: {self.quantity}'
+
+
+class ProductRanking(models.Model):
+    """Bảng xếp hạng tính sẵn cho ordering=trending / best_selling"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='ranking')
+    sold_24h = models.PositiveIntegerField(default=0)
+    sold_7d = models.PositiveIntegerField(default=0)
+    sold_30d = models.PositiveIntegerField(default=0)
+    sold_total = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-trending_score'], name='ranking_trending_idx'),
+            models.Index(fields=['-sold_30d', '-sold_total'], name='ranking_best_selling_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: 30d={self.sold_30d} trending={self.trending_score:.2f}'
+
+
+class ProductCoPurchase(models.Model):
+    """Số đơn có cả product và related (ma trận đồng mua, lưu cả hai chiều)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchases')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='uniq_product_co_purchase')
+        ]
+        indexes = [
+            # top-N của một product: đọc theo index, không sort
+            models.Index(fields=['product', '-count'], name='co_purchase_top_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} + {self.related_id}: {self.count}'
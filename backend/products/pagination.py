@@ -0,0 +1,26 @@
+"""
+Cursor pagination dùng chung cho các list theo user (wishlist, saved items, đơn hàng...).
+
+Chỉ bật khi client gửi ?cursor= hoặc ?page_size=, nên client cũ vẫn nhận nguyên list.
+Cursor trỏ thẳng vào vị trí (WHERE created_at < ...) thay vì OFFSET, nên trang sau
+không chậm dần và không bị lặp/sót khi có dòng mới được thêm vào đầu list.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = '-created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        # View khai báo thứ tự qua thuộc tính ordering (field đầu là khoá cursor)
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
@@ -0,0 +1,155 @@
+"""
+Trang chi tiết sản phẩm trong một request: product, tóm tắt rating, trang review đầu,
+thẻ shop, sản phẩm liên quan và quyền review của người xem.
+
+Mỗi phần chung (không phụ thuộc người xem) được cache riêng qua cached_part theo
+version counter của nó, nên request đã đăng nhập vẫn dùng lại được:
+
+    phần      version                         query khi cache miss
+    product   product:<id>                    product + biến thể + rating + review = 4
+    seller    seller:<id>                     shop + đếm sản phẩm/đã bán + rating = 3
+    related   product:<id>, category:<id>     đồng mua + product + bù cùng danh mục = 3
+      (thẻ)   product:<id> của từng sp liên quan  product (chỉ khi danh sách id đã cache) = 1
+    viewer    (không cache)                   đã mua? + review của mình = 2
+
+Cache nóng: 0 query cho khách, 2 query cho người đã đăng nhập.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Avg, Count, Q, Sum
+from rest_framework.exceptions import NotFound
+
+from reviews.models import Review
+from reviews.serializers import ReviewSerializer
+from reviews.views import review_eligibility
+from .cache import cached_part, product_version, category_version, seller_version, PRODUCTS_VERSION
+from .copurchase import bought_together
+from .models import Product
+from .rankings import order_by_ranking
+from .serializers import ProductSerializer
+
+REVIEW_PAGE_SIZE = 5
+RELATED_LIMIT = 8
+
+
+def rating_summary(product_id):
+    """Điểm trung bình, số review và phân bố 1-5 sao trong một câu aggregate"""
+    agg = Review.objects.filter(product_id=product_id).aggregate(
+        average=Avg('rating'),
+        count=Count('id'),
+        **{f'star_{n}': Count('id', filter=Q(rating=n)) for n in range(1, 6)},
+    )
+    return {
+        'average': round(agg['average'] or 0, 2),
+        'count': agg['count'],
+        'distribution': {str(n): agg[f'star_{n}'] for n in range(1, 6)},
+    }
+
+
+def product_part(request, pk):
+    try:
+        product = Product.objects.select_related('seller', 'category', 'ranking')\
+            .prefetch_related('variant_set').get(pk=pk)
+    except Product.DoesNotExist:
+        raise NotFound('Không tìm thấy sản phẩm')
+    rating = rating_summary(pk)
+    product._rating_stats = (rating['average'], rating['count'])
+    reviews = Review.objects.filter(product_id=pk).select_related('user')\
+        .order_by('-created_at', '-id')[:REVIEW_PAGE_SIZE]
+    return {
+        'seller_id': product.seller_id,
+        'category_id': product.category_id,
+        'product': ProductSerializer(product, context={'request': request}).data,
+        'rating': rating,
+        'reviews': {
+            'results': ReviewSerializer(reviews, many=True).data,
+            'count': rating['count'],
+            'has_more': rating['count'] > REVIEW_PAGE_SIZE,
+        },
+    }
+
+
+def seller_part(request, seller_id):
+    seller = get_user_model().objects.select_related('profile').filter(
+        pk=seller_id, user_type='seller'
+    ).first()
+    if seller is None:
+        return {}
+    products = Product.objects.filter(seller_id=seller_id).aggregate(
+        active_products=Count('id', filter=Q(is_active=True)),
+        total_sold=Sum('ranking__sold_total'),
+    )
+    rating = Review.objects.filter(product__seller_id=seller_id).aggregate(
+        average=Avg('rating'), count=Count('id')
+    )
+    profile = getattr(seller, 'profile', None)
+    avatar = None
+    if profile is not None and profile.avatar:
+        avatar = request.build_absolute_uri(profile.avatar.url)
+    return {
+        'user_id': seller.pk,
+        'username': seller.username,
+        'name': seller.full_name or seller.username,
+        'avatar': avatar,
+        'city': profile.city if profile is not None else '',
+        'is_active': seller.status == 'active' and seller.is_active,
+        'joined_date': seller.created_at.strftime('%B %Y'),
+        'active_products': products['active_products'],
+        'total_sold': products['total_sold'] or 0,
+        'rating': round(rating['average'] or 0, 2),
+        'rating_count': rating['count'],
+    }
+
+
+def related_products(pk, category_id):
+    """Ưu tiên 'thường được mua cùng', còn thiếu thì bù sản phẩm bán chạy cùng danh mục"""
+    products = [product for product, _ in bought_together([pk], limit=RELATED_LIMIT)]
+    missing = RELATED_LIMIT - len(products)
+    if missing > 0 and category_id:
+        exclude = [pk] + [p.pk for p in products]
+        products += list(order_by_ranking(
+            Product.objects.filter(category_id=category_id, is_active=True).exclude(pk__in=exclude),
+            'best_selling',
+        )[:missing])
+    return products
+
+
+def related_cards(request, ids, fetched):
+    """Thẻ của các sản phẩm liên quan; fetched: product vừa đọc khi tính ids (khỏi query lại)"""
+    missing = [pk for pk in ids if pk not in fetched]
+    if missing:
+        fetched = {**fetched, **Product.objects.filter(pk__in=missing, is_active=True).in_bulk()}
+    return ProductSerializer(
+        [fetched[pk] for pk in ids if pk in fetched], many=True,
+        fields=ProductSerializer.VIEWS['card'], context={'request': request},
+    ).data
+
+
+def build_product_page(request, pk):
+    host = request.get_host()
+    page = cached_part('page-product', f'{host}|{pk}', [product_version(pk)],
+                       lambda: product_part(request, pk))
+    seller_id, category_id = page['seller_id'], page['category_id']
+    seller = cached_part('page-seller', f'{host}|{seller_id}', [seller_version(seller_id)],
+                         lambda: seller_part(request, seller_id))
+    # Danh sách id theo product/category đang xem; thẻ (giá, tồn kho) theo version của
+    # chính các sản phẩm liên quan, nên đổi giá / tồn ở danh mục khác cũng làm mới
+    fetched = {}
+
+    def compute_ids():
+        products = related_products(pk, category_id)
+        fetched.update((p.pk, p) for p in products)
+        return [p.pk for p in products]
+
+    related_versions = [product_version(pk), category_version(category_id) if category_id else PRODUCTS_VERSION]
+    ids = cached_part('page-related-ids', str(pk), related_versions, compute_ids)
+    related = cached_part('page-related', f"{host}|{','.join(map(str, ids))}",
+                          [product_version(related_id) for related_id in ids],
+                          lambda: related_cards(request, ids, fetched))
+    return {
+        'product': page['product'],
+        'rating': page['rating'],
+        'reviews': page['reviews'],
+        'seller': seller or None,
+        'related': related,
+        'viewer': review_eligibility(request.user, pk),
+    }
@@ -0,0 +1,181 @@
+"""
+Bảng xếp hạng bán chạy / thịnh hành, tính sẵn để list không phải GROUP BY OrderItem.
+
+OrderItem --(rollup, tăng dần theo id)--> ProductSalesBucket (product, giờ)
+          --(cộng theo cửa sổ 24h/7d/30d)--> ProductRanking
+
+- rollup() chỉ đọc các OrderItem có id > watermark (RollupCheckpoint), nên mỗi lần
+  chạy tỉ lệ với số đơn mới chứ không phải toàn bộ lịch sử. Chạy định kỳ bằng
+  `manage.py rollup_rankings`.
+- Chỉ xử lý item của đơn tạo trước SAFETY_LAG để không bỏ sót item có id nhỏ hơn
+  nhưng commit muộn hơn.
+- Đơn bị huỷ (hoặc bỏ huỷ) sau khi đã rollup được trừ (cộng) lại ngay qua
+  orders/signals.py -> adjust_for_order().
+- Cửa sổ thời gian trượt theo giờ nên mỗi lần rollup tính lại các product có bucket
+  trong 30 ngày gần nhất; bảng bucket nhỏ hơn nhiều so với OrderItem.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Product, ProductRanking, ProductSalesBucket, RollupCheckpoint
+from .signals import bump_product_versions
+
+CHECKPOINT = 'product_sales'
+SAFETY_LAG = timedelta(minutes=1)
+WINDOWS = {
+    'sold_24h': timedelta(hours=24),
+    'sold_7d': timedelta(days=7),
+    'sold_30d': timedelta(days=30),
+}
+# trending: bán gần đây nặng ký hơn, phần cũ hơn giảm dần
+TRENDING_WEIGHTS = {'sold_24h': 1.0, 'sold_7d': 0.25, 'sold_30d': 0.05}
+BATCH_SIZE = 500
+
+
+def trending_score(sold_24h, sold_7d, sold_30d):
+    return (
+        TRENDING_WEIGHTS['sold_24h'] * sold_24h
+        + TRENDING_WEIGHTS['sold_7d'] * (sold_7d - sold_24h)
+        + TRENDING_WEIGHTS['sold_30d'] * (sold_30d - sold_7d)
+    )
+
+
+def _item_deltas(items, sign=1):
+    """{(product_id, giờ): số lượng} từ một queryset OrderItem (một GROUP BY)"""
+    rows = (
+        items.annotate(hour=TruncHour('order__created_at'))
+        .values('product_id', 'hour')
+        .annotate(quantity=Sum('quantity'))
+    )
+    return {(row['product_id'], row['hour']): sign * row['quantity'] for row in rows}
+
+
+def _apply_bucket_deltas(deltas):
+    """Cộng delta vào bucket (không âm); trả về tổng delta theo product"""
+    if not deltas:
+        return {}
+    product_ids = {pid for pid, _ in deltas}
+    hours = {hour for _, hour in deltas}
+    current = {
+        (b.product_id, b.hour): b.quantity
+        for b in ProductSalesBucket.objects.filter(product_id__in=product_ids, hour__in=hours)
+    }
+    buckets, totals = [], defaultdict(int)
+    for (product_id, hour), delta in deltas.items():
+        before = current.get((product_id, hour), 0)
+        after = max(before + delta, 0)
+        totals[product_id] += after - before
+        buckets.append(ProductSalesBucket(product_id=product_id, hour=hour, quantity=after))
+    ProductSalesBucket.objects.bulk_create(
+        buckets, batch_size=BATCH_SIZE,
+        update_conflicts=True, unique_fields=['product', 'hour'], update_fields=['quantity'],
+    )
+    return totals
+
+
+def _refresh_rankings(now, total_deltas, product_ids=None):
+    """
+    Tính lại cửa sổ 24h/7d/30d và ghi các dòng ProductRanking thay đổi.
+    product_ids=None: mọi product có bucket trong 30 ngày hoặc đang có sold_30d > 0.
+    """
+    buckets = ProductSalesBucket.objects.filter(hour__gte=now - WINDOWS['sold_30d'])
+    if product_ids is not None:
+        buckets = buckets.filter(product_id__in=product_ids)
+    windows = {
+        row['product_id']: row
+        for row in buckets.values('product_id').annotate(**{
+            name: Sum('quantity', filter=Q(hour__gte=now - span)) for name, span in WINDOWS.items()
+        })
+    }
+    ids = set(windows) | set(total_deltas)
+    if product_ids is None:
+        ids |= set(ProductRanking.objects.filter(sold_30d__gt=0).values_list('product_id', flat=True))
+    else:
+        ids |= set(product_ids)
+
+    existing = ProductRanking.objects.in_bulk(list(ids))
+    changed = []
+    for product_id in ids:
+        row = windows.get(product_id, {})
+        sold = {name: row.get(name) or 0 for name in WINDOWS}
+        ranking = existing.get(product_id) or ProductRanking(product_id=product_id)
+        values = dict(
+            sold,
+            sold_total=max(ranking.sold_total + total_deltas.get(product_id, 0), 0),
+            trending_score=trending_score(sold['sold_24h'], sold['sold_7d'], sold['sold_30d']),
+        )
+        if product_id in existing and all(getattr(ranking, k) == v for k, v in values.items()):
+            continue
+        for field, value in values.items():
+            setattr(ranking, field, value)
+        ranking.updated_at = now
+        changed.append(ranking)
+
+    ProductRanking.objects.bulk_create(
+        changed, batch_size=BATCH_SIZE,
+        update_conflicts=True, unique_fields=['product'],
+        update_fields=list(WINDOWS) + ['sold_total', 'trending_score', 'updated_at'],
+    )
+    return [r.product_id for r in changed]
+
+
+def _bump_after_commit(product_ids):
+    if not product_ids:
+        return
+
+    def bump():
+        category_ids = Product.objects.filter(pk__in=product_ids).values_list('category_id', flat=True)
+        bump_product_versions(product_ids, set(category_ids), categories_changed=False)
+    transaction.on_commit(bump, robust=True)
+
+
+def rollup(now=None):
+    """Gộp OrderItem mới vào bucket và làm mới bảng xếp hạng; trả về thống kê"""
+    from orders.models import OrderItem
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        checkpoint, _ = RollupCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT)
+        new_items = OrderItem.objects.filter(id__gt=checkpoint.last_id)
+        upper = new_items.filter(order__created_at__lte=now - SAFETY_LAG).aggregate(upper=Max('id'))['upper']
+        totals = {}
+        if upper:
+            deltas = _item_deltas(new_items.filter(id__lte=upper).exclude(order__status='canceled'))
+            totals = _apply_bucket_deltas(deltas)
+            checkpoint.last_id = upper
+            checkpoint.save(update_fields=['last_id', 'updated_at'])
+        changed = _refresh_rankings(now, totals)
+        _bump_after_commit(changed)
+    return {'last_id': checkpoint.last_id, 'products_sold': len(totals), 'rankings_changed': len(changed)}
+
+
+def adjust_for_order(order, sign):
+    """
+    Đơn đã được rollup rồi mới bị huỷ (sign=-1) hoặc bỏ huỷ (sign=+1): sửa bucket và
+    xếp hạng của các product trong đơn. Item chưa rollup sẽ được xử lý ở lần sau.
+    """
+    from orders.models import OrderItem
+
+    last_id = RollupCheckpoint.objects.filter(name=CHECKPOINT).values_list('last_id', flat=True).first()
+    if not last_id:
+        return []
+    with transaction.atomic():
+        deltas = _item_deltas(OrderItem.objects.filter(order=order, id__lte=last_id), sign)
+        totals = _apply_bucket_deltas(deltas)
+        changed = _refresh_rankings(timezone.now(), totals, product_ids=set(totals)) if totals else []
+        _bump_after_commit(changed)
+    return changed
+
+
+def order_by_ranking(queryset, kind):
+    """Sắp xếp theo bảng xếp hạng; product chưa bán được xếp cuối, mới nhất trước"""
+    if kind == 'trending':
+        keys = [F('ranking__trending_score').desc(nulls_last=True)]
+    else:
+        keys = [F('ranking__sold_30d').desc(nulls_last=True), F('ranking__sold_total').desc(nulls_last=True)]
+    return queryset.order_by(*keys, '-created_at')
@@ -3,7 +3,10 @@ from rest_framework.exceptions import ValidationError
 from django.db import IntegrityError
 from django.db.models import Avg, Count
 
-from .models import Product, Category, WishlistItem, SavedItem
+from .models import (
+    Product, ProductAttribute, ProductVariant, ProductRanking, Category, WishlistItem, SavedItem,
+)
+from .variants import build_from_options, MANAGED_FIELDS, MANAGED_FIELD_ERROR
 from reviews.models import Review
 
 
@@ -12,15 +15,21 @@ from reviews.models import Review
 # ============================================
 
 class CategorySerializer(serializers.ModelSerializer):
-    """Category serializer, bao gồm optional product_count"""
-    product_count = serializers.IntegerField(read_only=True, required=False)
+    """Category serializer, product_count = số sản phẩm active (bộ đếm denormalised)"""
 
     class Meta:
         model = Category
         fields = [
-            "id", "name", "slug", "parent", "is_active", "created_at", "product_count"
+            "id", "name", "slug", "parent", "path", "depth", "is_active", "created_at",
+            "product_count", "total_product_count"
         ]
-        read_only_fields = ["slug", "created_at"]
+        read_only_fields = ["slug", "path", "depth", "created_at", "product_count", "total_product_count"]
+
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None and self.instance.path \
+                and value.path.startswith(self.instance.path):
+            raise ValidationError("Không thể chọn danh mục con làm danh mục cha")
+        return value
 
 
 # ============================================
@@ -35,18 +44,88 @@ class ProductSerializer(serializers.ModelSerializer):
     seller_name = serializers.SerializerMethodField()
     rating_avg = serializers.SerializerMethodField()
     rating_count = serializers.SerializerMethodField()
+    sold_count = serializers.SerializerMethodField()
     variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
-            "id", "name", "description", "price", "stock", "image",
+            "id", "sku", "name", "description", "price", "stock", "image",
             "category", "category_name", "seller", "seller_name",
             "is_active", "color_options", "size_options", "variants",
-            "created_at", "updated_at", "rating_avg", "rating_count"
+            "created_at", "updated_at", "rating_avg", "rating_count", "sold_count"
         ]
         read_only_fields = ["seller", "created_at", "updated_at"]
 
+    # Các "view" dựng sẵn cho ?view=, vd. grid chỉ cần tên, giá, ảnh
+    VIEWS = {
+        'card': ("id", "name", "price", "image", "stock"),
+    }
+
+    # Cột DB (cho only()) mà mỗi field cần; rating_* tính riêng nên không cần cột
+    FIELD_COLUMNS = {
+        "id": ("id",),
+        "sku": ("sku",),
+        "name": ("name",),
+        "description": ("description",),
+        "price": ("price",),
+        "stock": ("stock",),
+        "image": ("image",),
+        "category": ("category__id", "category__name", "category__slug", "category__parent",
+                     "category__path", "category__depth", "category__is_active", "category__created_at",
+                     "category__product_count", "category__total_product_count"),
+        "category_name": ("category__name",),
+        "seller": ("seller",),
+        "seller_name": ("seller__username", "seller__full_name"),
+        "is_active": ("is_active",),
+        "color_options": ("color_options",),
+        "size_options": ("size_options",),
+        "variants": ("color_options", "size_options"),
+        "created_at": ("created_at",),
+        "updated_at": ("updated_at",),
+        "rating_avg": (),
+        "rating_count": (),
+        "sold_count": ("ranking__sold_total",),
+    }
+
+    def __init__(self, *args, **kwargs):
+        # fields: tập field cần trả về (sparse fieldset), None = tất cả
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, params):
+        """Đọc ?view=card hoặc ?fields=id,name,price; trả về None nếu lấy đủ"""
+        view = params.get('view')
+        if view in cls.VIEWS:
+            return cls.VIEWS[view]
+        raw = params.get('fields')
+        if not raw:
+            return None
+        fields = [f.strip() for f in raw.split(',') if f.strip() in cls.FIELD_COLUMNS]
+        if not fields:
+            return None
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        return tuple(fields)
+
+    @classmethod
+    def prune_queryset(cls, queryset, fields):
+        """Chỉ SELECT các cột (và JOIN) mà các field được chọn thực sự cần"""
+        if fields is None:
+            return queryset
+        columns = {"id"}
+        for name in fields:
+            columns.update(cls.FIELD_COLUMNS[name])
+        relations = {c.split('__', 1)[0] for c in columns if '__' in c}
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns)
+
     def get_image(self, obj):
         request = self.context.get("request")
         if obj.image:
@@ -64,19 +143,87 @@ class ProductSerializer(serializers.ModelSerializer):
             return getattr(obj.seller, "full_name", None) or obj.seller.username
         return None
 
+    @staticmethod
+    def attach_rating_stats(products):
+        """
+        Một query aggregate cho cả lô product; get_rating_* đọc lại kết quả này thay
+        vì query Review cho từng product (dùng cho các list lớn như wishlist).
+        """
+        products = [p for p in products if p is not None]
+        if not products:
+            return
+        stats = {
+            row['product']: (row['avg'], row['cnt'])
+            for row in Review.objects.filter(product__in=products)
+            .values('product').annotate(avg=Avg('rating'), cnt=Count('id'))
+        }
+        for product in products:
+            product._rating_stats = stats.get(product.pk, (None, 0))
+
     def get_rating_avg(self, obj):
+        if hasattr(obj, '_rating_stats'):
+            return round(obj._rating_stats[0] or 0, 2)
         agg = Review.objects.filter(product=obj).aggregate(avg=Avg('rating'))
         return round(agg['avg'] or 0, 2)
 
     def get_rating_count(self, obj):
+        if hasattr(obj, '_rating_stats'):
+            return obj._rating_stats[1]
         agg = Review.objects.filter(product=obj).aggregate(cnt=Count('id'))
         return agg['cnt'] or 0
 
+    def get_sold_count(self, obj):
+        # Từ bảng ProductRanking; nơi gọi cần select_related('ranking') để tránh N+1
+        try:
+            return obj.ranking.sold_total
+        except ProductRanking.DoesNotExist:
+            return 0
+
     def get_variants(self, obj):
-        return {
+        data = {
             "colors": obj.color_options or [],
             "sizes": obj.size_options or [],
         }
+        # Chi tiết tồn kho từng biến thể chỉ khi view đã prefetch (tránh N+1)
+        if 'variant_set' in getattr(obj, '_prefetched_objects_cache', {}):
+            data["items"] = ProductVariantSerializer(obj.variant_set.all(), many=True).data
+        return data
+
+
+# ============================================
+# PRODUCT VARIANT
+# ============================================
+
+class ProductVariantSerializer(serializers.ModelSerializer):
+    """Một biến thể màu/size; price = giá product + price_delta"""
+    price = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductVariant
+        fields = ["id", "color", "size", "stock", "price_delta", "price"]
+        read_only_fields = ["id"]
+
+    def get_price(self, obj):
+        return str(obj.product.price + obj.price_delta)
+
+
+class ProductVariantBulkSerializer(serializers.Serializer):
+    """Payload sửa hàng loạt: {"variants": [{color, size, stock, price_delta}, ...]}"""
+    variants = ProductVariantSerializer(many=True)
+
+    def validate_variants(self, rows):
+        product = self.context['product']
+        seen = set()
+        for row in rows:
+            key = (ProductAttribute.normalize(row.get('color')), ProductAttribute.normalize(row.get('size')))
+            if key == ('', ''):
+                raise serializers.ValidationError("Mỗi biến thể cần có màu hoặc size")
+            if key in seen:
+                raise serializers.ValidationError(f"Biến thể {row.get('color', '')}/{row.get('size', '')} bị lặp")
+            seen.add(key)
+            if product.price + row.get('price_delta', 0) <= 0:
+                raise serializers.ValidationError("Giá biến thể phải lớn hơn 0")
+        return rows
 
 
 class ProductCreateSerializer(serializers.ModelSerializer):
@@ -88,10 +235,22 @@ class ProductCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = [
-            "id", "name", "description", "price", "stock",
+            "id", "sku", "name", "description", "price", "stock",
             "color_options", "size_options", "image", "category", "is_active"
         ]
 
+    def validate_sku(self, value):
+        value = value.strip()
+        request = self.context.get('request')
+        if value and request and request.user.is_authenticated:
+            seller = self.instance.seller if self.instance else request.user
+            others = Product.objects.filter(seller=seller, sku=value)
+            if self.instance:
+                others = others.exclude(pk=self.instance.pk)
+            if others.exists():
+                raise serializers.ValidationError("SKU đã tồn tại trong shop của bạn")
+        return value
+
     def validate_price(self, value):
         if value <= 0:
             raise serializers.ValidationError("Giá phải lớn hơn 0")
@@ -102,11 +261,21 @@ class ProductCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Số lượng không được âm")
         return value
 
+    def validate(self, attrs):
+        # Product có biến thể: stock/màu/size là bản tóm tắt, phải sửa qua endpoint variants
+        if self.instance is not None and self.instance.variant_set.exists():
+            for field in MANAGED_FIELDS:
+                if field in attrs and attrs[field] != getattr(self.instance, field):
+                    raise serializers.ValidationError({field: MANAGED_FIELD_ERROR})
+        return attrs
+
     def create(self, validated_data):
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
             validated_data['seller'] = request.user
-        return super().create(validated_data)
+        product = super().create(validated_data)
+        ProductVariant.objects.bulk_create(build_from_options(product))
+        return product
 
 
 # ============================================
@@ -148,3 +317,51 @@ class SavedItemSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         validated_data.pop('product', None)
         return super().update(instance, validated_data)
+
+
+# ============================================
+# THÊM HÀNG LOẠT (WISHLIST / SAVED ITEM)
+# ============================================
+
+class WishlistBulkItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    color = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
+    size = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
+    note = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+
+class SavedItemBulkItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    color = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
+    size = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class ProductItemsBulkSerializer(serializers.Serializer):
+    """Payload {"items": [...]}; mọi product_id được kiểm tra bằng một query"""
+    MAX_ITEMS = 200
+
+    def validate_items(self, rows):
+        if not rows:
+            raise serializers.ValidationError("Danh sách trống")
+        if len(rows) > self.MAX_ITEMS:
+            raise serializers.ValidationError(f"Tối đa {self.MAX_ITEMS} sản phẩm mỗi lần")
+        ids = {row['product_id'] for row in rows}
+        active = set(Product.objects.filter(pk__in=ids, is_active=True).values_list('pk', flat=True))
+        missing = sorted(ids - active)
+        if missing:
+            raise serializers.ValidationError(
+                f"Sản phẩm không tồn tại hoặc đã ngừng bán: {', '.join(map(str, missing))}"
+            )
+        for row in rows:
+            row['color'] = row['color'].strip()
+            row['size'] = row['size'].strip()
+        return rows
+
+
+class WishlistBulkSerializer(ProductItemsBulkSerializer):
+    items = WishlistBulkItemSerializer(many=True)
+
+
+class SavedItemBulkSerializer(ProductItemsBulkSerializer):
+    items = SavedItemBulkItemSerializer(many=True)
@@ -0,0 +1,294 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import Product, ProductAttribute, ProductVariant, Category
+from .categories import ancestor_ids
+from . import autocomplete
+from .cache import (
+    bump_versions,
+    product_version,
+    category_version,
+    seller_version,
+    PRODUCTS_VERSION,
+    CATEGORIES_VERSION,
+)
+
+
+def sync_product_attributes(products):
+    """Đồng bộ lại inverted index color/size cho danh sách product (dùng chung cho bulk)"""
+    products = [p for p in products if p.pk]
+    if not products:
+        return
+    ProductAttribute.objects.filter(product_id__in=[p.pk for p in products]).delete()
+    rows = []
+    for product in products:
+        rows.extend(ProductAttribute.build_for(product))
+    if rows:
+        ProductAttribute.objects.bulk_create(rows, batch_size=500)
+
+
+@receiver(post_save, sender=Product)
+def update_product_attributes(sender, instance, created, update_fields=None, **kwargs):
+    """Chỉ rebuild index khi color_options/size_options có thể đã thay đổi."""
+    if update_fields is not None and not {'color_options', 'size_options'} & set(update_fields):
+        return
+    if created and not instance.color_options and not instance.size_options:
+        return
+    sync_product_attributes([instance])
+
+
+# ============================================
+# CATEGORY PRODUCT COUNTERS
+# ============================================
+
+def adjust_category_counts(category_id, total_delta, active_delta):
+    """Cộng/trừ bộ đếm bằng một câu UPDATE ... SET x = x + delta (không đọc trước)"""
+    if not category_id or (not total_delta and not active_delta):
+        return
+    Category.objects.filter(pk=category_id).update(
+        total_product_count=Greatest(F('total_product_count') + total_delta, 0),
+        product_count=Greatest(F('product_count') + active_delta, 0),
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_category_counts(sender, instance, created, **kwargs):
+    if created:
+        adjust_category_counts(instance.category_id, 1, int(instance.is_active))
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    old_category_id = loaded.get('category_id', instance.category_id)
+    old_is_active = loaded.get('is_active', instance.is_active)
+    if old_category_id == instance.category_id:
+        adjust_category_counts(instance.category_id, 0, int(instance.is_active) - int(old_is_active))
+    else:
+        adjust_category_counts(old_category_id, -1, -int(old_is_active))
+        adjust_category_counts(instance.category_id, 1, int(instance.is_active))
+
+
+@receiver(post_delete, sender=Product)
+def decrement_category_counts(sender, instance, **kwargs):
+    adjust_category_counts(instance.category_id, -1, -int(instance.is_active))
+
+
+# ============================================
+# RESPONSE CACHE INVALIDATION
+# ============================================
+
+def bump_product_versions(product_ids, category_ids, categories_changed=True):
+    """Bump version cho product/category bị ảnh hưởng (dùng cả sau bulk write)"""
+    names = [PRODUCTS_VERSION]
+    names += [product_version(pk) for pk in product_ids]
+    # Danh sách theo category gồm cả danh mục con nên tổ tiên cũng phải bump
+    names += [category_version(pk) for pk in ancestor_ids(category_ids)]
+    if categories_changed:
+        names.append(CATEGORIES_VERSION)
+    bump_versions(*names)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_cache(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    old_category_id = loaded.get('category_id', instance.category_id)
+    old_is_active = loaded.get('is_active', instance.is_active)
+    bump_product_versions(
+        [instance.pk],
+        {old_category_id, instance.category_id},
+        # product_count trên categories chỉ đổi khi thêm mới / đổi danh mục / bật tắt
+        categories_changed=(
+            created
+            or old_category_id != instance.category_id
+            or old_is_active != instance.is_active
+        ),
+    )
+    instance._loaded_values = dict(loaded, category_id=instance.category_id, is_active=instance.is_active)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product_cache(sender, instance, **kwargs):
+    bump_product_versions([instance.pk], [instance.category_id])
+
+
+def bump_embedding_products(products):
+    """
+    Payload chi tiết sản phẩm (và phần 'page-product') nhúng category / tên shop nhưng
+    chỉ key theo product:<id> -> đổi category / seller phải bump từng product liên quan
+    """
+    ids = list(products.values_list('pk', flat=True))
+    if ids:
+        bump_versions(*[product_version(pk) for pk in ids])
+
+
+@receiver(post_delete, sender=Category)
+def detach_category_subtree(sender, instance, **kwargs):
+    """Con của danh mục bị xoá đã bị SET_NULL parent (thành gốc) -> bỏ tiền tố path cũ"""
+    if instance.path:
+        Category.reprefix_subtree(instance.path, '')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    # Tên category được nhúng trong payload sản phẩm nên bump cả danh sách products;
+    # node bị chuyển chỗ thì tổ tiên cũ và mới đều có cây con thay đổi
+    paths = {instance.path, getattr(instance, '_previous_path', '') or ''}
+    ids = {pk for path in paths for pk in Category.ids_in_path(path)} | {instance.pk}
+    bump_versions(CATEGORIES_VERSION, PRODUCTS_VERSION, *[category_version(pk) for pk in ids])
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_products(sender, instance, created, **kwargs):
+    if created:
+        return
+    previous_path = getattr(instance, '_previous_path', '') or ''
+    if previous_path and previous_path != instance.path:
+        # Bị chuyển chỗ: path của cả cây con (nhúng trong payload) đều đổi
+        start, end = instance.subtree_range()
+        bump_embedding_products(Product.objects.filter(category__path__gte=start, category__path__lt=end))
+    else:
+        bump_embedding_products(Product.objects.filter(category=instance))
+
+
+@receiver(pre_delete, sender=Category)
+def collect_category_products(sender, instance, **kwargs):
+    # Sau khi xoá, product đã bị SET_NULL category bằng UPDATE (không qua save)
+    instance._product_ids = list(Product.objects.filter(category=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def invalidate_detached_products(sender, instance, **kwargs):
+    ids = getattr(instance, '_product_ids', [])
+    if ids:
+        bump_versions(*[product_version(pk) for pk in ids])
+
+
+@receiver(post_save, sender='reviews.Review')
+@receiver(post_delete, sender='reviews.Review')
+def invalidate_reviewed_product_cache(sender, instance, **kwargs):
+    # rating_avg/rating_count nằm trong payload sản phẩm (và rating của thẻ shop)
+    category_id, seller_id = Product.objects.filter(pk=instance.product_id)\
+        .values_list('category_id', 'seller_id').first() or (None, None)
+    bump_product_versions([instance.product_id], [category_id], categories_changed=False)
+    if seller_id:
+        bump_versions(seller_version(seller_id))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_seller_card(sender, instance, **kwargs):
+    # Thẻ shop trên trang sản phẩm có số sản phẩm đang bán
+    bump_versions(seller_version(instance.seller_id))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_seller_profile_card(sender, instance, created, update_fields=None, **kwargs):
+    if instance.user_type != 'seller':
+        return
+    bump_versions(seller_version(instance.pk))
+    # seller_name nằm trong payload sản phẩm; bỏ qua các save không đụng tới tên (vd. last_login)
+    if created or (update_fields is not None and not {'username', 'full_name'} & set(update_fields)):
+        return
+    products = Product.objects.filter(seller=instance)
+    category_ids = set(products.exclude(category=None).values_list('category_id', flat=True).distinct())
+    bump_product_versions(products.values_list('pk', flat=True), category_ids, categories_changed=False)
+
+
+@receiver(post_save, sender='users.Profile')
+def invalidate_seller_avatar_card(sender, instance, **kwargs):
+    bump_versions(seller_version(instance.user_id))
+
+
+# ============================================
+# AUTOCOMPLETE INDEX
+# ============================================
+
+@receiver(post_save, sender=Product)
+def update_product_suggestions(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'name', 'is_active'} & set(update_fields):
+        return
+    autocomplete.sync_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestions(sender, instance, **kwargs):
+    autocomplete.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestions(sender, instance, **kwargs):
+    autocomplete.sync_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestions(sender, instance, **kwargs):
+    autocomplete.remove_category(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_shop_suggestions(sender, instance, **kwargs):
+    autocomplete.sync_shop(instance)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def remove_shop_suggestions(sender, instance, **kwargs):
+    autocomplete.remove_shop(instance.pk)
+
+
+# ============================================
+# BULK WRITES (bulk_create/bulk_update bỏ qua signals)
+# ============================================
+
+def products_bulk_created(products):
+    """Cập nhật index màu/size, bộ đếm category và cache version sau bulk_create"""
+    products = [p for p in products if p.pk]
+    if not products:
+        return
+    sync_product_attributes(products)
+    # Import: tạo biến thể từ JSON như ProductCreateSerializer.create
+    from .variants import build_from_options
+    ProductVariant.objects.bulk_create(
+        [variant for product in products for variant in build_from_options(product)], batch_size=500
+    )
+    per_category = {}
+    for product in products:
+        total, active = per_category.get(product.category_id, (0, 0))
+        per_category[product.category_id] = (total + 1, active + int(product.is_active))
+    for category_id, (total, active) in per_category.items():
+        adjust_category_counts(category_id, total, active)
+    autocomplete.sync_products(products)
+    bump_product_versions([], per_category.keys())
+    bump_versions(*[seller_version(pk) for pk in {p.seller_id for p in products}])
+
+
+def products_bulk_updated(products):
+    """
+    Tương tự products_bulk_created cho bulk_update: so với snapshot _loaded_values
+    (lúc đọc từ DB) để điều chỉnh bộ đếm category, rồi làm mới snapshot.
+    """
+    products = [p for p in products if p.pk]
+    if not products:
+        return
+    sync_product_attributes(products)
+    deltas, category_ids, categories_changed = {}, set(), False
+    for product in products:
+        loaded = getattr(product, '_loaded_values', {})
+        old_category_id = loaded.get('category_id', product.category_id)
+        old_is_active = loaded.get('is_active', product.is_active)
+        if old_category_id != product.category_id or old_is_active != product.is_active:
+            categories_changed = True
+            for category_id, total, active in (
+                (old_category_id, -1, -int(old_is_active)),
+                (product.category_id, 1, int(product.is_active)),
+            ):
+                t, a = deltas.get(category_id, (0, 0))
+                deltas[category_id] = (t + total, a + active)
+        category_ids.update((old_category_id, product.category_id))
+        product._loaded_values = dict(loaded, category_id=product.category_id, is_active=product.is_active)
+    for category_id, (total, active) in deltas.items():
+        adjust_category_counts(category_id, total, active)
+    autocomplete.sync_products(products)
+    bump_product_versions([p.pk for p in products], category_ids, categories_changed=categories_changed)
+    bump_versions(*[seller_version(pk) for pk in {p.seller_id for p in products}])
@@ -1,3 +1,1082 @@
+import csv
+import json
+import re
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+import time
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache, caches
+from django.http import QueryDict
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from products.models import (
+    Product, ProductAttribute, ProductCoPurchase, ProductRanking, ProductVariant, Category, WishlistItem,
+    SavedItem,
+)
+from orders.models import Order, OrderItem
+from reviews.models import Review
+from products.cache import stats as cache_stats
+from products.categories import get_category_map
+from products import autocomplete, copurchase, rankings
+from products.views import filter_products
+
+
+class ProductFacetsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['catalog'].clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.shirts = Category.objects.create(name='Shirts')
+        self.shoes = Category.objects.create(name='Shoes')
+        Product.objects.create(
+            name='Red shirt', price=150000, seller=self.seller, category=self.shirts,
+            color_options=['Red', 'Blue'], size_options=['M', 'L'],
+        )
+        Product.objects.create(
+            name='Blue shirt', price=450000, seller=self.seller, category=self.shirts,
+            color_options=['Blue'], size_options=['M'],
+        )
+        Product.objects.create(
+            name='Runner', price=1500000, seller=self.seller, category=self.shoes,
+            color_options=['blue '], size_options=['42'],
+        )
+
+    def test_attribute_index_follows_json(self):
+        product = Product.objects.get(name='Blue shirt')
+        self.assertEqual(
+            set(product.attributes.values_list('attribute', 'value')),
+            {('color', 'blue'), ('size', 'm')},
+        )
+        product.color_options = ['Green']
+        product.save()
+        self.assertEqual(
+            set(product.attributes.filter(attribute='color').values_list('value', flat=True)),
+            {'green'},
+        )
+
+    def test_facet_counts(self):
+        with self.assertNumQueries(2):
+            resp = self.client.get(reverse('product-facets'))
+        self.assertEqual(resp.status_code, 200)
+        data = resp.data
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(
+            {c['name']: c['count'] for c in data['categories']},
+            {'Shirts': 2, 'Shoes': 1},
+        )
+        buckets = {b['key']: b['count'] for b in data['price']}
+        self.assertEqual(buckets['0-200000'], 1)
+        self.assertEqual(buckets['200000-500000'], 1)
+        self.assertEqual(buckets['1000000-2000000'], 1)
+        self.assertEqual({c['value']: c['count'] for c in data['colors']}, {'blue': 3, 'red': 1})
+        self.assertEqual({s['value']: s['count'] for s in data['sizes']}, {'m': 2, 'l': 1, '42': 1})
+
+        # Lần gọi thứ hai với cùng bộ lọc được phục vụ từ cache
+        with self.assertNumQueries(0):
+            self.client.get(reverse('product-facets'))
+
+    def test_facets_respect_filters(self):
+        resp = self.client.get(reverse('product-facets'), {'color': 'Red'})
+        self.assertEqual(resp.data['total'], 1)
+        self.assertEqual({s['value'] for s in resp.data['sizes']}, {'m', 'l'})
+
+        resp = self.client.get(reverse('product-list'), {'size': 'M', 'category': self.shirts.id})
+        self.assertEqual(len(resp.data), 2)
+        self.assertEqual(ProductAttribute.objects.filter(attribute='size', value='42').count(), 1)
+
+    def test_invalid_price_filter_is_rejected(self):
+        for name in ('product-list', 'product-facets'):
+            resp = self.client.get(reverse(name), {'min_price': 'abc'})
+            self.assertEqual(resp.status_code, 400)
+            self.assertIn('min_price', resp.data)
+            self.assertEqual(self.client.get(reverse(name), {'max_price': 'NaN'}).status_code, 400)
+        resp = self.client.get(reverse('product-facets'), {'min_price': '200000', 'max_price': '2000000'})
+        self.assertEqual(resp.data['total'], 2)
+
+
+class CatalogResponseCacheTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        cache_stats.reset()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.category = Category.objects.create(name='Shirts')
+        self.product = Product.objects.create(
+            name='Shirt', price=150000, seller=self.seller, category=self.category,
+        )
+
+    def test_list_served_from_cache_until_product_changes(self):
+        url = reverse('product-list')
+        first = self.client.get(url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+
+        self.product.name = 'Renamed'
+        self.product.save()
+        third = self.client.get(url)
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(third.data[0]['name'], 'Renamed')
+        self.assertEqual(cache_stats.snapshot()['product-list']['hit_ratio'], round(1 / 3, 4))
+
+    def test_versions_are_scoped(self):
+        other_category = Category.objects.create(name='Shoes')
+        other = Product.objects.create(name='Runner', price=1, seller=self.seller, category=other_category)
+        detail = reverse('product-detail', args=[self.product.id])
+        by_category = reverse('product-list') + f'?category={self.category.id}'
+        self.client.get(detail)
+        self.client.get(by_category)
+
+        other.price = 2
+        other.save()
+        self.assertEqual(self.client.get(detail)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(by_category)['X-Cache'], 'HIT')
+
+        # Chuyển sang category khác: cả category cũ lẫn mới đều bị invalidate
+        other.category = self.category
+        other.save()
+        resp = self.client.get(by_category)
+        self.assertEqual(resp['X-Cache'], 'MISS')
+        self.assertEqual(len(resp.data), 2)
+
+    def test_detail_follows_category_and_seller_renames(self):
+        self.seller.user_type = 'seller'
+        self.seller.save()
+        urls = [reverse('product-detail', args=[self.product.id]), reverse('product-page', args=[self.product.id])]
+        for url in urls:
+            self.client.get(url)
+
+        self.category.name = 'Tops'
+        self.category.save()
+        self.assertEqual(self.client.get(urls[0]).data['category_name'], 'Tops')
+        self.assertEqual(self.client.get(urls[1]).data['product']['category_name'], 'Tops')
+
+        self.seller.full_name = 'Shop Mới'
+        self.seller.save()
+        self.assertEqual(self.client.get(urls[0]).data['seller_name'], 'Shop Mới')
+        self.assertEqual(self.client.get(urls[1]).data['product']['seller_name'], 'Shop Mới')
+        self.assertEqual(self.client.get(reverse('product-list')).data[0]['seller_name'], 'Shop Mới')
+
+        # Save không đụng tới tên (vd. cập nhật last_login) không làm mất cache
+        self.seller.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(urls[0])['X-Cache'], 'HIT')
+
+        self.category.delete()
+        self.assertIsNone(self.client.get(urls[0]).data['category'])
+
+    def test_category_list_invalidated_by_product_toggle(self):
+        url = reverse('category-list')
+        self.assertEqual(self.client.get(url).data[0]['product_count'], 1)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.product.is_active = False
+        self.product.save()
+        resp = self.client.get(url)
+        self.assertEqual(resp['X-Cache'], 'MISS')
+        self.assertEqual(resp.data[0]['product_count'], 0)
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_authenticate(self.seller)
+        resp = self.client.get(reverse('product-list'))
+        self.assertFalse(resp.has_header('X-Cache'))
+
+
+class CatalogConditionalGetTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.category = Category.objects.create(name='Shirts')
+        self.product = Product.objects.create(
+            name='Shirt', price=150000, seller=self.seller, category=self.category,
+        )
+
+    def test_detail_revalidation(self):
+        url = reverse('product-detail', args=[self.product.id])
+        resp = self.client.get(url)
+        etag = resp['ETag']
+        self.assertTrue(resp.has_header('Last-Modified'))
+
+        # Từ cache: 304 không cần truy vấn DB
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        # Người dùng đã đăng nhập: chỉ một câu đọc updated_at, không serialize
+        self.client.force_authenticate(self.seller)
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        self.product.price = 160000
+        self.product.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_list_etag_changes_with_filtered_set(self):
+        url = reverse('product-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Tham số khác -> representation khác -> ETag khác
+        self.assertNotEqual(self.client.get(url, {'ordering': 'price'})['ETag'], etag)
+
+        Product.objects.create(name='Pants', price=1, seller=self.seller, category=self.category)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_category_list_etag(self):
+        url = reverse('category-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.category.name = 'Tops'
+        self.category.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def since(self, url):
+        """Last-Modified của lần xem đầu, đặt lùi 10 giây để lần bump sau rơi vào giây khác"""
+        Product.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        Category.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        with mock.patch('products.cache.time.time', return_value=time.time() - 10):
+            caches['catalog'].clear()
+            since = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, 304)
+        return since
+
+    def test_last_modified_moves_when_product_is_deleted(self):
+        older = Product.objects.create(name='Old', price=1, seller=self.seller, category=self.category)
+        url = reverse('product-list')
+        since = self.since(url)
+        # Xoá dòng không làm đổi max(updated_at) của các dòng còn lại
+        older.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_last_modified_moves_when_category_counter_changes(self):
+        url = reverse('category-list')
+        since = self.since(url)
+        # Chỉ product_count (denormalised) của danh mục đổi, updated_at của category giữ nguyên
+        Product.objects.create(name='Pants', price=1, seller=self.seller, category=self.category)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+
+class ProductSparseFieldsTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        category = Category.objects.create(name='Shirts')
+        for i in range(3):
+            Product.objects.create(
+                name=f'Shirt {i}', price=150000, seller=self.seller, category=category,
+                description='x' * 500, color_options=['Red'],
+            )
+
+    def test_card_view(self):
+        # Không còn 2 query rating cho mỗi sản phẩm: 1 query cho cả trang + 1 cho validators
+        with self.assertNumQueries(2):
+            resp = self.client.get(reverse('product-list'), {'view': 'card'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(set(resp.data[0]), {'id', 'name', 'price', 'image', 'stock'})
+
+    def test_fields_param(self):
+        resp = self.client.get(reverse('product-list'), {'fields': 'name,category_name,bogus'})
+        self.assertEqual(set(resp.data[0]), {'id', 'name', 'category_name'})
+        self.assertEqual(resp.data[0]['category_name'], 'Shirts')
+
+        product = Product.objects.first()
+        resp = self.client.get(reverse('product-detail', args=[product.id]), {'fields': 'variants,seller_name'})
+        self.assertEqual(resp.data['variants'], {'colors': ['Red'], 'sizes': [], 'items': []})
+        self.assertEqual(resp.data['seller_name'], 'seller1')
+
+    def test_full_representation_unchanged(self):
+        resp = self.client.get(reverse('product-list'))
+        self.assertIn('description', resp.data[0])
+        self.assertEqual(resp.data[0]['category']['name'], 'Shirts')
+
+
+class CategoryTreeTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.men = Category.objects.create(name="Men's Clothing")
+        self.tops = Category.objects.create(name='Tops', parent=self.men)
+        self.tees = Category.objects.create(name='T-Shirts', parent=self.tops)
+        self.shoes = Category.objects.create(name='Shoes')
+        Product.objects.create(name='Tee', price=1, seller=self.seller, category=self.tees)
+        Product.objects.create(name='Jacket', price=1, seller=self.seller, category=self.men)
+        Product.objects.create(name='Sneaker', price=1, seller=self.seller, category=self.shoes)
+
+    def test_paths(self):
+        self.tees.refresh_from_db()
+        self.assertEqual(self.tees.path, f'{self.men.id:06d}/{self.tops.id:06d}/{self.tees.id:06d}/')
+        self.assertEqual(self.tees.depth, 2)
+
+        # Chuyển nhánh Tops sang Shoes: cả cây con được cập nhật path
+        self.tops.parent = self.shoes
+        self.tops.save()
+        self.tees.refresh_from_db()
+        self.assertEqual(self.tees.path, f'{self.shoes.id:06d}/{self.tops.id:06d}/{self.tees.id:06d}/')
+
+    def test_new_category_has_path_when_receivers_run(self):
+        seen = []
+
+        def capture(sender, instance, created, **kwargs):
+            # Chạy sau bump version: giống một request đọc map danh mục ngay lúc đó
+            mapped = get_category_map()[instance.pk]['path']
+            seen.append((created, instance.path, mapped))
+
+        post_save.connect(capture, sender=Category)
+        try:
+            boots = Category.objects.create(name='Boots', parent=self.shoes)
+        finally:
+            post_save.disconnect(capture, sender=Category)
+        path = f'{self.shoes.id:06d}/{boots.id:06d}/'
+        self.assertEqual(seen, [(True, path, path)])
+        self.assertEqual(get_category_map()[boots.id]['path'], path)
+
+    def test_cannot_parent_under_descendant(self):
+        self.men.parent = self.tees
+        with self.assertRaises(ValueError):
+            self.men.save()
+
+    def test_subtree_filter(self):
+        url = reverse('product-list')
+        names = {p['name'] for p in self.client.get(url, {'category': self.men.id}).data}
+        self.assertEqual(names, {'Tee', 'Jacket'})
+        names = {p['name'] for p in self.client.get(url, {'category': self.men.id, 'include_descendants': 'false'}).data}
+        self.assertEqual(names, {'Jacket'})
+
+        # Sản phẩm mới trong danh mục cháu invalidate cache của danh mục gốc
+        Product.objects.create(name='Polo', price=1, seller=self.seller, category=self.tees)
+        names = {p['name'] for p in self.client.get(url, {'category': self.men.id}).data}
+        self.assertEqual(names, {'Tee', 'Jacket', 'Polo'})
+
+    def test_tree_and_breadcrumbs(self):
+        resp = self.client.get(reverse('category-tree'))
+        self.assertEqual([n['name'] for n in resp.data], ["Men's Clothing", 'Shoes'])
+        tops = resp.data[0]['children'][0]
+        self.assertEqual(tops['children'][0]['name'], 'T-Shirts')
+        self.assertEqual(tops['children'][0]['product_count'], 1)
+
+        self.client.get(reverse('category-breadcrumbs', args=[self.tees.id]))
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('category-breadcrumbs', args=[self.tees.id]))
+        self.assertEqual([c['name'] for c in resp.data], ["Men's Clothing", 'Tops', 'T-Shirts'])
+
+    def test_delete_parent_detaches_subtree(self):
+        self.men.delete()
+        self.tees.refresh_from_db()
+        self.assertEqual(self.tees.path, f'{self.tops.id:06d}/{self.tees.id:06d}/')
+
+
+class CategoryCountersTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.shirts = Category.objects.create(name='Shirts')
+        self.shoes = Category.objects.create(name='Shoes')
+
+    def counts(self, category):
+        category.refresh_from_db()
+        return category.total_product_count, category.product_count
+
+    def test_counters_follow_product_changes(self):
+        product = Product.objects.create(name='Shirt', price=1, seller=self.seller, category=self.shirts)
+        Product.objects.create(name='Draft', price=1, seller=self.seller, category=self.shirts, is_active=False)
+        self.assertEqual(self.counts(self.shirts), (2, 1))
+
+        product.is_active = False
+        product.save()
+        self.assertEqual(self.counts(self.shirts), (2, 0))
+
+        product = Product.objects.get(pk=product.pk)
+        product.category = self.shoes
+        product.is_active = True
+        product.save()
+        self.assertEqual(self.counts(self.shirts), (1, 0))
+        self.assertEqual(self.counts(self.shoes), (1, 1))
+
+        product.delete()
+        self.assertEqual(self.counts(self.shoes), (0, 0))
+
+    def test_category_list_is_a_plain_read(self):
+        Product.objects.create(name='Shirt', price=1, seller=self.seller, category=self.shirts)
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = client.get(reverse('category-list'))
+        # validators (max updated_at) + đọc danh sách; không JOIN bảng Product
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertFalse(any('products_product' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual({c['name']: c['product_count'] for c in resp.data}, {'Shirts': 1, 'Shoes': 0})
+
+    def test_reconcile_command(self):
+        Product.objects.create(name='Shirt', price=1, seller=self.seller, category=self.shirts)
+        # bulk update bỏ qua signals -> bộ đếm bị lệch
+        Product.objects.update(category=self.shoes)
+        call_command('reconcile_category_counts', stdout=StringIO())
+        self.assertEqual(self.counts(self.shirts), (0, 0))
+        self.assertEqual(self.counts(self.shoes), (1, 1))
+
+
+class ImportProductsCommandTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        User = get_user_model()
+        User.objects.create_user(username='seller1', email='s1@example.com', password='pass12345')
+        User.objects.create_user(username='seller2', email='s2@example.com', password='pass12345')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.styles = Path(self.tmp.name) / 'styles.csv'
+        with self.styles.open('w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'gender', 'masterCategory', 'subCategory', 'baseColour', 'productDisplayName'])
+            for i in range(1, 8):
+                writer.writerow([i, 'Men', 'Apparel', 'Topwear' if i % 2 else 'Shoes', 'Blue', f'Product {i}'])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_import(self):
+        call_command(
+            'import_products', styles=str(self.styles), images_csv=str(Path(self.tmp.name) / 'none.csv'),
+            image_dir='', chunk_size=3, no_embed=True, seed=1, stdout=StringIO(),
+        )
+
+    def test_import_is_idempotent_and_keeps_derived_data(self):
+        self.run_import()
+        self.run_import()
+        self.assertEqual(Product.objects.count(), 7)
+        self.assertEqual(set(Category.objects.values_list('name', 'total_product_count')), {('Topwear', 4), ('Shoes', 3)})
+        product = Product.objects.get(sku='styles-3')
+        self.assertEqual(product.attributes.filter(attribute='color').count(), len(product.color_options))
+
+
+class SellerBulkUpsertTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.client.force_authenticate(self.seller)
+        self.shirts = Category.objects.create(name='Shirts')
+        self.shoes = Category.objects.create(name='Shoes')
+        self.url = reverse('seller-products-bulk')
+
+    def upload(self, body, content_type):
+        response = self.client.generic('POST', self.url, body, content_type=content_type)
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        return lines[:-1], lines[-1]['summary']
+
+    def test_jsonl_upsert_by_sku(self):
+        Product.objects.create(name='Old', price=5, seller=self.seller, sku='A1', category=self.shirts)
+        body = '\n'.join(json.dumps(row) for row in [
+            {'sku': 'A1', 'price': '9.50', 'category': self.shoes.pk, 'color_options': ['Red']},
+            {'sku': 'B2', 'name': 'New', 'price': '3', 'category': self.shirts.pk},
+            {'sku': 'C3', 'name': 'Missing price'},
+            {'sku': 'D4', 'name': 'Bad', 'price': '1', 'category': 999},
+            {'sku': 'B2', 'name': 'Dup', 'price': '3'},
+        ])
+        results, summary = self.upload(body, 'application/x-ndjson')
+        self.assertEqual([r['status'] for r in results], ['updated', 'created', 'error', 'error', 'error'])
+        self.assertEqual([r['row'] for r in results], [1, 2, 3, 4, 5])
+        self.assertEqual(summary, {'created': 1, 'updated': 1, 'error': 3})
+
+        updated = Product.objects.get(sku='A1')
+        self.assertEqual((updated.name, str(updated.price), updated.category_id), ('Old', '9.50', self.shoes.pk))
+        self.assertEqual(list(updated.attributes.values_list('value', flat=True)), ['red'])
+        self.shirts.refresh_from_db()
+        self.shoes.refresh_from_db()
+        self.assertEqual((self.shirts.total_product_count, self.shoes.total_product_count), (1, 1))
+
+    def test_csv_upload_uses_few_queries(self):
+        rows = ['sku,name,price,stock,category,color_options']
+        rows += [f'S{i},Item {i},10,{i},{self.shirts.pk},Red|Blue' for i in range(50)]
+        with CaptureQueriesContext(connection) as ctx:
+            results, summary = self.upload('\n'.join(rows), 'text/csv')
+        self.assertEqual(summary['created'], 50)
+        self.assertLess(len(ctx.captured_queries), 30)
+        self.assertEqual(Product.objects.filter(seller=self.seller).count(), 50)
+        self.shirts.refresh_from_db()
+        self.assertEqual(self.shirts.product_count, 50)
+
+    def test_failed_chunk_is_reported_and_rolled_back(self):
+        body = '\n'.join(json.dumps({'sku': f'S{i}', 'name': f'P{i}', 'price': '1'}) for i in range(1, 6))
+        with mock.patch('products.bulk.CHUNK_SIZE', 2), \
+                mock.patch('products.bulk.products_bulk_created', side_effect=[None, IntegrityError('boom'), None]):
+            results, summary = self.upload(body, 'application/x-ndjson')
+        self.assertEqual([r['status'] for r in results], ['created', 'created', 'error', 'error', 'created'])
+        self.assertIn('boom', results[2]['errors']['non_field_errors'][0])
+        self.assertEqual(summary, {'created': 3, 'updated': 0, 'error': 2})
+        self.assertEqual(set(Product.objects.values_list('sku', flat=True)), {'S1', 'S2', 'S5'})
+
+    def test_variant_summary_fields_are_rejected(self):
+        product = Product.objects.create(name='Tee', price=5, seller=self.seller, sku='V1', stock=4,
+                                         color_options=['Red'], size_options=['M'])
+        ProductVariant.objects.create(product=product, color='Red', size='M', stock=4)
+        body = '\n'.join(json.dumps(row) for row in [
+            {'sku': 'V1', 'stock': 100, 'color_options': ['Red', 'Blue']},
+            {'sku': 'V1', 'price': '7'},
+        ])
+        results, summary = self.upload(body, 'application/x-ndjson')
+        self.assertEqual(set(results[0]['errors']), {'stock', 'color_options'})
+        self.assertEqual(results[1]['errors']['sku'], ['SKU bị lặp trong file upload'])
+        results, summary = self.upload(json.dumps({'sku': 'V1', 'price': '7', 'stock': 4}), 'application/x-ndjson')
+        self.assertEqual(summary['updated'], 1)
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.color_options, str(product.price)), (4, ['Red'], '7.00'))
+
+    def test_invalid_jsonl_is_rejected(self):
+        response = self.client.generic('POST', self.url, '{"sku": "A"\nnot json', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductAutocompleteTest(TestCase):
+    def setUp(self):
+        autocomplete.invalidate()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345',
+            user_type='seller',
+            full_name='Shop Áo Đẹp',
+        )
+        self.shirts = Category.objects.create(name='Áo sơ mi')
+        self.product = Product.objects.create(name='Áo thun trắng', price=1, seller=self.seller)
+        Product.objects.create(name='Quần jean', price=1, seller=self.seller, is_active=False)
+        self.url = reverse('product-autocomplete')
+
+    def suggest(self, q, **params):
+        response = self.client.get(self.url, {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(s['type'], s['label']) for s in response.data['suggestions']]
+
+    def test_prefix_matches_are_accent_insensitive(self):
+        self.assertEqual(self.suggest('ao'), [
+            ('product', 'Áo thun trắng'), ('category', 'Áo sơ mi'), ('shop', 'Shop Áo Đẹp'),
+        ])
+        self.assertEqual(self.suggest('Dep'), [('shop', 'Shop Áo Đẹp')])
+        self.assertEqual(self.suggest('quan'), [])
+        self.assertEqual(self.suggest('ao', type='shop'), [('shop', 'Shop Áo Đẹp')])
+
+    def test_index_follows_writes_without_queries(self):
+        self.suggest('ao')
+        self.product.name = 'Váy hoa'
+        self.product.save()
+        Product.objects.create(name='Áo khoác', price=1, seller=self.seller)
+        self.shirts.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('ao'), [('product', 'Áo khoác'), ('shop', 'Shop Áo Đẹp')])
+            self.assertEqual(self.suggest('hoa'), [('product', 'Váy hoa')])
+
+    def test_single_character_is_ignored(self):
+        self.assertEqual(self.suggest('a'), [])
+
+    def test_short_prefix_top_survives_removals(self):
+        idx = autocomplete.PrefixIndex()
+        idx.load([(autocomplete.PRODUCT, i, f'Áo {i:03d}') for i in range(60)])
+        labels = lambda: [s['label'] for s in idx.search('ao', limit=autocomplete.MAX_LIMIT)]
+        self.assertEqual(labels(), [f'Áo {i:03d}' for i in range(25)])
+        # Bỏ hết phần top đã tính (vượt quá phần dự phòng) -> tính lại, không mất item
+        for i in range(40):
+            idx.remove(autocomplete.PRODUCT, i)
+        idx.upsert(autocomplete.PRODUCT, 99, 'Áo 999')
+        self.assertEqual(labels(), [f'Áo {i:03d}' for i in range(40, 60)] + ['Áo 999'])
+        idx.upsert(autocomplete.PRODUCT, 100, 'Áo')
+        self.assertEqual(labels()[0], 'Áo')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN là cú pháp của SQLite')
+class ProductQueryPlanTest(TestCase):
+    """Các query nóng phải đi qua index: không SCAN cả bảng, không sort tạm khi đã có index phù hợp"""
+
+    FULL_SCAN = re.compile(r'\bSCAN \w+$', re.MULTILINE)
+
+    def setUp(self):
+        caches['catalog'].clear()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.shirts = Category.objects.create(name='Shirts')
+
+    def catalog(self, query, ordering='-created_at'):
+        return filter_products(Product.objects.all(), QueryDict(query)).order_by(ordering)
+
+    def assertUsesIndex(self, queryset, sorted_by_index=True):
+        plan = queryset.explain()
+        self.assertIsNone(self.FULL_SCAN.search(plan), f'Full table scan:\n{plan}\n{queryset.query}')
+        if sorted_by_index:
+            self.assertNotIn('TEMP B-TREE', plan, f'Sort không dùng index:\n{plan}')
+
+    def test_catalog_listing(self):
+        self.assertUsesIndex(self.catalog(''))
+        self.assertUsesIndex(self.catalog('is_active=true'))
+        self.assertUsesIndex(self.catalog('is_active=true&stock_status=in_stock'))
+        self.assertUsesIndex(self.catalog('is_active=true&min_price=10&max_price=100', ordering='price'))
+        self.assertUsesIndex(self.catalog(f'is_active=true&category={self.shirts.pk}&include_descendants=false'))
+        # Lọc màu đi từ inverted index rồi tra theo id; cây con gồm nhiều category_id.
+        # Hai trường hợp này vẫn phải sort, nhưng không được quét cả bảng
+        self.assertUsesIndex(self.catalog('is_active=true&color=red'), sorted_by_index=False)
+        self.assertUsesIndex(self.catalog(f'is_active=true&category={self.shirts.pk}'), sorted_by_index=False)
+
+    def test_shop_page(self):
+        products = Product.objects.filter(seller=self.seller, is_active=True)
+        self.assertUsesIndex(products.order_by('-created_at'))
+        self.assertUsesIndex(products.order_by('price'))
+        self.assertUsesIndex(products.order_by('-price'))
+
+    def test_seller_stats(self):
+        products = Product.objects.filter(seller=self.seller).order_by()
+        self.assertUsesIndex(products)
+        self.assertUsesIndex(products.filter(is_active=False))
+        self.assertUsesIndex(products.filter(stock=0))
+
+
+class ProductVariantTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.client.force_authenticate(self.seller)
+        response = self.client.post(reverse('product-list'), {
+            'name': 'Shirt', 'price': '100', 'stock': 7,
+            'color_options': ['Red', 'Blue'], 'size_options': ['M'],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.product = Product.objects.get(pk=response.data['product']['id'])
+        self.url = reverse('seller-product-variants', args=[self.product.pk])
+
+    def test_create_builds_variants_from_options(self):
+        variants = {(v.color, v.size): v.stock for v in self.product.variant_set.all()}
+        self.assertEqual(variants, {('Red', 'M'): 4, ('Blue', 'M'): 3})
+
+    def test_bulk_edit_updates_summary_and_filters(self):
+        response = self.client.put(self.url, {'variants': [
+            {'color': 'red', 'size': 'M', 'stock': 0},
+            {'color': 'Green', 'size': 'L', 'stock': 5, 'price_delta': '10'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 5)
+        self.assertEqual([(v['color'], v['price']) for v in response.data['variants']],
+                         [('Green', '110.00'), ('red', '100.00')])
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.color_options, self.product.size_options),
+                         (5, ['red', 'Green'], ['M', 'L']))
+
+        def listed(query):
+            self.client.force_authenticate(None)
+            return [p['id'] for p in self.client.get(reverse('product-list') + '?' + query).data]
+
+        self.assertEqual(listed('color=Red&stock_status=in_stock'), [])
+        self.assertEqual(listed('color=green&size=L&stock_status=in_stock'), [self.product.pk])
+        self.assertEqual(listed('color=Red'), [self.product.pk])
+
+        availability = self.client.get(reverse('product-availability', args=[self.product.pk]),
+                                       {'color': 'GREEN', 'size': 'l', 'quantity': 6}).data
+        self.assertEqual((availability['stock'], availability['price'], availability['available']),
+                         (5, Decimal('110.00'), False))
+
+    def test_duplicate_variants_and_direct_stock_edit_are_rejected(self):
+        response = self.client.patch(self.url, {'variants': [
+            {'color': 'Red', 'size': 'M'}, {'color': 'RED', 'size': 'm'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(reverse('seller-product-detail', args=[self.product.pk]),
+                                     {'stock': 50}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductRankingTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.a = Product.objects.create(name='A', price=1, seller=self.seller)
+        self.b = Product.objects.create(name='B', price=1, seller=self.seller)
+        self.c = Product.objects.create(name='C', price=1, seller=self.seller)
+        self.now = timezone.now()
+
+    def sell(self, product, quantity, ago):
+        order = Order.objects.create(
+            order_id=f'ORDRANK{Order.objects.count()}', full_name='A', phone='0', email='a@test.com',
+            address='-', ward='-', district='-', city='-', total_amount=0,
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=self.now - ago)
+        order.refresh_from_db()
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, price=1)
+        return order
+
+    def ranked(self, ordering):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse('product-list'), {'ordering': ordering, 'fields': 'name,sold_count'})
+        self.assertFalse(any('orders_orderitem' in q['sql'] for q in ctx.captured_queries))
+        return [(p['name'], p['sold_count']) for p in resp.data]
+
+    def test_rankings_power_ordering(self):
+        self.sell(self.a, 5, timedelta(days=2))
+        self.sell(self.b, 3, timedelta(hours=1))
+        rankings.rollup(self.now)
+
+        self.assertEqual(self.ranked('best_selling'), [('A', 5), ('B', 3), ('C', 0)])
+        self.assertEqual(self.ranked('trending'), [('B', 3), ('A', 5), ('C', 0)])
+        ranking = ProductRanking.objects.get(product=self.b)
+        self.assertEqual((ranking.sold_24h, ranking.sold_7d, ranking.sold_30d), (3, 3, 3))
+
+    def test_rollup_is_incremental_and_follows_cancellations(self):
+        order = self.sell(self.a, 5, timedelta(days=2))
+        self.assertEqual(rankings.rollup(self.now)['products_sold'], 1)
+        self.assertEqual(rankings.rollup(self.now)['rankings_changed'], 0)
+
+        # Đơn vừa tạo (trong SAFETY_LAG) chờ lần rollup sau
+        self.sell(self.b, 2, timedelta(seconds=5))
+        self.assertEqual(rankings.rollup(self.now)['products_sold'], 0)
+        self.assertEqual(rankings.rollup(self.now + timedelta(minutes=5))['products_sold'], 1)
+
+        order.status = 'canceled'
+        order.save()
+        self.assertEqual(ProductRanking.objects.get(product=self.a).sold_total, 0)
+        order.status = 'pending'
+        order.save()
+        self.assertEqual(ProductRanking.objects.get(product=self.a).sold_30d, 5)
+
+    def test_seller_and_shop_pages_join_ranking(self):
+        """sold_count đọc từ select_related('ranking'), không query ProductRanking từng product"""
+        self.sell(self.a, 2, timedelta(hours=1))
+        rankings.rollup(self.now)
+        self.seller.user_type = 'seller'
+        self.seller.save()
+        self.client.force_authenticate(self.seller)
+        urls = [
+            reverse('seller-products'),
+            reverse('seller-product-detail', args=[self.a.pk]),
+            reverse('seller-shop', args=[self.seller.pk]),
+            reverse('shop-stats', args=[self.seller.pk]),
+        ]
+        for url in urls:
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            lazy = [q['sql'] for q in ctx.captured_queries if 'FROM "products_productranking"' in q['sql']]
+            self.assertEqual(lazy, [], url)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.patch(reverse('toggle-product-status', args=[self.a.pk]), {}, format='json')
+        self.assertEqual(resp.data['sold_count'], 2)
+        self.assertFalse(any('FROM "products_productranking"' in q['sql'] for q in ctx.captured_queries))
+
+
+class ProductCoPurchaseTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1',
+            email='seller@example.com',
+            password='pass12345'
+        )
+        self.a, self.b, self.c, self.d = [
+            Product.objects.create(name=name, price=1, seller=self.seller) for name in 'ABCD'
+        ]
+        self.now = timezone.now()
+
+    def order(self, *products, status='pending'):
+        order = Order.objects.create(
+            order_id=f'ORDCO{Order.objects.count()}', full_name='A', phone='0', email='a@test.com',
+            address='-', ward='-', district='-', city='-', total_amount=0, status=status,
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=self.now - timedelta(hours=1))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=1) for product in products
+        ])
+        return order
+
+    def related(self, url, **params):
+        resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        return [(p['name'], p['co_purchase_count']) for p in resp.data['results']]
+
+    def test_bought_together_from_incremental_rollups(self):
+        self.order(self.a, self.b)
+        self.order(self.a, self.b, self.c)
+        self.order(self.a, self.c, self.c)  # C hai dòng (khác size) vẫn tính một đơn
+        self.order(self.a, self.d, status='canceled')
+        stats = copurchase.rollup(self.now, batch_orders=3)
+        self.assertEqual(stats['orders'], 4)
+
+        url = reverse('product-bought-together', args=[self.a.pk])
+        self.assertEqual(self.related(url), [('B', 2), ('C', 2)])
+        self.assertEqual(self.related(url, limit=1), [('B', 2)])
+        self.assertEqual(self.related(reverse('cart-bought-together'), ids=f'{self.b.pk},{self.c.pk}'), [('A', 4)])
+
+        # Lần sau chỉ gộp đơn mới
+        self.order(self.b, self.c)
+        self.assertEqual(copurchase.rollup(self.now)['orders'], 1)
+        self.assertEqual(self.related(reverse('product-bought-together', args=[self.c.pk])), [('A', 2), ('B', 2)])
+
+        # Sản phẩm ngừng bán không được gợi ý
+        Product.objects.filter(pk=self.b.pk).update(is_active=False)
+        self.assertEqual(self.related(url), [('C', 2)])
+
+        # Tính lại từ đầu cho cùng kết quả
+        copurchase.rebuild(self.now)
+        self.assertEqual(ProductCoPurchase.objects.get(product=self.c, related=self.b).count, 2)
+        self.assertFalse(ProductCoPurchase.objects.filter(related=self.d).exists())
+
+    def test_bought_together_errors(self):
+        self.assertEqual(self.client.get(reverse('product-bought-together', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('cart-bought-together'), {'ids': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('cart-bought-together')).status_code, 400)
+
+
+class WishlistListingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1', email='seller@example.com', password='pass12345', user_type='seller'
+        )
+        self.buyer = User.objects.create_user(
+            username='buyer1', email='buyer@example.com', password='pass12345', user_type='buyer'
+        )
+        self.reviewer = User.objects.create_user(
+            username='buyer2', email='buyer2@example.com', password='pass12345', user_type='buyer'
+        )
+        self.category = Category.objects.create(name='Áo')
+        self.client.force_authenticate(self.buyer)
+
+    def add_items(self, count):
+        products = Product.objects.bulk_create([
+            Product(name=f'P{i}', price=1, seller=self.seller, category=self.category)
+            for i in range(count)
+        ])
+        Review.objects.bulk_create([
+            Review(product=p, user=user, rating=rating)
+            for p in products for user, rating in ((self.buyer, 4), (self.reviewer, 5))
+        ])
+        WishlistItem.objects.bulk_create([WishlistItem(user=self.buyer, product=p) for p in products])
+        SavedItem.objects.bulk_create([SavedItem(user=self.buyer, product=p) for p in products])
+        return products
+
+    def test_listing_query_count_does_not_grow_with_items(self):
+        for url in (reverse('wishlist-list'), reverse('saveditem-list')):
+            WishlistItem.objects.all().delete()
+            SavedItem.objects.all().delete()
+            self.add_items(3)
+            # 1 query item + product + category + seller + ranking, 1 query rating
+            with self.assertNumQueries(2):
+                resp = self.client.get(url)
+            self.assertEqual(len(resp.data), 3)
+            self.assertEqual(resp.data[0]['product']['rating_avg'], 4.5)
+            self.assertEqual(resp.data[0]['product']['rating_count'], 2)
+            self.assertEqual(resp.data[0]['product']['seller_name'], 'seller1')
+
+            self.add_items(30)
+            with self.assertNumQueries(2):
+                resp = self.client.get(url)
+            self.assertEqual(len(resp.data), 33)
+
+    def test_cursor_pagination(self):
+        self.add_items(5)
+        seen, url, params = [], reverse('wishlist-list'), {'page_size': 2}
+        while url:
+            resp = self.client.get(url, params)
+            self.assertEqual(resp.status_code, 200)
+            self.assertLessEqual(len(resp.data['results']), 2)
+            seen += [item['id'] for item in resp.data['results']]
+            url, params = resp.data['next'], None
+        self.assertEqual(seen, list(WishlistItem.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def bulk_queries(self, url, items):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(url, {'items': items}, format='json')
+        return resp, len(ctx.captured_queries)
+
+    def test_bulk_add_to_wishlist(self):
+        p1, p2, p3 = self.add_items(3)
+        WishlistItem.objects.filter(product=p1).update(note='cũ')
+        WishlistItem.objects.filter(product__in=[p2, p3]).delete()
+        url = reverse('wishlist-bulk')
+
+        resp, queries = self.bulk_queries(url, [
+            {'product_id': p1.pk},                          # đã có, không note -> giữ note cũ
+            {'product_id': p2.pk, 'color': ' Đỏ ', 'note': 'quà'},
+            {'product_id': p3.pk, 'size': 'M'},
+        ])
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual((resp.data['created'], resp.data['updated']), (2, 1))
+        self.assertEqual(WishlistItem.objects.get(product=p1).note, 'cũ')
+        self.assertTrue(WishlistItem.objects.filter(product=p2, color='Đỏ', note='quà').exists())
+        self.assertEqual(resp.data['items'][0]['product']['rating_count'], 2)
+
+        # Số query không phụ thuộc số item
+        more = self.add_items(20)
+        WishlistItem.objects.filter(product__in=more).delete()
+        resp, queries_20 = self.bulk_queries(url, [{'product_id': p.pk, 'note': 'x' * (i % 2)} for i, p in enumerate(more)])
+        self.assertEqual(resp.data['created'], 20)
+        self.assertEqual(queries_20, queries)
+
+    def test_bulk_move_cart_to_saved(self):
+        p1, p2 = self.add_items(2)
+        SavedItem.objects.filter(product=p2).delete()
+        resp, _ = self.bulk_queries(reverse('saveditem-bulk'), [
+            {'product_id': p1.pk, 'quantity': 2},
+            {'product_id': p2.pk, 'color': 'Xanh', 'quantity': 1},
+            {'product_id': p2.pk, 'color': 'Xanh', 'quantity': 2},
+        ])
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(SavedItem.objects.get(product=p1).quantity, 3)
+        self.assertEqual(SavedItem.objects.get(product=p2, color='Xanh').quantity, 3)
+
+    def test_bulk_rejects_whole_batch_on_unknown_product(self):
+        p1, = self.add_items(1)
+        Product.objects.filter(pk=p1.pk).update(is_active=False)
+        resp = self.client.post(reverse('saveditem-bulk'), {'items': [
+            {'product_id': p1.pk}, {'product_id': 9999},
+        ]}, format='json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('items', resp.data['errors'])
+        self.assertEqual(SavedItem.objects.get(product=p1).quantity, 1)
+
+
+class ProductPageTest(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.seller = User.objects.create_user(
+            username='seller1', email='seller@example.com', password='pass12345',
+            user_type='seller', full_name='Shop Một',
+        )
+        self.category = Category.objects.create(name='Áo')
+        self.product = Product.objects.create(
+            name='Áo thun', price=100, stock=5, seller=self.seller, category=self.category,
+            color_options=['Đỏ'], size_options=['M', 'L'],
+        )
+        self.bought_with = Product.objects.create(name='Quần', price=50, seller=self.seller)
+        self.same_category = Product.objects.create(name='Áo khoác', price=80, seller=self.seller,
+                                                    category=self.category)
+        ProductCoPurchase.objects.create(product=self.product, related=self.bought_with, count=3)
+        for i, rating in enumerate([5, 5, 4, 3, 5, 1, 4]):
+            user = User.objects.create_user(username=f'r{i}', email=f'r{i}@example.com',
+                                            password='pass12345', full_name=f'R{i}')
+            Review.objects.create(product=self.product, user=user, rating=rating)
+        self.buyer = User.objects.create_user(username='buyer1', email='buyer@example.com',
+                                              password='pass12345', full_name='B')
+        self.url = reverse('product-page', args=[self.product.pk])
+
+    def get(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        return resp, len(ctx.captured_queries)
+
+    def test_page_payload_and_query_budget(self):
+        resp, queries = self.get()
+        self.assertLessEqual(queries, 10)
+        data = resp.data
+        self.assertEqual(data['product']['name'], 'Áo thun')
+        self.assertEqual(data['product']['variants']['items'], [])
+        self.assertEqual(data['product']['rating_count'], 7)
+        self.assertEqual(data['rating']['distribution'], {'1': 1, '2': 0, '3': 1, '4': 2, '5': 3})
+        self.assertEqual(len(data['reviews']['results']), 5)
+        self.assertTrue(data['reviews']['has_more'])
+        self.assertEqual(data['seller']['name'], 'Shop Một')
+        self.assertEqual(data['seller']['active_products'], 3)
+        self.assertEqual(data['seller']['rating_count'], 7)
+        self.assertEqual([p['name'] for p in data['related']], ['Quần', 'Áo khoác'])
+        self.assertEqual(data['viewer'], {'can_review': False, 'reason': 'unauthenticated'})
+
+        # Các phần chung đã cache: khách 0 query, người đăng nhập chỉ tốn phần viewer
+        _, queries = self.get()
+        self.assertEqual(queries, 0)
+        self.client.force_authenticate(self.buyer)
+        resp, queries = self.get()
+        self.assertEqual(queries, 2)
+        self.assertEqual(resp.data['viewer'], {'can_review': False})
+
+    def test_parts_are_invalidated_independently(self):
+        self.get()
+        Review.objects.create(product=self.product, user=self.buyer, rating=2)
+        self.seller.full_name = 'Shop Mới'
+        self.seller.save()
+        resp, _ = self.get()
+        self.assertEqual(resp.data['rating']['count'], 8)
+        self.assertEqual(resp.data['seller']['name'], 'Shop Mới')
+        self.assertEqual(resp.data['seller']['rating_count'], 8)
+
+    def test_related_cards_follow_related_products(self):
+        self.get()
+        # Sản phẩm đồng mua ở danh mục khác: đổi giá / ngừng bán vẫn làm mới phần related
+        self.bought_with.price = 45
+        self.bought_with.save()
+        resp, _ = self.get()
+        self.assertEqual(resp.data['related'][0]['price'], '45.00')
+        self.bought_with.is_active = False
+        self.bought_with.save()
+        resp, _ = self.get()
+        self.assertEqual([p['name'] for p in resp.data['related']], ['Áo khoác'])
 
-# Create your tests here.
+    def test_missing_product(self):
+        resp = self.client.get(reverse('product-page', args=[9999]))
+        self.assertEqual(resp.status_code, 404)
@@ -2,13 +2,22 @@ from django.urls import path
 from .views import (
     ProductViewSet,
     CategoryViewSet,
+    ProductFacetsView,
+    ProductAutocompleteView,
+    ProductPageView,
     ImageSearchView,
     WishlistViewSet,
     SavedItemViewSet,
     seller_products,
     seller_stats,
     seller_product_detail,
+    seller_products_bulk,
+    seller_product_variants,
+    product_availability,
+    product_bought_together,
+    cart_bought_together,
     toggle_product_status,
+    catalog_cache_stats,
 )
 
 urlpatterns = [
@@ -20,6 +29,12 @@ urlpatterns = [
         'patch': 'partial_update', 
         'delete': 'destroy'
     }), name='product-detail'),
+    path('products/<int:pk>/page/', ProductPageView.as_view(), name='product-page'),
+    path('products/<int:pk>/availability/', product_availability, name='product-availability'),
+    path('products/facets/', ProductFacetsView.as_view(), name='product-facets'),
+    path('products/autocomplete/', ProductAutocompleteView.as_view(), name='product-autocomplete'),
+    path('products/<int:pk>/bought-together/', product_bought_together, name='product-bought-together'),
+    path('products/bought-together/', cart_bought_together, name='cart-bought-together'),
 
     # Category URLs
     path('categories/', CategoryViewSet.as_view({'get': 'list', 'post': 'create'}), name='category-list'),
@@ -29,16 +44,23 @@ urlpatterns = [
         'patch': 'partial_update', 
         'delete': 'destroy'
     }), name='category-detail'),
+    path('categories/tree/', CategoryViewSet.as_view({'get': 'tree'}), name='category-tree'),
+    path('categories/<int:pk>/breadcrumbs/', CategoryViewSet.as_view({'get': 'breadcrumbs'}), name='category-breadcrumbs'),
+
+    # Response cache metrics (admin)
+    path('catalog/cache-stats/', catalog_cache_stats, name='catalog-cache-stats'),
 
     # Image search
     path('search/image/', ImageSearchView.as_view(), name='image-search'),
 
     # Wishlist URLs
     path('products/wishlist/', WishlistViewSet.as_view({'get': 'list', 'post': 'create'}), name='wishlist-list'),
+    path('products/wishlist/bulk/', WishlistViewSet.as_view({'post': 'bulk'}), name='wishlist-bulk'),
     path('products/wishlist/<int:pk>/', WishlistViewSet.as_view({'delete': 'destroy'}), name='wishlist-detail'),
 
     # SavedItem URLs
     path('products/saved-items/', SavedItemViewSet.as_view({'get': 'list', 'post': 'create'}), name='saveditem-list'),
+    path('products/saved-items/bulk/', SavedItemViewSet.as_view({'post': 'bulk'}), name='saveditem-bulk'),
     path('products/saved-items/<int:pk>/', SavedItemViewSet.as_view({
         'put': 'update', 
         'patch': 'partial_update', 
@@ -48,7 +70,9 @@ urlpatterns = [
     # Seller-specific endpoints
     path('seller/products/', seller_products, name='seller-products'),
     path('seller/stats/', seller_stats, name='seller-stats'),
+    path('seller/products/bulk/', seller_products_bulk, name='seller-products-bulk'),
     path('seller/products/<int:pk>/', seller_product_detail, name='seller-product-detail'),
+    path('seller/products/<int:pk>/variants/', seller_product_variants, name='seller-product-variants'),
 
     # Product management toggle
     path('products/<int:pk>/toggle/', toggle_product_status, name='toggle-product-status'),
@@ -0,0 +1,144 @@
+"""
+Biến thể sản phẩm (ProductVariant): sửa hàng loạt, tóm tắt về Product và kiểm tra tồn kho.
+
+Khi product có biến thể, các cột trên Product là bản tóm tắt để code cũ vẫn chạy:
+- stock = tổng stock các biến thể
+- color_options / size_options = danh sách màu/size (giữ thứ tự cũ nếu có)
+Product được save(update_fields=...) sau mỗi lần sửa nên index màu/size, bộ đếm
+category và cache version được cập nhật qua signals như bình thường.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ProductAttribute, ProductVariant
+
+SUMMARY_FIELDS = ['stock', 'color_options', 'size_options', 'updated_at']
+# Product có biến thể: các field này là bản tóm tắt, chỉ sửa qua endpoint variants
+MANAGED_FIELDS = ('stock', 'color_options', 'size_options')
+MANAGED_FIELD_ERROR = "Sản phẩm có biến thể: cập nhật qua /seller/products/<id>/variants/"
+
+
+def split_stock(total, count):
+    """Chia đều stock cho count biến thể, phần dư dồn cho các biến thể đầu"""
+    if count <= 0:
+        return []
+    base, extra = divmod(max(total, 0), count)
+    return [base + (1 if i < extra else 0) for i in range(count)]
+
+
+def build_from_options(product):
+    """Biến thể (chưa lưu) = tích màu x size từ JSON; stock chia đều từ Product.stock"""
+    colors = [c for c in dict.fromkeys(str(o).strip() for o in product.color_options or []) if c] or ['']
+    sizes = [s for s in dict.fromkeys(str(o).strip() for o in product.size_options or []) if s] or ['']
+    pairs = [(c, s) for c in colors for s in sizes if c or s]
+    variants = []
+    for (color, size), stock in zip(pairs, split_stock(product.stock, len(pairs))):
+        variant = ProductVariant(product=product, color=color, size=size, stock=stock)
+        variant.set_keys()
+        variants.append(variant)
+    return variants
+
+
+def _ordered_labels(labels, previous):
+    """Giữ thứ tự của danh sách cũ, nhãn mới xếp sau theo alphabet"""
+    order = {ProductAttribute.normalize(v): i for i, v in enumerate(previous or [])}
+    unique = {}
+    for label in labels:
+        if label:
+            unique.setdefault(ProductAttribute.normalize(label), label)
+    return [unique[k] for k in sorted(unique, key=lambda k: (order.get(k, len(order)), k))]
+
+
+def refresh_summary(product, variants=None):
+    """Ghi stock/color_options/size_options của product từ các biến thể"""
+    if variants is None:
+        variants = list(product.variant_set.all())
+    product.stock = sum(v.stock for v in variants)
+    product.color_options = _ordered_labels([v.color for v in variants], product.color_options)
+    product.size_options = _ordered_labels([v.size for v in variants], product.size_options)
+    product.save(update_fields=SUMMARY_FIELDS)
+
+
+def save_variants(product, rows, replace=False):
+    """
+    Sửa hàng loạt biến thể của một product trong một transaction.
+    rows: list dict (color, size, stock, price_delta) đã validate.
+    replace=True: biến thể không có trong rows bị xoá (PUT); False: chỉ upsert (PATCH).
+    3-4 query bất kể số biến thể, cộng với lần save tóm tắt.
+    """
+    with transaction.atomic():
+        existing = {(v.color_key, v.size_key): v for v in product.variant_set.select_for_update()}
+        to_create, to_update, seen = [], [], set()
+        for row in rows:
+            variant = ProductVariant(product=product, color=row.get('color', ''), size=row.get('size', ''))
+            variant.set_keys()
+            key = (variant.color_key, variant.size_key)
+            seen.add(key)
+            current = existing.get(key)
+            if current is None:
+                variant.stock = row.get('stock', 0)
+                variant.price_delta = row.get('price_delta', 0)
+                to_create.append(variant)
+                continue
+            current.color, current.size = variant.color, variant.size
+            for field in ('stock', 'price_delta'):
+                if field in row:
+                    setattr(current, field, row[field])
+            to_update.append(current)
+
+        ProductVariant.objects.bulk_create(to_create)
+        if to_update:
+            ProductVariant.objects.bulk_update(to_update, ['color', 'size', 'stock', 'price_delta'])
+        removed = [v.pk for key, v in existing.items() if key not in seen] if replace else []
+        if removed:
+            ProductVariant.objects.filter(pk__in=removed).delete()
+
+        variants = [v for key, v in existing.items() if key in seen or not replace]
+        variants += to_create
+        refresh_summary(product, variants)
+    return sorted(variants, key=lambda v: (v.color_key, v.size_key))
+
+
+def variant_filter(colors=(), sizes=()):
+    """Q trên Product: có ít nhất một biến thể còn hàng khớp màu/size (dùng index partial)"""
+    variants = ProductVariant.objects.filter(stock__gt=0)
+    if colors:
+        variants = variants.filter(color_key__in=[ProductAttribute.normalize(c) for c in colors])
+    if sizes:
+        variants = variants.filter(size_key__in=[ProductAttribute.normalize(s) for s in sizes])
+    # Product chưa có biến thể: dùng stock chung + inverted index như trước
+    legacy = Q(stock__gt=0) & ~Q(id__in=ProductVariant.objects.values('product_id'))
+    for attribute, values in ((ProductAttribute.COLOR, colors), (ProductAttribute.SIZE, sizes)):
+        if values:
+            legacy &= Q(id__in=ProductAttribute.objects.filter(
+                attribute=attribute, value__in=[ProductAttribute.normalize(v) for v in values]
+            ).values('product_id'))
+    return Q(id__in=variants.values('product_id')) | legacy
+
+
+def check_availability(product, color='', size='', quantity=1):
+    """
+    Tồn kho cho một lựa chọn màu/size: tra theo unique index (product, color_key, size_key).
+    Product không có biến thể thì dùng Product.stock.
+    """
+    color_key = ProductAttribute.normalize(color)
+    size_key = ProductAttribute.normalize(size)
+    variant = ProductVariant.objects.filter(
+        product=product, color_key=color_key, size_key=size_key
+    ).only('id', 'stock', 'price_delta').first()
+    if variant is None:
+        has_variants = ProductVariant.objects.filter(product=product).exists()
+        stock = 0 if has_variants else product.stock
+        price = product.price
+    else:
+        stock = variant.stock
+        price = product.price + variant.price_delta
+    return {
+        'product': product.pk,
+        'variant': variant.pk if variant else None,
+        'color': color,
+        'size': size,
+        'stock': stock,
+        'price': price,
+        'available': product.is_active and stock >= quantity,
+    }
@@ -1,11 +1,13 @@
 from rest_framework import generics, permissions, status, viewsets, mixins, parsers, filters
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
-from django.db.models import Count, Q
+from django.db.models import Count, Max, Q
+from django.http import StreamingHttpResponse
+from decimal import Decimal, InvalidOperation
 from PIL import Image
 import numpy as np
 
@@ -13,10 +15,31 @@ from .serializers import (
     ProductCreateSerializer,
     CategorySerializer,
     ProductSerializer,
+    ProductVariantSerializer,
+    ProductVariantBulkSerializer,
     WishlistItemSerializer,
     SavedItemSerializer,
+    WishlistBulkSerializer,
+    SavedItemBulkSerializer,
+)
+from .models import Product, ProductAttribute, Category, WishlistItem, SavedItem
+from .facets import get_facets
+from .pagination import OptionalCursorPagination
+from .product_page import build_product_page
+from .wishlist import bulk_add_to_wishlist, bulk_add_to_saved, fetch_items
+from .rankings import order_by_ranking
+from .variants import variant_filter, save_variants, check_availability
+from . import autocomplete, copurchase
+from .bulk import parse_rows, upsert_rows, result_lines, BulkUpsertError
+from .categories import get_category_map, build_tree, get_breadcrumbs, category_filter
+from .cache import (
+    cached_response,
+    stats as cache_stats,
+    product_version,
+    category_version,
+    PRODUCTS_VERSION,
+    CATEGORIES_VERSION,
 )
-from .models import Product, Category, WishlistItem, SavedItem
 from clip_service import embed_pil  # nếu bạn dùng embedding image
 
 # ============================================
@@ -37,11 +60,90 @@ class BuyerOnlyPermission(permissions.BasePermission):
 # PRODUCT & CATEGORY VIEWSETS
 # ============================================
 
+def _parse_price(params, name):
+    """Giá trong query param -> Decimal; giá trị sai -> 400 thay vì lỗi khi query"""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        price = None
+    if price is None or not price.is_finite() or price < 0:
+        raise ValidationError({name: 'Giá không hợp lệ'})
+    return price
+
+
+def filter_products(queryset, params):
+    """
+    Áp dụng các bộ lọc query param chung cho danh sách sản phẩm và facets.
+    min_price/max_price sai định dạng -> ValidationError (400).
+    """
+    category_id = params.get('category')
+    if category_id:
+        include_descendants = params.get('include_descendants', 'true').lower() != 'false'
+        queryset = queryset.filter(category_filter(category_id, include_descendants))
+
+    is_active = params.get('is_active')
+    if is_active is not None:
+        queryset = queryset.filter(is_active=is_active.lower() == 'true')
+
+    seller_id = params.get('seller')
+    if seller_id:
+        queryset = queryset.filter(seller_id=seller_id)
+
+    colors = [v for v in params.getlist(ProductAttribute.COLOR) if v.strip()]
+    sizes = [v for v in params.getlist(ProductAttribute.SIZE) if v.strip()]
+
+    stock_status = params.get('stock_status')
+    if stock_status == 'in_stock':
+        if colors or sizes:
+            # "Còn hàng màu X/size Y" xét theo tồn kho của từng biến thể
+            queryset = queryset.filter(variant_filter(colors, sizes))
+        else:
+            queryset = queryset.filter(stock__gt=0)
+    elif stock_status == 'out_of_stock':
+        queryset = queryset.filter(stock=0)
+
+    min_price = _parse_price(params, 'min_price')
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+
+    max_price = _parse_price(params, 'max_price')
+    if max_price is not None:
+        queryset = queryset.filter(price__lt=max_price)
+
+    # color/size: lọc qua inverted index thay vì quét JSON từng dòng
+    for attribute, values in ((ProductAttribute.COLOR, colors), (ProductAttribute.SIZE, sizes)):
+        values = [ProductAttribute.normalize(v) for v in values]
+        if values and stock_status != 'in_stock':
+            queryset = queryset.filter(id__in=ProductAttribute.objects.filter(
+                attribute=attribute, value__in=values
+            ).values('product_id'))
+
+    search = params.get('search')
+    if search:
+        queryset = queryset.filter(Q(name__icontains=search) | Q(description__icontains=search))
+
+    return queryset
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter + ?ordering=trending / best_selling từ bảng ProductRanking tính sẵn"""
+    RANKED = ('trending', 'best_selling')
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_param, '').strip()
+        if ordering in self.RANKED:
+            return order_by_ranking(queryset, ordering)
+        return super().filter_queryset(request, queryset, view)
+
+
 class ProductViewSet(viewsets.ModelViewSet):
     """CRUD sản phẩm với filter/search"""
-    queryset = Product.objects.select_related('seller', 'category').all()
+    queryset = Product.objects.select_related('seller', 'category', 'ranking').all()
     parser_classes = [parsers.MultiPartParser, parsers.FormParser, parsers.JSONParser]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.SearchFilter, ProductOrderingFilter]
     search_fields = ['name', 'description']
     ordering_fields = ['created_at', 'price', 'name']
     ordering = ['-created_at']
@@ -57,32 +159,50 @@ class ProductViewSet(viewsets.ModelViewSet):
         return ProductSerializer
 
     def get_queryset(self):
-        queryset = Product.objects.select_related('seller', 'category').all()
-        
-        category_id = self.request.query_params.get('category')
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
-        
-        is_active = self.request.query_params.get('is_active')
-        if is_active is not None:
-            queryset = queryset.filter(is_active=is_active.lower() == 'true')
-        
-        seller_id = self.request.query_params.get('seller')
-        if seller_id:
-            queryset = queryset.filter(seller_id=seller_id)
-        
-        stock_status = self.request.query_params.get('stock_status')
-        if stock_status == 'in_stock':
-            queryset = queryset.filter(stock__gt=0)
-        elif stock_status == 'out_of_stock':
-            queryset = queryset.filter(stock=0)
-        
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(Q(name__icontains=search) | Q(description__icontains=search))
-        
+        queryset = Product.objects.select_related('seller', 'category', 'ranking').all()
+        queryset = filter_products(queryset, self.request.query_params)
+        if self.action in ['list', 'retrieve']:
+            fields = self.get_requested_fields()
+            queryset = ProductSerializer.prune_queryset(queryset, fields)
+            if fields is None or 'variants' in fields:
+                queryset = queryset.prefetch_related('variant_set')
         return queryset
 
+    def get_requested_fields(self):
+        return ProductSerializer.requested_fields(self.request.query_params)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.get_serializer_class() is ProductSerializer and self.action in ['list', 'retrieve']:
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        # Danh sách lọc theo category chỉ phụ thuộc version của category đó
+        category_id = request.query_params.get('category')
+        versions = [category_version(category_id)] if category_id else [PRODUCTS_VERSION]
+        return cached_response(request, 'product-list', versions,
+                               lambda: super(ProductViewSet, self).list(request, *args, **kwargs),
+                               validators=self.list_validators)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get('pk')
+        versions = [product_version(pk)]
+        return cached_response(request, 'product-detail', versions,
+                               lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs),
+                               validators=lambda: self.detail_validators(pk))
+
+    def list_validators(self):
+        """(max updated_at, số dòng) của tập đã lọc - một câu aggregate, không serialize"""
+        agg = self.filter_queryset(self.get_queryset()).order_by()\
+            .aggregate(last_modified=Max('updated_at'), count=Count('id'))
+        return agg['last_modified'], agg['count']
+
+    def detail_validators(self, pk):
+        updated_at = Product.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+        return updated_at, ''
+
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
 
@@ -106,6 +226,47 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response({'message': 'Tạo sản phẩm thành công!', 'product': output_serializer.data},
                         status=status.HTTP_201_CREATED)
 
+class ProductFacetsView(APIView):
+    """
+    Facet counts (category, khoảng giá, màu, size) cho bộ lọc hiện tại
+    GET /api/products/facets/?category=&search=&color=&size=&min_price=&max_price=
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        queryset = filter_products(Product.objects.all(), request.query_params)
+        return Response(get_facets(queryset, request.query_params))
+
+class ProductAutocompleteView(APIView):
+    """
+    Gợi ý tìm kiếm theo tiền tố (sản phẩm, danh mục, shop) từ index trong bộ nhớ
+    GET /api/products/autocomplete/?q=ao&limit=10&type=product,shop
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', autocomplete.DEFAULT_LIMIT))
+        except ValueError:
+            limit = autocomplete.DEFAULT_LIMIT
+        limit = max(1, min(limit, autocomplete.MAX_LIMIT))
+        kinds = {k.strip() for k in request.query_params.get('type', '').split(',') if k.strip()}
+        return Response({
+            'query': query,
+            'suggestions': autocomplete.suggest(query, limit=limit, kinds=kinds or None),
+        })
+
+class ProductPageView(APIView):
+    """
+    Toàn bộ dữ liệu trang chi tiết sản phẩm trong một request (xem products/product_page.py)
+    GET /api/products/<id>/page/
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        return Response(build_product_page(request, pk))
+
 class CategoryViewSet(viewsets.ModelViewSet):
     """CRUD danh mục"""
     queryset = Category.objects.all().order_by('name')
@@ -117,10 +278,52 @@ class CategoryViewSet(viewsets.ModelViewSet):
         is_active = self.request.query_params.get('is_active')
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
-        # Thêm product_count nếu muốn
-        queryset = queryset.annotate(product_count=Count("products", filter=Q(products__is_active=True)))
+        # product_count là cột denormalised, không cần JOIN/GROUP BY bảng Product
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, 'category-list', [CATEGORIES_VERSION],
+                               lambda: super(CategoryViewSet, self).list(request, *args, **kwargs),
+                               validators=self.list_validators)
+
+    def tree(self, request, *args, **kwargs):
+        """
+        Toàn bộ cây danh mục (lồng nhau) cho menu
+        GET /api/categories/tree/?is_active=true
+        """
+        active_only = (request.query_params.get('is_active') or '').lower() == 'true'
+        return cached_response(
+            request, 'category-tree', [CATEGORIES_VERSION],
+            lambda: Response(build_tree(get_category_map(), active_only=active_only)),
+            validators=self.list_validators,
+        )
+
+    def breadcrumbs(self, request, pk=None, *args, **kwargs):
+        """
+        Đường dẫn từ gốc tới danh mục
+        GET /api/categories/<pk>/breadcrumbs/
+        """
+        crumbs = get_breadcrumbs(int(pk))
+        if crumbs is None:
+            return Response({'detail': 'Không tìm thấy danh mục'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(crumbs)
+
+    def list_validators(self):
+        # product_count đã nằm trong CATEGORIES_VERSION (thuộc representation của ETag)
+        queryset = Category.objects.all()
+        is_active = self.request.query_params.get('is_active')
+        if is_active is not None:
+            queryset = queryset.filter(is_active=is_active.lower() == 'true')
+        agg = queryset.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+        return agg['last_modified'], agg['count']
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def catalog_cache_stats(request):
+    """Hit ratio của response cache catalog (theo process)"""
+    return Response(cache_stats.snapshot(), status=status.HTTP_200_OK)
+
 # ============================================
 # IMAGE SEARCH
 # ============================================
@@ -171,18 +374,54 @@ class ImageSearchView(APIView):
 # WISHLIST & SAVED ITEMS
 # ============================================
 
-class WishlistViewSet(mixins.ListModelMixin,
+class HydratedProductListMixin:
+    """
+    List các item có FK product: product, category, seller, ranking đi cùng một
+    JOIN; rating của cả trang lấy bằng một query aggregate -> số query không đổi
+    dù list dài bao nhiêu. Hỗ trợ ?cursor= / ?page_size= (OptionalCursorPagination).
+    """
+    pagination_class = OptionalCursorPagination
+    product_relations = ('product', 'product__category', 'product__seller', 'product__ranking')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        items = list(queryset) if page is None else page
+        ProductSerializer.attach_rating_stats(item.product for item in items)
+        serializer = self.get_serializer(items, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def bulk_response(self, request, bulk_serializer_class, bulk_add):
+        """POST {"items": [...]}: validate cả lô rồi upsert trong một transaction"""
+        serializer = bulk_serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        created, keys = bulk_add(request.user, serializer.validated_data['items'])
+        items = fetch_items(self.get_queryset().model, request.user, keys)
+        ProductSerializer.attach_rating_stats(item.product for item in items)
+        return Response({
+            'created': created,
+            'updated': len(keys) - created,
+            'items': self.get_serializer(items, many=True).data,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class WishlistViewSet(HydratedProductListMixin,
+                      mixins.ListModelMixin,
                       mixins.CreateModelMixin,
                       mixins.DestroyModelMixin,
                       mixins.RetrieveModelMixin,
                       viewsets.GenericViewSet):
     serializer_class = WishlistItemSerializer
     permission_classes = [IsAuthenticated, BuyerOnlyPermission]
+    ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         return WishlistItem.objects.filter(user=self.request.user)\
-            .select_related('product', 'product__category', 'product__seller')\
-            .order_by('-created_at')
+            .select_related(*self.product_relations)\
+            .order_by(*self.ordering)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -209,6 +448,10 @@ class WishlistViewSet(mixins.ListModelMixin,
         return Response(self.get_serializer(instance).data,
                         status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
+    def bulk(self, request, *args, **kwargs):
+        """Thêm nhiều item: {"items": [{"product_id", "color", "size", "note"}, ...]}"""
+        return self.bulk_response(request, WishlistBulkSerializer, bulk_add_to_wishlist)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance.user != request.user:
@@ -217,18 +460,20 @@ class WishlistViewSet(mixins.ListModelMixin,
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class SavedItemViewSet(mixins.ListModelMixin,
+class SavedItemViewSet(HydratedProductListMixin,
+                       mixins.ListModelMixin,
                        mixins.CreateModelMixin,
                        mixins.UpdateModelMixin,
                        mixins.DestroyModelMixin,
                        viewsets.GenericViewSet):
     serializer_class = SavedItemSerializer
     permission_classes = [IsAuthenticated, BuyerOnlyPermission]
+    ordering = ('-moved_from_cart_at', '-id')
 
     def get_queryset(self):
         return SavedItem.objects.filter(user=self.request.user)\
-            .select_related('product', 'product__category', 'product__seller')\
-            .order_by('-moved_from_cart_at')
+            .select_related(*self.product_relations)\
+            .order_by(*self.ordering)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -255,6 +500,13 @@ class SavedItemViewSet(mixins.ListModelMixin,
         return Response(self.get_serializer(instance).data,
                         status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
+    def bulk(self, request, *args, **kwargs):
+        """
+        Thêm nhiều item (vd. chuyển cả giỏ hàng sang để dành):
+        {"items": [{"product_id", "color", "size", "quantity"}, ...]}
+        """
+        return self.bulk_response(request, SavedItemBulkSerializer, bulk_add_to_saved)
+
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance.user != request.user:
@@ -287,7 +539,7 @@ class SavedItemViewSet(mixins.ListModelMixin,
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def seller_products(request):
-    products = Product.objects.filter(seller=request.user).select_related('category').order_by('-created_at')
+    products = Product.objects.filter(seller=request.user).select_related('category', 'ranking').order_by('-created_at')
     serializer = ProductSerializer(products, many=True, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -307,7 +559,7 @@ def seller_stats(request):
 @permission_classes([IsAuthenticated])
 def toggle_product_status(request, pk):
     try:
-        product = Product.objects.get(pk=pk)
+        product = Product.objects.select_related('ranking').get(pk=pk)
         if product.seller != request.user:
             return Response({'error': 'Bạn không có quyền chỉnh sửa sản phẩm này'},
                             status=status.HTTP_403_FORBIDDEN)
@@ -326,7 +578,7 @@ def toggle_product_status(request, pk):
 @permission_classes([IsAuthenticated])
 def seller_product_detail(request, pk):
     try:
-        product = Product.objects.select_related('category').get(pk=pk)
+        product = Product.objects.select_related('category', 'ranking').get(pk=pk)
         if product.seller != request.user:
             return Response({'error': 'Bạn không có quyền truy cập sản phẩm này'},
                             status=status.HTTP_403_FORBIDDEN)
@@ -347,3 +599,122 @@ def seller_product_detail(request, pk):
             return Response({'success': True, 'message': f'Đã xóa sản phẩm "{name}"'})
     except Product.DoesNotExist:
         return Response({'error': 'Không tìm thấy sản phẩm'}, status=status.HTTP_404_NOT_FOUND)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def seller_products_bulk(request):
+    """
+    Upsert hàng loạt theo SKU. Body là JSON lines (application/x-ndjson) hoặc CSV
+    (text/csv), hoặc multipart với field "file" (.csv / .jsonl).
+    Trả về NDJSON: một dòng kết quả cho mỗi dòng input và một dòng summary cuối.
+    """
+    content_type = request.content_type or ''
+    if content_type.startswith('multipart/'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Thiếu file upload'}, status=status.HTTP_400_BAD_REQUEST)
+        raw = upload.read()
+        fmt = 'csv' if upload.name.lower().endswith('.csv') else 'jsonl'
+    else:
+        raw = request.body
+        fmt = 'csv' if 'csv' in content_type else 'jsonl'
+    try:
+        rows = parse_rows(raw, fmt)
+    except (BulkUpsertError, UnicodeDecodeError) as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    if not rows:
+        return Response({'error': 'File upload không có dòng nào'}, status=status.HTTP_400_BAD_REQUEST)
+    results, summary = upsert_rows(request.user, rows)
+    return StreamingHttpResponse(result_lines(results, summary), content_type='application/x-ndjson')
+
+@api_view(['GET', 'PUT', 'PATCH'])
+@permission_classes([IsAuthenticated])
+def seller_product_variants(request, pk):
+    """
+    Biến thể của một sản phẩm. PUT thay toàn bộ danh sách, PATCH chỉ thêm/sửa.
+    Body: {"variants": [{"color": "Đỏ", "size": "M", "stock": 5, "price_delta": 0}, ...]}
+    """
+    try:
+        product = Product.objects.get(pk=pk)
+    except Product.DoesNotExist:
+        return Response({'error': 'Không tìm thấy sản phẩm'}, status=status.HTTP_404_NOT_FOUND)
+    if product.seller != request.user:
+        return Response({'error': 'Bạn không có quyền truy cập sản phẩm này'},
+                        status=status.HTTP_403_FORBIDDEN)
+
+    if request.method == 'GET':
+        variants = product.variant_set.all()
+    else:
+        serializer = ProductVariantBulkSerializer(data=request.data, context={'product': product})
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        variants = save_variants(product, serializer.validated_data['variants'],
+                                 replace=request.method == 'PUT')
+    return Response({
+        'product': product.pk,
+        'stock': product.stock,
+        'variants': ProductVariantSerializer(variants, many=True).data,
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_availability(request, pk):
+    """
+    Kiểm tra tồn kho cho một lựa chọn màu/size
+    GET /api/products/<id>/availability/?color=&size=&quantity=
+    """
+    try:
+        product = Product.objects.only('id', 'price', 'stock', 'is_active').get(pk=pk)
+    except Product.DoesNotExist:
+        return Response({'error': 'Không tìm thấy sản phẩm'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        quantity = max(1, int(request.query_params.get('quantity', 1)))
+    except ValueError:
+        return Response({'error': 'quantity không hợp lệ'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(check_availability(
+        product,
+        color=request.query_params.get('color', ''),
+        size=request.query_params.get('size', ''),
+        quantity=quantity,
+    ))
+
+def _bought_together_response(request, product_ids):
+    try:
+        limit = int(request.query_params.get('limit', copurchase.DEFAULT_LIMIT))
+    except ValueError:
+        limit = copurchase.DEFAULT_LIMIT
+    limit = max(1, min(limit, copurchase.MAX_LIMIT))
+    results = copurchase.bought_together(product_ids, limit=limit)
+    data = ProductSerializer(
+        [product for product, _ in results], many=True,
+        fields=ProductSerializer.VIEWS['card'], context={'request': request},
+    ).data
+    for item, (_, score) in zip(data, results):
+        item['co_purchase_count'] = score
+    return Response({'products': product_ids, 'results': data})
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_bought_together(request, pk):
+    """
+    Sản phẩm thường được mua cùng (trang chi tiết sản phẩm)
+    GET /api/products/<id>/bought-together/?limit=8
+    """
+    if not Product.objects.filter(pk=pk).exists():
+        return Response({'error': 'Không tìm thấy sản phẩm'}, status=status.HTTP_404_NOT_FOUND)
+    return _bought_together_response(request, [pk])
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def cart_bought_together(request):
+    """
+    Gợi ý mua kèm cho cả giỏ hàng (checkout)
+    GET /api/products/bought-together/?ids=1,2,3&limit=8
+    """
+    try:
+        product_ids = sorted({int(v) for v in request.query_params.get('ids', '').split(',') if v.strip()})
+    except ValueError:
+        return Response({'error': 'ids không hợp lệ'}, status=status.HTTP_400_BAD_REQUEST)
+    if not product_ids:
+        return Response({'error': 'Cần ít nhất một product id'}, status=status.HTTP_400_BAD_REQUEST)
+    return _bought_together_response(request, product_ids)
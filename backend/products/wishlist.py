@@ -0,0 +1,89 @@
+"""
+Thêm hàng loạt vào wishlist / saved items (vd. chuyển cả giỏ hàng sang "để dành").
+
+Cùng ngữ nghĩa với tạo từng item qua WishlistViewSet/SavedItemViewSet.create:
+- wishlist: item đã có thì giữ nguyên, chỉ cập nhật note nếu gửi note khác rỗng
+- saved item: item đã có thì cộng dồn quantity
+nhưng cả lô chỉ tốn một query đọc item hiện có và một/hai INSERT ... ON CONFLICT
+trong một transaction, thay vì get_or_create cho từng item.
+"""
+from django.db import transaction
+
+from .models import WishlistItem, SavedItem
+
+UNIQUE_FIELDS = ['user', 'product', 'color', 'size']
+
+
+def _key(row):
+    return row['product_id'], row['color'], row['size']
+
+
+def _existing(model, user, keys, lock=False):
+    queryset = model.objects.filter(user=user, product_id__in={k[0] for k in keys})
+    if lock:
+        queryset = queryset.select_for_update()
+    return {
+        (item.product_id, item.color, item.size): item
+        for item in queryset
+        if (item.product_id, item.color, item.size) in keys
+    }
+
+
+def fetch_items(model, user, keys):
+    """Các item theo (product_id, color, size), đã kèm product/category/seller/ranking"""
+    items = model.objects.filter(user=user, product_id__in={k[0] for k in keys}).select_related(
+        'product', 'product__category', 'product__seller', 'product__ranking'
+    ).order_by('id')
+    return [item for item in items if (item.product_id, item.color, item.size) in keys]
+
+
+def bulk_add_to_wishlist(user, rows):
+    """rows đã validate: [{product_id, color, size, note}]; trả về (số item mới, keys)"""
+    notes = {}
+    for row in rows:
+        key = _key(row)
+        # key lặp trong cùng payload: note khác rỗng sau cùng thắng
+        if row.get('note') or key not in notes:
+            notes[key] = row.get('note', '')
+
+    with transaction.atomic():
+        existing = _existing(WishlistItem, user, set(notes))
+        with_note = [
+            WishlistItem(user=user, product_id=k[0], color=k[1], size=k[2], note=note)
+            for k, note in notes.items() if note
+        ]
+        without_note = [
+            WishlistItem(user=user, product_id=k[0], color=k[1], size=k[2])
+            for k, note in notes.items() if not note and k not in existing
+        ]
+        if with_note:
+            WishlistItem.objects.bulk_create(
+                with_note, update_conflicts=True,
+                unique_fields=UNIQUE_FIELDS, update_fields=['note', 'updated_at'],
+            )
+        if without_note:
+            WishlistItem.objects.bulk_create(without_note, ignore_conflicts=True)
+    return len(set(notes) - set(existing)), set(notes)
+
+
+def bulk_add_to_saved(user, rows):
+    """rows đã validate: [{product_id, color, size, quantity}]; trả về (số item mới, keys)"""
+    quantities = {}
+    for row in rows:
+        key = _key(row)
+        quantities[key] = quantities.get(key, 0) + row['quantity']
+
+    with transaction.atomic():
+        # Khoá các dòng đã có để hai request song song không ghi đè quantity của nhau
+        existing = _existing(SavedItem, user, set(quantities), lock=True)
+        SavedItem.objects.bulk_create(
+            [
+                SavedItem(
+                    user=user, product_id=k[0], color=k[1], size=k[2],
+                    quantity=max(1, (existing[k].quantity if k in existing else 0) + quantity),
+                )
+                for k, quantity in quantities.items()
+            ],
+            update_conflicts=True, unique_fields=UNIQUE_FIELDS, update_fields=['quantity', 'updated_at'],
+        )
+    return len(set(quantities) - set(existing)), set(quantities)
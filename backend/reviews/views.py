@@ -37,6 +37,28 @@ def _purchase_status_q():
         pass
     return q
 
+def review_eligibility(user, product_id):
+    """Payload {can_review, my_review?} của user với một sản phẩm (2 query khi đã đăng nhập)"""
+    if not user or not user.is_authenticated:
+        return {'can_review': False, 'reason': 'unauthenticated'}
+
+    base_qs = OrderItem.objects.filter(product_id=product_id, order__user=user)
+    status_q = _purchase_status_q()
+    purchased = base_qs.filter(status_q).exists() if status_q else base_qs.exists()
+
+    my_review = Review.objects.filter(product_id=product_id, user=user).first()
+    payload = {
+        'can_review': bool(purchased and not my_review),
+    }
+    if my_review:
+        payload['my_review'] = {
+            'id': my_review.pk,
+            'rating': my_review.rating,
+            'comment': my_review.comment,
+            'created_at': my_review.created_at,
+        }
+    return payload
+
 class ProductReviewsView(APIView):
     authentication_classes = (JWTAuthentication,)   # ⬅️ ép dùng JWT (GET vẫn AllowAny ok)
     permission_classes = [permissions.AllowAny]
@@ -90,23 +112,4 @@ class ProductReviewEligibilityView(APIView):
 
     def get(self, request, product_id):
         product = _get_product_or_404(product_id)
-
-        if not request.user or not request.user.is_authenticated:
-            return Response({'can_review': False, 'reason': 'unauthenticated'})
-
-        base_qs = OrderItem.objects.filter(product_id=product.pk, order__user=request.user)
-        status_q = _purchase_status_q()
-        purchased = base_qs.filter(status_q).exists() if status_q else base_qs.exists()
-
-        my_review = Review.objects.filter(product=product, user=request.user).first()
-        payload = {
-            'can_review': bool(purchased and not my_review),
-        }
-        if my_review:
-            payload['my_review'] = {
-                'id': my_review.pk,
-                'rating': my_review.rating,
-                'comment': my_review.comment,
-                'created_at': my_review.created_at,
-            }
-        return Response(payload, status=200)
\ No newline at end of file
+        return Response(review_eligibility(request.user, product.pk), status=200)
@@ -278,7 +278,7 @@ class SellerPublicSerializer(serializers.ModelSerializer):
         """Tổng số đơn hàng đã bán"""
         from orders.models import OrderItem
         items = OrderItem.objects.filter(
-            product__seller=obj,
+            seller=obj,
             order__status='completed'
         )
         return items.count()
@@ -595,7 +595,7 @@ def seller_shop_profile(request, seller_id):
         products = Product.objects.filter(
             seller=seller,
             is_active=True
-        )
+        ).select_related('category', 'ranking')
         
         # Filters
         search = request.GET.get('search', '').strip()
@@ -686,7 +686,7 @@ def shop_statistics(request, seller_id):
         
         # Orders stats
         total_sales = OrderItem.objects.filter(
-            product__seller=seller,
+            seller=seller,
             order__status='completed'
         ).count()
         
@@ -694,7 +694,7 @@ def shop_statistics(request, seller_id):
         recent_products = Product.objects.filter(
             seller=seller,
             is_active=True
-        ).order_by('-created_at')[:5]
+        ).select_related('category', 'ranking').order_by('-created_at')[:5]
         
         from products.serializers import ProductSerializer
         recent_products_data = ProductSerializer(
@@ -433,8 +433,8 @@ const Profile = () => {
       <div className="orders-list">
         {orders.map(o => {
           const createdDate = new Date(o.created_at);
-          const itemsPreview = o.items?.slice(0, 3) || [];
-          const remainingItems = Math.max((o.items?.length || 0) - itemsPreview.length, 0);
+          const itemsPreview = o.items_preview || [];
+          const remainingItems = Math.max((o.items_count || 0) - itemsPreview.length, 0);
           const paymentLabel = o.payment_method === 'cod' ? 'Thanh toán COD' : (o.payment_method || 'Khác');
 
           return (
@@ -471,7 +471,7 @@ const Profile = () => {
                 {itemsPreview.map((it, idx) => (
                   <div key={idx} className="order-item-chip">
                     <div>
-                      <p>{it.product}</p>
+                      <p>{it.product?.name}</p>
                       <span>SL {it.quantity}</span>
                     </div>
                     <span>{formatPrice((it.price || 0) * (it.quantity || 0))}</span>
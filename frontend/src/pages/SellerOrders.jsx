@@ -105,6 +105,8 @@ const SellerOrders = () => {
       if (!response.ok) throw new Error('Failed to fetch orders');
       
       const data = await response.json();
+      // Danh sách được stream: lỗi giữa chừng nằm ở cuối body (success: false)
+      if (data.success === false) throw new Error(data.error || 'Failed to fetch orders');
       setOrders(data.results || []);
       
     } catch (err) {